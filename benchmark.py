@@ -0,0 +1,763 @@
+"""
+Benchmarks do Gestor de Consultas.
+
+Uso:
+    python benchmark.py stress [--mode wal|rollback] [--readers 4] [--seconds 5]
+    python benchmark.py login [--costs 4 8 10 12] [--attempts 5]
+    python benchmark.py startup [--runs 5]
+    python benchmark.py search [--clientes 500000]
+    python benchmark.py import [--rows 200000] [--per-row 5000]
+    python benchmark.py records [--rows 1000000]
+    python benchmark.py suite [--scales 1k 100k 1m] [--repeat 5] [--output resultados.json]
+    python benchmark.py compare antigo.json novo.json [--threshold 1.2]
+"""
+import argparse
+import collections
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import database
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Resultados do suite por defeito: ao lado do sistema_clinico.db da aplicação, e não na pasta
+# de onde o benchmark foi lançado
+RESULTS_PATH = os.path.join(PROJECT_DIR, 'benchmark_results.json')
+
+# Os benchmarks nunca tocam no sistema_clinico.db real
+database.DB_PATH = os.path.join(tempfile.mkdtemp(prefix='gestor_bench_'), 'bench.db')
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def _seed(clientes=200, medicos=10):
+    writer = database.get_writer()
+    writer.run(lambda conn: conn.executemany(
+        "INSERT INTO clientes (nome, telefone, endereco, email, data_nascimento) VALUES (?, ?, ?, ?, ?)",
+        [(f"Cliente {i}", "900000000", "Rua", f"cliente{i}@bench.pt", "1980-01-01") for i in range(clientes)]
+    ))
+    writer.run(lambda conn: conn.executemany(
+        "INSERT INTO medicos (nome, telefone, email, crm) VALUES (?, ?, ?, ?)",
+        [(f"Medico {i}", "910000000", f"medico{i}@bench.pt", f"CRM{i}") for i in range(medicos)]
+    ))
+
+
+def stress(mode='wal', readers=4, seconds=5.0, hold=0.2):
+    """
+    Runs readers against get_today_consultas while the writer keeps long
+    write transactions open. In WAL mode no read should wait for the writer.
+    Every inserted consultation gets its own doctor, day and slot, so the
+    conflict triggers never reject a write; if the writer fails anyway,
+    'writer_error' says why and the run does not count.
+    """
+    database.STORAGE_MODE = mode
+    database.init_db()
+    _seed()
+    manager = database.ConsultasManager()
+    writer = database.get_writer()
+    stop = threading.Event()
+    latencies = []
+    errors = []
+    write_times = []
+    writer_errors = []
+    lock = threading.Lock()
+    medicos = 10
+    slots_per_day = 24 * 60 // database.CONSULTA_DURACAO_MIN
+    today = date.today()
+
+    def booking(n):
+        # A marcação número n: médicos, depois horários do dia, depois dias a partir de hoje
+        day, slot = divmod(n // medicos, slots_per_day)
+        hora = database._to_hora(slot * database.CONSULTA_DURACAO_MIN)
+        return n % 200 + 1, n % medicos + 1, (today + timedelta(days=day)).isoformat(), hora, 'agendada'
+
+    def slow_write(conn, run):
+        # Mantém a transação de escrita aberta durante `hold` segundos
+        conn.executemany(
+            "INSERT INTO consultas (cliente_id, medico_id, data, hora, status) VALUES (?, ?, ?, ?, ?)",
+            [booking(run * 50 + i) for i in range(50)]
+        )
+        time.sleep(hold)
+
+    def write_loop():
+        run = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                writer.run(lambda conn: slow_write(conn, run))
+            except Exception as e:
+                # Sem escritas o resultado não diz nada: termina já
+                writer_errors.append(repr(e))
+                stop.set()
+                return
+            write_times.append(time.perf_counter() - start)
+            run += 1
+
+    def read_loop():
+        local = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with database.get_pool().connection() as conn:
+                    conn.execute(manager.SQL_SELECT_QUERY + manager.SQL_WHERE_TODAY).fetchall()
+            except database.sqlite3.Error as e:
+                errors.append(str(e))
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=read_loop) for _ in range(readers)]
+    threads.append(threading.Thread(target=write_loop))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'mode': mode,
+        'reads': len(latencies),
+        'read_p50_ms': _percentile(latencies, 50) * 1000,
+        'read_p99_ms': _percentile(latencies, 99) * 1000,
+        'read_max_ms': max(latencies, default=0) * 1000,
+        'write_transactions': len(write_times),
+        'write_hold_ms': hold * 1000,
+        'errors': len(errors),
+        'writer_error': writer_errors[0] if writer_errors else None,
+        'pool': database.get_pool().stats(),
+    }
+
+
+def login(costs=(4, 8, 10, 12), attempts=5):
+    """
+    Measures UserManager.authenticate latency for several bcrypt cost factors,
+    plus the one-off cost of a login that rehashes to the configured cost.
+    """
+    database.init_db()
+    results = []
+    for cost in costs:
+        manager = database.UserManager(database.DB_PATH, rounds=cost)
+        username = f"bench{cost}"
+        manager.create_user("Bench", username, "password123", f"{username}@bench.pt")
+
+        timings = []
+        for _ in range(attempts):
+            start = time.perf_counter()
+            ok, _ = manager.authenticate(username, "password123")
+            timings.append(time.perf_counter() - start)
+            assert ok
+
+        # Primeiro login depois de mudar o custo: verifica com o custo antigo e volta a gerar o hash
+        rehash_manager = database.UserManager(database.DB_PATH, rounds=cost + 1)
+        start = time.perf_counter()
+        rehash_manager.authenticate(username, "password123")
+        rehash_time = time.perf_counter() - start
+
+        results.append({
+            'cost': cost,
+            'login_p50_ms': _percentile(timings, 50) * 1000,
+            'login_max_ms': max(timings) * 1000,
+            'rehash_login_ms': rehash_time * 1000,
+        })
+    return results
+
+
+def search(clientes=500000, queries=('j', 'jo', 'joa', 'joao', 'joão sil', 'maria', '912', 'rua das')):
+    """
+    Times ClienteManager.search_clients (first page, as the search box does)
+    for prefixes of growing length over a large client table.
+    """
+    database.init_db()
+    nomes = ['João', 'Maria', 'José', 'Ana', 'Luís', 'Inês', 'António', 'Beatriz']
+    apelidos = ['Silva', 'Santos', 'Ferreira', 'Pereira', 'Oliveira', 'Simões', 'Gonçalves']
+    database.get_writer().run(lambda conn: conn.executemany(
+        "INSERT INTO clientes (nome, telefone, endereco, email, data_nascimento) VALUES (?, ?, ?, ?, ?)",
+        ((f"{nomes[i % len(nomes)]} {apelidos[i % len(apelidos)]} {i}", f"9{i:08d}",
+          f"Rua das Flores {i % 500}", f"cliente{i}@bench.pt", "1980-01-01") for i in range(clientes))
+    ))
+    manager = database.ClienteManager()
+    results = []
+    for text in queries:
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            rows, _ = manager.search_clients(text)
+            timings.append(time.perf_counter() - start)
+        results.append({'query': text, 'rows': len(rows), 'p50_ms': _percentile(timings, 50) * 1000})
+    return results
+
+
+def bulk(rows=200000, per_row=5000):
+    """
+    Compares importing clients one add_cliente call at a time with
+    bulk_import (with and without deferred indexes), in rows per second.
+    Each path runs on its own fresh database.
+    """
+    import bulk_import
+
+    tmp_dir = tempfile.mkdtemp(prefix='gestor_bench_')
+    csv_path = os.path.join(tmp_dir, 'clientes.csv')
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        out = csv.writer(f)
+        out.writerow(['nome', 'telefone', 'endereco', 'email', 'data_nascimento'])
+        for i in range(rows):
+            out.writerow([f"Cliente {i}", f"9{i:08d}", f"Rua {i % 500}", f"cliente{i}@bench.pt", "1980-01-01"])
+
+    results = []
+    database.DB_PATH = os.path.join(tmp_dir, 'per_row.db')
+    database.init_db()
+    start = time.perf_counter()
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            if i == per_row:
+                break
+            database.ClienteManager.add_cliente(
+                row['nome'], row['telefone'], row['endereco'], row['email'], row['data_nascimento']
+            )
+    seconds = time.perf_counter() - start
+    results.append({'path': 'add_cliente', 'rows': per_row, 'rows_per_second': per_row / seconds})
+
+    for defer in (False, True):
+        db_path = os.path.join(tmp_dir, f'bulk_{defer}.db')
+        report = bulk_import.bulk_import('clientes', csv_path, defer_indexes=defer, db_path=db_path)
+        results.append({
+            'path': 'bulk_import' + (' --defer-indexes' if defer else ''),
+            'rows': report['imported'], 'rows_per_second': report['rows_per_second'],
+        })
+    return results
+
+
+def _measure(load):
+    # O tracemalloc torna as alocações muito mais lentas: o tempo é medido numa passagem à parte
+    start = time.perf_counter()
+    result = load()
+    seconds = time.perf_counter() - start
+    del result
+
+    # Memória retida pelo resultado e pico de memória durante a leitura
+    tracemalloc.start()
+    result = load()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {'seconds': seconds, 'retained_mb': retained / 2 ** 20, 'peak_mb': peak / 2 ** 20}
+
+
+def records(rows=1000000):
+    """
+    Compares reading every client as per-row dicts (the previous
+    get_all_clients), as ClienteRow records, and through iter_clients.
+    Records hold the same values in less memory; load time stays close to
+    the dicts because the cyclic GC keeps tracking tuple subclasses, while
+    dicts of plain values are untracked.
+    """
+    database.init_db()
+    database.get_writer().run(lambda conn: conn.executemany(
+        "INSERT INTO clientes (nome, telefone, endereco, email, data_nascimento) VALUES (?, ?, ?, ?, ?)",
+        ((f"Cliente {i}", f"9{i:08d}", f"Rua {i % 500}", f"cliente{i}@bench.pt", "1980-01-01") for i in range(rows))
+    ))
+
+    def as_dicts():
+        with database.get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(database.ClienteManager.SQL_CLIENTES)
+            clientes = []
+            for row in cursor.fetchall():
+                clientes.append({
+                    'id': row[0], 'nome': row[1], 'telefone': row[2],
+                    'endereco': row[3], 'email': row[4], 'data_nascimento': row[5]
+                })
+            return clientes
+
+    def iterate():
+        count = 0
+        for _ in database.ClienteManager.iter_clients():
+            count += 1
+        return count
+
+    return [
+        dict(path='dicts', rows=rows, **_measure(as_dicts)),
+        dict(path='records', rows=rows, **_measure(database.ClienteManager._load_all_clients)),
+        dict(path='iterator', rows=rows, **_measure(iterate)),
+    ]
+
+
+# Escalas do suite, pelo número de consultas; o resto da base de dados cresce com elas
+SUITE_SCALES = {
+    '1k': dict(users=5, clientes=200, medicos=5, consultas=1000, anos=1),
+    '100k': dict(users=20, clientes=10000, medicos=50, consultas=100000, anos=2),
+    '1m': dict(users=50, clientes=100000, medicos=200, consultas=1000000, anos=3),
+}
+
+# Segunda-feira muito depois das consultas geradas, para as escritas do suite não colidirem
+SUITE_FAR_DATE = date(2100, 1, 4)
+
+
+def _summary(timings):
+    return {
+        'runs': len(timings),
+        'p50_ms': _percentile(timings, 50) * 1000,
+        'min_ms': min(timings) * 1000,
+        'max_ms': max(timings) * 1000,
+    }
+
+
+def _time_case(func, setup, repeat):
+    # A cache de leitura é limpa antes de cada chamada: mede-se sempre o acesso à base de dados
+    timings = []
+    for i in range(repeat):
+        database.get_cache().invalidate()
+        args = setup(i) if setup else ()
+        with contextlib.redirect_stdout(io.StringIO()):  # Os managers escrevem uma linha por chamada
+            start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - start)
+    return _summary(timings)
+
+
+def _scalar(sql, params=()):
+    with database.get_pool().connection() as conn:
+        return conn.execute(sql, params).fetchone()[0]
+
+
+def _consume(rows):
+    collections.deque(rows, maxlen=0)
+
+
+def _pages(consultas, scope, pages=3, **kwargs):
+    # As primeiras páginas de uma lista ordenada/filtrada, como ao abrir a janela e descer
+    cursor = None
+    for _ in range(pages):
+        rows, cursor = consultas.get_consultas_page(scope, cursor=cursor, **kwargs)
+        if cursor is None:
+            break
+
+
+def _method_cases(seed):
+    """
+    Returns (name, func, setup) for every database.py manager method.
+    setup(run) runs untimed and returns the arguments of that run; the
+    writes of each run use their own rows, and the update/delete cases
+    work on the rows added by the matching add case.
+    """
+    import seed_data
+
+    rng = random.Random(seed)
+    users = database.UserManager(database.DB_PATH)
+    clientes = database.ClienteManager
+    medicos = database.MedicoManager()
+    consultas = database.ConsultasManager()
+    availability = database.AvailabilityManager()
+    series = database.SeriesManager()
+    n_clientes = _scalar("SELECT MAX(id) FROM clientes")
+    n_medicos = _scalar("SELECT MAX(id) FROM medicos")
+    n_consultas = _scalar("SELECT MAX(id) FROM consultas")
+    since = max(database.get_row_version() - 100, 0)
+    today = date.today()
+
+    def cliente(_):
+        return (rng.randint(1, n_clientes),)
+
+    def medico(_):
+        return (rng.randint(1, n_medicos),)
+
+    def consulta(_):
+        return (rng.randint(1, n_consultas),)
+
+    def far_day(run):
+        return (SUITE_FAR_DATE + timedelta(weeks=run)).isoformat()
+
+    def cold_cache(_):
+        # A agenda fica em cache: cada execução lê-a de novo da base de dados
+        database.get_cache().invalidate()
+        return ()
+
+    def added(sql, run):
+        return _scalar(sql, (f"suite{run}",))
+
+    def added_consulta(run):
+        return _scalar("SELECT id FROM consultas WHERE medico_id = 1 AND data = ? AND serie_id IS NULL", (far_day(run),))
+
+    def added_series(run):
+        # A terceira ocorrência da série marcada nessa execução
+        return _scalar(
+            "SELECT id FROM consultas WHERE medico_id = 2 AND data = ?",
+            ((SUITE_FAR_DATE + timedelta(days=1, weeks=200 + run * 10 + 2)).isoformat(),)
+        )
+
+    return [
+        ('UserManager.authenticate', lambda: users.authenticate('user1', seed_data.PASSWORD), None),
+        ('UserManager.get_all_users', users.get_all_users, None),
+        ('UserManager.iter_users', lambda: _consume(users.iter_users()), None),
+        ('UserManager.get_users_page', users.get_users_page, None),
+        ('UserManager.get_users_changes', lambda: users.get_users_changes(since), None),
+        ('UserManager.create_user', lambda run: users.create_user(
+            "Suite", f"suite{run}", seed_data.PASSWORD, f"suite{run}@exemplo.pt"), lambda run: (run,)),
+        ('UserManager.update_user', lambda user_id, run: users.update_user(
+            user_id, "Suite Editado", f"suite{run}", seed_data.PASSWORD, f"suite{run}@exemplo.pt", 'padrao'),
+         lambda run: (added("SELECT id FROM users WHERE username = ?", run), run)),
+        ('UserManager.delete_user', users.delete_user,
+         lambda run: (added("SELECT id FROM users WHERE username = ?", run),)),
+
+        ('ClienteManager.get_all_clients', clientes.get_all_clients, None),
+        ('ClienteManager.iter_clients', lambda: _consume(clientes.iter_clients()), None),
+        ('ClienteManager.get_cliente', clientes.get_cliente, cliente),
+        ('ClienteManager.get_clients_page', clientes.get_clients_page, None),
+        ('ClienteManager.get_clients_changes', lambda: clientes.get_clients_changes(since), None),
+        ('ClienteManager.search_clients', lambda: clientes.search_clients('mar'), None),
+        ('ClienteManager.add_cliente', lambda run: clientes.add_cliente(
+            f"suite{run}", "910000000", "Rua", f"suite{run}@exemplo.pt", "1980-01-01"), lambda run: (run,)),
+        ('ClienteManager.update_cliente', lambda cliente_id, run: clientes.update_cliente(
+            cliente_id, f"suite{run}", "920000000", "Rua Nova", f"suite{run}@exemplo.pt", "1980-01-01"),
+         lambda run: (added("SELECT id FROM clientes WHERE nome = ?", run), run)),
+        ('ClienteManager.delete_cliente', clientes.delete_cliente,
+         lambda run: (added("SELECT id FROM clientes WHERE nome = ?", run),)),
+
+        ('MedicoManager.get_all_medicos', medicos.get_all_medicos, None),
+        ('MedicoManager.iter_medicos', lambda: _consume(medicos.iter_medicos()), None),
+        ('MedicoManager.get_medico', medicos.get_medico, medico),
+        ('MedicoManager.get_medicos_page', medicos.get_medicos_page, None),
+        ('MedicoManager.get_medicos_changes', lambda: medicos.get_medicos_changes(since), None),
+        ('MedicoManager.search_medicos', lambda: medicos.search_medicos('silva'), None),
+        ('MedicoManager.add_medico', lambda run: medicos.add_medico(
+            f"suite{run}", "210000000", f"suite{run}@exemplo.pt", f"SUITE{run}"), lambda run: (run,)),
+        ('MedicoManager.update_medico', lambda medico_id, run: medicos.update_medico(
+            medico_id, f"suite{run}", "220000000", f"suite{run}@exemplo.pt", f"SUITE{run}"),
+         lambda run: (added("SELECT id FROM medicos WHERE nome = ?", run), run)),
+        ('MedicoManager.delete_medico', medicos.delete_medico,
+         lambda run: (added("SELECT id FROM medicos WHERE nome = ?", run),)),
+
+        ('ConsultasManager.get_consultas_page[future]', lambda: consultas.get_consultas_page('future'), None),
+        ('ConsultasManager.get_consultas_page[past]', lambda: consultas.get_consultas_page('past'), None),
+        ('ConsultasManager.get_consultas_page[today]', lambda: consultas.get_consultas_page('today'), None),
+        ('ConsultasManager.get_consultas_page[past,cliente_nome]',
+         lambda: _pages(consultas, 'past', sort='cliente_nome'), None),
+        ('ConsultasManager.get_consultas_page[past,medico_nome]',
+         lambda: _pages(consultas, 'past', sort='medico_nome', descending=True), None),
+        ('ConsultasManager.get_consultas_page[future,status]', lambda: _pages(consultas, 'future', sort='status'), None),
+        ('ConsultasManager.get_consultas_page[past,medico]',
+         lambda medico_id: _pages(consultas, 'past', filters={'medico_id': medico_id}), medico),
+        ('ConsultasManager.get_consultas_page[past,status]',
+         lambda: _pages(consultas, 'past', filters={'status': 'agendada'}), None),
+        ('ConsultasManager.get_consultas_page[past,datas]', lambda: _pages(
+            consultas, 'past', sort='cliente_nome',
+            filters={'date_from': (today - timedelta(days=30)).isoformat(), 'date_to': today.isoformat()}), None),
+        ('ConsultasManager.get_consultas_page[past,doente]',
+         lambda nome: _pages(consultas, 'past', filters={'cliente': nome}), lambda run: (rng.choice(seed_data.APELIDOS),)),
+        ('ConsultasManager.get_consultas_page[future,filtros]', lambda medico_id, nome: _pages(
+            consultas, 'future', sort='cliente_nome',
+            filters={'medico_id': medico_id, 'status': 'agendada', 'cliente': nome}),
+         lambda run: (rng.randint(1, n_medicos), rng.choice(seed_data.NOMES))),
+        ('ConsultasManager.get_consultas_changes', lambda: consultas.get_consultas_changes('future', since), None),
+        ('ConsultasManager.get_agenda', lambda: consultas.get_agenda('today'), None),
+        ('ConsultasManager.prefetch_agenda', consultas.prefetch_agenda, cold_cache),
+        ('ConsultasManager.get_future_consultas', consultas.get_future_consultas, None),
+        ('ConsultasManager.get_past_consultas', consultas.get_past_consultas, None),
+        ('ConsultasManager.get_today_consultas', consultas.get_today_consultas, None),
+        ('ConsultasManager.iter_consultas', lambda: _consume(consultas.iter_consultas('past')), None),
+        ('ConsultasManager.get_consulta', consultas.get_consulta, consulta),
+        ('ConsultasManager.get_consulta_participants', consultas.get_consulta_participants, consulta),
+        ('ConsultasManager.add_consulta', lambda run: consultas.add_consulta(
+            1, 1, far_day(run), '09:00', 'agendada'), lambda run: (run,)),
+        ('ConsultasManager.update_consulta', lambda consulta_id, run: consultas.update_consulta(
+            consulta_id, 1, 1, far_day(run), '10:00', 'agendada'), lambda run: (added_consulta(run), run)),
+        ('ConsultasManager.del_consulta', consultas.del_consulta, lambda run: (added_consulta(run),)),
+
+        ('AvailabilityManager.free_slots', lambda medico_id: availability.free_slots(
+            medico_id, today, today + timedelta(days=6)), medico),
+        ('AvailabilityManager.next_available', availability.next_available, medico),
+
+        ('SeriesManager.find_conflicts', lambda medico_id: series.find_conflicts(
+            medico_id, [((today + timedelta(weeks=week)).isoformat(), '10:00') for week in range(10)]), medico),
+        ('SeriesManager.add_series', lambda run: series.add_series(
+            1, 2, SUITE_FAR_DATE + timedelta(days=1, weeks=200 + run * 10), '11:00', 'agendada',
+            database.RecurrenceRule('semanal'), 10), lambda run: (run,)),
+        ('SeriesManager.update_following', lambda consulta_id, data: series.update_following(
+            consulta_id, 1, 2, data, '15:00', 'agendada'),
+         lambda run: (added_series(run), (SUITE_FAR_DATE + timedelta(days=1, weeks=200 + run * 10 + 2)).isoformat())),
+    ]
+
+
+def _wait_idle(app):
+    # As janelas carregam os dados em segundo plano: espera pelos resultados e pelos eventos que geram
+    import windows
+
+    while windows.query_runner.is_busy():
+        app.processEvents()
+        time.sleep(0.0005)
+    app.processEvents()
+
+
+def _window_cases(app):
+    """
+    Returns (name, window, refresh, change) for every list window. change()
+    makes one write the window shows, so the next refresh_table takes the
+    incremental path.
+    """
+    import root
+    import windows
+
+    root.user_manager.db_path = database.DB_PATH
+    writer = database.get_writer()
+    today = date.today().isoformat()
+
+    def touch(sql, params=()):
+        return lambda: writer.execute(sql, params)
+
+    touch_consulta = {
+        'today': touch("UPDATE consultas SET status = status WHERE id = (SELECT MIN(id) FROM consultas WHERE data = ?)",
+                       (today,)),
+        'past': touch("UPDATE consultas SET status = status WHERE id = (SELECT MAX(id) FROM consultas WHERE data < ?)",
+                      (today,)),
+        'future': touch("UPDATE consultas SET status = status WHERE id = (SELECT MIN(id) FROM consultas WHERE data >= ?)",
+                        (today,)),
+    }
+    main = windows.ConsultasMainWindow('admin')
+    past = windows.TodasConsultas(past=True)
+    future = windows.TodasConsultas(past=False)
+    users = windows.TodosUsers()
+    medicos = windows.TodosMedicos()
+    clientes = windows.TodosClientes()
+    cases = [
+        ('ConsultasMainWindow', main, main.refresh_table, touch_consulta['today']),
+        ('TodasConsultas[past]', past, lambda: past.refresh_table(True), touch_consulta['past']),
+        ('TodasConsultas[future]', future, lambda: future.refresh_table(False), touch_consulta['future']),
+        ('TodosUsers', users, users.refresh_table, touch("UPDATE users SET nome = nome WHERE id = 1")),
+        ('TodosMedicos', medicos, medicos.refresh_table, touch("UPDATE medicos SET nome = nome WHERE id = 1")),
+        ('TodosClientes', clientes, clientes.refresh_table, touch("UPDATE clientes SET nome = nome WHERE id = 1")),
+    ]
+    for _, window, _, _ in cases:
+        window.show()
+    # As janelas já estão carregadas; a atualização pelos outros postos mexeria nas medições
+    windows.change_notifier.timer.stop()
+    _wait_idle(app)
+    return cases
+
+
+def _time_windows(app, repeat):
+    """
+    Times each window's refresh_table until its results are on screen:
+    'load' with nothing loaded yet (first page from scratch) and 'refresh'
+    after one row changed (only the change is fetched and applied).
+    """
+    results = {}
+    for name, window, refresh, change in _window_cases(app):
+        for path in ('load', 'refresh'):
+            timings = []
+            for _ in range(repeat):
+                if path == 'load':
+                    window.model.version = None  # refresh() volta a carregar tudo
+                else:
+                    change()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    refresh()
+                    _wait_idle(app)
+                    timings.append(time.perf_counter() - start)
+            results[f"{name}.refresh_table[{path}]"] = _summary(timings)
+        window.close()
+    return results
+
+
+def suite(scales=('1k', '100k'), repeat=5, seed=42):
+    """
+    Generates a database per scale with seed_data and times every manager
+    method and every window's refresh_table (offscreen Qt platform).
+    Returns a JSON-serializable dict meant to be saved and compared
+    between releases with `benchmark.py compare`.
+    """
+    import seed_data
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication
+
+    app = QApplication.instance() or QApplication([])
+    tmp_dir = tempfile.mkdtemp(prefix='gestor_suite_')
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    report = {
+        'meta': {
+            'commit': commit,
+            'date': date.today().isoformat(),
+            'python': platform.python_version(),
+            'sqlite': database.sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'scales': {},
+    }
+    for scale in scales:
+        database.DB_PATH = os.path.join(tmp_dir, f'{scale}.db')
+        params = SUITE_SCALES[scale]
+        print(f"[{scale}] a gerar {params}", file=sys.stderr)
+        data = seed_data.generate(seed=seed, **params)
+        methods = {}
+        for name, func, setup in _method_cases(seed):
+            methods[name] = _time_case(func, setup, repeat)
+            print(f"[{scale}] {name}: {methods[name]['p50_ms']:.2f} ms", file=sys.stderr)
+        report['scales'][scale] = {
+            'data': data,
+            'methods': methods,
+            'windows': _time_windows(app, repeat),
+        }
+    return report
+
+
+def _flatten(report):
+    return {
+        (scale, f"{group}.{name}" if group == 'windows' else name): values['p50_ms']
+        for scale, results in report['scales'].items()
+        for group in ('methods', 'windows')
+        for name, values in results[group].items()
+    }
+
+
+def compare(old_path, new_path, threshold=1.2):
+    """
+    Compares two suite results by p50 and returns (scale, name, old ms,
+    new ms, ratio) for every measurement present in both, slowest
+    regressions first. Ratios above threshold are regressions.
+    """
+    with open(old_path, encoding='utf-8') as f:
+        old = _flatten(json.load(f))
+    with open(new_path, encoding='utf-8') as f:
+        new = _flatten(json.load(f))
+    rows = [
+        (scale, name, old[scale, name], new[scale, name],
+         new[scale, name] / old[scale, name] if old[scale, name] else float('inf'))
+        for scale, name in old.keys() & new.keys()
+    ]
+    rows.sort(key=lambda row: row[4], reverse=True)
+    return [row + (row[4] > threshold,) for row in rows]
+
+
+def _time_in_subprocess(code):
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=PROJECT_DIR)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def startup(runs=5):
+    """
+    Times `import database` in fresh processes, and init_db on a new
+    database (creates the schema and hashes the admin password) versus an
+    already initialized one (no bcrypt work at all).
+    """
+    real_db = os.path.join(PROJECT_DIR, 'sistema_clinico.db')
+    existed = os.path.exists(real_db)
+    import_code = "import time; t = time.perf_counter(); import database; print(time.perf_counter() - t)"
+    import_times = [_time_in_subprocess(import_code) for _ in range(runs)]
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='gestor_bench_'), 'startup.db')
+    init_code = (
+        "import time, database; database.DB_PATH = %r; "
+        "t = time.perf_counter(); database.init_db(); print(time.perf_counter() - t)" % db_path
+    )
+    first_init = _time_in_subprocess(init_code)
+    init_times = [_time_in_subprocess(init_code) for _ in range(runs)]
+
+    return {
+        'import_p50_ms': _percentile(import_times, 50) * 1000,
+        'init_new_db_ms': first_init * 1000,
+        'init_existing_db_p50_ms': _percentile(init_times, 50) * 1000,
+        'import_created_db_file': not existed and os.path.exists(real_db),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do Gestor de Consultas")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    stress_parser = sub.add_parser('stress', help="leituras concorrentes com um writer ativo")
+    stress_parser.add_argument('--mode', choices=sorted(database.STORAGE_PRAGMAS), default='wal')
+    stress_parser.add_argument('--readers', type=int, default=4)
+    stress_parser.add_argument('--seconds', type=float, default=5.0)
+
+    login_parser = sub.add_parser('login', help="latência do login para vários custos do bcrypt")
+    login_parser.add_argument('--costs', type=int, nargs='+', default=[4, 8, 10, 12])
+    login_parser.add_argument('--attempts', type=int, default=5)
+
+    startup_parser = sub.add_parser('startup', help="custo de importar database e de init_db")
+    startup_parser.add_argument('--runs', type=int, default=5)
+
+    search_parser = sub.add_parser('search', help="pesquisa de clientes por prefixo (FTS5)")
+    search_parser.add_argument('--clientes', type=int, default=500000)
+
+    import_parser = sub.add_parser('import', help="importação em massa contra inserções uma a uma")
+    import_parser.add_argument('--rows', type=int, default=200000)
+    import_parser.add_argument('--per-row', type=int, default=5000)
+
+    records_parser = sub.add_parser('records', help="memória e tempo de dicts contra registos compactos")
+    records_parser.add_argument('--rows', type=int, default=1000000)
+
+    suite_parser = sub.add_parser('suite', help="todos os métodos dos managers e refresh_table das janelas")
+    suite_parser.add_argument('--scales', nargs='+', choices=list(SUITE_SCALES), default=['1k', '100k'])
+    suite_parser.add_argument('--repeat', type=int, default=5)
+    suite_parser.add_argument('--seed', type=int, default=42)
+    suite_parser.add_argument('--output', default=RESULTS_PATH, help="ficheiro JSON com os resultados")
+
+    compare_parser = sub.add_parser('compare', help="compara dois resultados do suite (p50)")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=1.2, help="rácio a partir do qual é regressão")
+
+    args = parser.parse_args()
+    if args.command == 'stress':
+        result = stress(args.mode, args.readers, args.seconds)
+        for key, value in result.items():
+            print(f"{key}: {value}")
+        if result['writer_error'] or not result['write_transactions']:
+            sys.exit(1)
+    elif args.command == 'login':
+        for result in login(args.costs, args.attempts):
+            print(result)
+    elif args.command == 'startup':
+        for key, value in startup(args.runs).items():
+            print(f"{key}: {value}")
+    elif args.command == 'search':
+        for result in search(args.clientes):
+            print(result)
+    elif args.command == 'import':
+        for result in bulk(args.rows, args.per_row):
+            print(result)
+    elif args.command == 'records':
+        for result in records(args.rows):
+            print(result)
+    elif args.command == 'suite':
+        report = suite(args.scales, args.repeat, args.seed)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Resultados em {args.output}")
+    elif args.command == 'compare':
+        regressions = 0
+        for scale, name, old_ms, new_ms, ratio, regression in compare(args.old, args.new, args.threshold):
+            regressions += regression
+            print(f"{'!' if regression else ' '} [{scale}] {name}: {old_ms:.2f} -> {new_ms:.2f} ms ({ratio:.2f}x)")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Importação em massa de clientes, médicos e consultas a partir de CSV ou JSON Lines.
+
+O ficheiro é lido aos blocos (nunca inteiro em memória) e cada bloco é inserido
+com executemany numa única transação do writer. As linhas inválidas ou
+rejeitadas pela base de dados vão para um ficheiro de rejeitadas (JSON Lines)
+com o número da linha e o erro, e o resto da importação continua.
+
+Uso:
+    python bulk_import.py clientes clientes.csv [--batch 5000] [--defer-indexes]
+    python bulk_import.py consultas consultas.jsonl [--rejects rejeitadas.jsonl] [--db sistema_clinico.db]
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import sqlite3
+import time
+
+import database
+import migrations
+
+# Número de linhas por transação
+BATCH_SIZE = 5000
+
+
+class ImportSpec:
+    """
+    Describes how rows of one table are imported: the columns read from
+    the file, which of them are required, a per-row validator, and the
+    indexes/triggers that may be dropped during the import and rebuilt
+    at the end (defer_indexes).
+    """
+    def __init__(self, table, columns, required, validate=None, deferrable=(), fts=None):
+        self.table = table
+        self.columns = columns
+        self.required = required
+        self.validate = validate
+        self.deferrable = deferrable
+        self.fts = fts
+        placeholders = ', '.join('?' for _ in columns)
+        self.insert_sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+_DATA = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_HORA = re.compile(r'^\d{2}:\d{2}$')
+
+
+def _validate_consulta(row):
+    if not _DATA.match(row['data']):
+        raise ValueError(f"data inválida: {row['data']!r} (esperado AAAA-MM-DD)")
+    if not _HORA.match(row['hora']):
+        raise ValueError(f"hora inválida: {row['hora']!r} (esperado HH:MM)")
+    for column in ('cliente_id', 'medico_id'):
+        try:
+            row[column] = int(row[column])
+        except (TypeError, ValueError):
+            raise ValueError(f"{column} inválido: {row[column]!r}")
+
+
+# Os índices e triggers diferíveis não são usados por outros triggers durante a importação:
+# idx_consultas_medico fica, porque é o que torna rápida a verificação de sobreposição.
+IMPORT_SPECS = {
+    'clientes': ImportSpec(
+        'clientes', ('nome', 'telefone', 'endereco', 'email', 'data_nascimento'), ('nome',),
+        deferrable=('idx_clientes_versao', 'trg_clientes_fts_insert'), fts='clientes_fts'
+    ),
+    'medicos': ImportSpec(
+        'medicos', ('nome', 'telefone', 'email', 'crm'), ('nome', 'crm'),
+        deferrable=('idx_medicos_versao', 'trg_medicos_fts_insert'), fts='medicos_fts'
+    ),
+    'consultas': ImportSpec(
+        'consultas', ('cliente_id', 'medico_id', 'data', 'hora', 'status'),
+        ('cliente_id', 'medico_id', 'data', 'hora', 'status'), validate=_validate_consulta,
+        deferrable=('idx_consultas_data', 'idx_consultas_cliente', 'idx_consultas_versao')
+    ),
+}
+
+
+def read_rows(path, file_format=None):
+    """
+    Yields (line number, row dict) from a CSV file with a header line or
+    from a JSON Lines file, one row at a time.
+    """
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            # A linha 1 é o cabeçalho
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                yield line, row
+        elif file_format == 'jsonl':
+            for line, text in enumerate(f, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    yield line, json.loads(text)
+                except json.JSONDecodeError as e:
+                    yield line, e
+        else:
+            raise ValueError(f"Unknown format: {file_format}")
+
+
+def prepare_row(spec, row):
+    """
+    Validates one input row and returns the parameter tuple for the insert.
+    Raises ValueError with a readable message when the row is invalid.
+    """
+    if isinstance(row, Exception):
+        raise ValueError(f"linha mal formada: {row}")
+    if not isinstance(row, dict):
+        raise ValueError("linha mal formada: esperado um objeto")
+    # Campos vazios do CSV contam como NULL
+    row = {column: (row.get(column) if row.get(column) != '' else None) for column in spec.columns}
+    missing = [column for column in spec.required if row[column] is None]
+    if missing:
+        raise ValueError(f"campos obrigatórios em falta: {', '.join(missing)}")
+    if spec.validate:
+        spec.validate(row)
+    return tuple(row[column] for column in spec.columns)
+
+
+def _insert_batch(spec, batch):
+    """
+    Returns a writer function inserting (line, params) pairs in one
+    transaction. The whole batch goes through executemany; if the database
+    rejects any row, the batch is retried row by row so only the bad rows
+    are rejected. Returns (inserted, [(line, params, error)]).
+    """
+    def run(conn):
+        if not conn.in_transaction:
+            conn.execute("BEGIN")  # O savepoint fica dentro da transação do lote
+        conn.execute("SAVEPOINT lote")
+        try:
+            conn.executemany(spec.insert_sql, [params for _, params in batch])
+            conn.execute("RELEASE lote")
+            return len(batch), []
+        except sqlite3.Error:
+            conn.execute("ROLLBACK TO lote")
+            conn.execute("RELEASE lote")
+
+        inserted, failed = 0, []
+        for line, params in batch:
+            try:
+                conn.execute(spec.insert_sql, params)
+                inserted += 1
+            except sqlite3.Error as e:
+                # Só o INSERT que falhou é desfeito; a transação continua
+                failed.append((line, params, _error_message(e)))
+        return inserted, failed
+    return run
+
+
+def _error_message(error):
+    message = str(error)
+    if database.CONFLITO_HORARIO in message:
+        return "horário ocupado: o médico já tem uma consulta sobreposta"
+    return message
+
+
+def bulk_import(table, path, file_format=None, batch_size=BATCH_SIZE, defer_indexes=False,
+                rejects_path=None, db_path=None):
+    """
+    Imports a CSV or JSON Lines file into clientes, medicos or consultas.
+    Rows are validated, grouped in batches of batch_size and inserted with
+    executemany, one transaction per batch. Rejected rows are written to
+    rejects_path (default: <path>.rejeitadas.jsonl) with their line number
+    and the reason. With defer_indexes the secondary indexes (and the
+    search index trigger) are dropped first and rebuilt once at the end.
+    Returns a report dict with the counts and rows per second.
+    """
+    if table not in IMPORT_SPECS:
+        raise ValueError(f"Unknown table: {table}")
+    spec = IMPORT_SPECS[table]
+    database.init_db(db_path)
+    writer = database.get_writer(db_path)
+    rejects_path = rejects_path or f"{path}.rejeitadas.jsonl"
+
+    report = {'table': table, 'read': 0, 'imported': 0, 'rejected': 0, 'batches': 0}
+    start = time.perf_counter()
+    # O SQL dos objetos apagados fica na base de dados: se o processo morrer, o init_db recria-os
+    if defer_indexes:
+        writer.run(lambda conn: migrations.defer_objects(conn, spec.deferrable, spec.fts))
+    rejects = None
+    try:
+        rows = read_rows(path, file_format)
+        while True:
+            chunk = list(itertools.islice(rows, batch_size))
+            if not chunk:
+                break
+            report['read'] += len(chunk)
+            batch, failed = [], []
+            for line, row in chunk:
+                try:
+                    batch.append((line, prepare_row(spec, row)))
+                except ValueError as e:
+                    failed.append((line, row, str(e)))
+            if batch:
+                inserted, rejected = writer.run(_insert_batch(spec, batch))
+                report['imported'] += inserted
+                failed.extend(rejected)
+                report['batches'] += 1
+
+            if failed:
+                if rejects is None:
+                    rejects = open(rejects_path, 'w', encoding='utf-8')
+                for line, row, error in sorted(failed, key=lambda item: item[0]):
+                    if isinstance(row, tuple):
+                        row = dict(zip(spec.columns, row))
+                    elif not isinstance(row, dict):
+                        row = None
+                    rejects.write(json.dumps({'linha': line, 'erro': error, 'dados': row}, ensure_ascii=False) + '\n')
+                report['rejected'] += len(failed)
+    finally:
+        if rejects is not None:
+            rejects.close()
+        if defer_indexes:
+            writer.run(migrations.restore_deferred)
+        database.get_cache(db_path).invalidate(table)
+
+    report['seconds'] = time.perf_counter() - start
+    report['rows_per_second'] = report['read'] / report['seconds'] if report['seconds'] else 0.0
+    report['rejects_path'] = rejects_path if report['rejected'] else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importação em massa do Gestor de Consultas")
+    parser.add_argument('table', choices=sorted(IMPORT_SPECS))
+    parser.add_argument('path', help="ficheiro CSV (com cabeçalho) ou JSON Lines")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default=None, help="por defeito pela extensão")
+    parser.add_argument('--batch', type=int, default=BATCH_SIZE, help="linhas por transação")
+    parser.add_argument('--defer-indexes', action='store_true', help="reconstrói os índices só no fim")
+    parser.add_argument('--rejects', default=None, help="ficheiro para as linhas rejeitadas")
+    parser.add_argument('--db', default=None, help="base de dados (por defeito a da aplicação)")
+    args = parser.parse_args()
+
+    if args.db:
+        database.DB_PATH = os.path.abspath(args.db)
+    report = bulk_import(
+        args.table, args.path, args.format, args.batch, args.defer_indexes, args.rejects
+    )
+    print(f"{report['imported']} de {report['read']} linhas importadas em {report['seconds']:.2f} s "
+          f"({report['rows_per_second']:.0f} linhas/s)")
+    if report['rejected']:
+        print(f"{report['rejected']} linhas rejeitadas: ver {report['rejects_path']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,98 +1,1031 @@
 import sqlite3
+import base64
+import bisect
+import calendar
+import functools
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from bcrypt import hashpw, gensalt, checkpw
+from migrations import migrate, restore_deferred, minutes_sql, CONFLITO_HORARIO, CONSULTA_DURACAO_MIN
 
 
-# Conectar (ou criar) ao banco de dados SQLite
-conexao = sqlite3.connect('sistema_clinico.db')
-
-# Criar um cursor para executar comandos SQL
-cursor = conexao.cursor()
-
-# Comandos SQL para criar as tabelas
-create_users_table = """
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    nome TEXT NOT NULL,
-    username TEXT NOT NULL UNIQUE,
-    password BLOB NOT NULL,
-    email TEXT NOT NULL UNIQUE,
-    role TEXT NOT NULL CHECK(role IN ('admin', 'padrao'))
-);
-"""
-
-create_clientes_table = """
-CREATE TABLE IF NOT EXISTS clientes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    nome TEXT NOT NULL,
-    telefone TEXT,
-    endereco TEXT,
-    email TEXT UNIQUE,
-    data_nascimento DATE
-);
-"""
-
-create_medicos_table = """
-CREATE TABLE IF NOT EXISTS medicos (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    nome TEXT NOT NULL,
-    telefone TEXT,
-    email TEXT UNIQUE,
-    crm TEXT NOT NULL UNIQUE
-);
-"""
-
-create_consultas_table = """
-CREATE TABLE IF NOT EXISTS consultas (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    cliente_id INTEGER NOT NULL,
-    medico_id INTEGER NOT NULL,
-    data DATE NOT NULL,
-    hora TIME NOT NULL,
-    status TEXT NOT NULL CHECK(status IN ('agendada', 'concluida')),
-    FOREIGN KEY(cliente_id) REFERENCES clientes(id),
-    FOREIGN KEY(medico_id) REFERENCES medicos(id)
-);
-"""
-
-# Executar os comandos SQL
-cursor.execute(create_users_table)
-cursor.execute(create_clientes_table)
-cursor.execute(create_medicos_table)
-cursor.execute(create_consultas_table)
-ad_pw = hashpw('admin'.encode(), gensalt())
-cursor.execute('''
-    INSERT INTO users (nome, username, password, email, role)
-    SELECT ?, ?, ?, ?, ?
-    WHERE NOT EXISTS (
-        SELECT 1 FROM users WHERE username = ?
+DB_PATH = 'sistema_clinico.db'
+
+
+def data_file(name, db_path=None):
+    """
+    Returns the path of an auxiliary file (logs, reports) kept next to the
+    database file, wherever the application was started from.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db_path or DB_PATH)), name)
+
+# Tamanho por defeito do pool de conexões
+POOL_SIZE = 5
+
+# Pragmas aplicados uma única vez a cada conexão nova do pool
+POOL_PRAGMAS = (
+    "temp_store = MEMORY",
+)
+
+# Modo de armazenamento: 'wal' permite leituras concorrentes com uma escrita,
+# 'rollback' mantém o journal clássico do SQLite
+STORAGE_MODE = 'wal'
+
+STORAGE_PRAGMAS = {
+    'wal': (
+        "journal_mode = WAL",
+        "synchronous = NORMAL",
+        "busy_timeout = 5000",
+        "cache_size = -16000",
+        "mmap_size = 268435456",
+    ),
+    'rollback': (
+        "journal_mode = DELETE",
+        "synchronous = FULL",
+        "busy_timeout = 5000",
+    ),
+}
+
+
+def storage_pragmas(mode=None):
+    """
+    Returns the pragmas for the given storage mode (defaults to STORAGE_MODE).
+    """
+    mode = mode or STORAGE_MODE
+    if mode not in STORAGE_PRAGMAS:
+        raise ValueError(f"Unknown storage mode: {mode}")
+    return POOL_PRAGMAS + STORAGE_PRAGMAS[mode]
+
+
+# Limites (ms) dos intervalos dos histogramas de latência; há ainda um último intervalo sem limite
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Instruções mais lentas do que isto vão para o registo de consultas lentas, com o plano de execução.
+# O registo fica ao lado da base de dados (ver data_file)
+SLOW_QUERY_MS = 100
+SLOW_QUERY_LOG = 'slow_queries.log'
+SLOW_QUERY_LOG_BYTES = 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 3
+
+# Número máximo de instruções SQL diferentes com estatísticas próprias
+MAX_STATEMENTS = 500
+OTHER_STATEMENTS = '(outras instruções)'
+
+
+@functools.lru_cache(maxsize=1024)
+def _normalize_sql(sql):
+    return ' '.join(sql.split())
+
+
+class Histogram:
+    """
+    Latency histogram over the fixed LATENCY_BUCKETS_MS buckets. Percentiles
+    are the upper bound of the bucket they fall in (never above the max).
+    """
+    __slots__ = ('counts', 'count', 'total_ms', 'max_ms')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, pct):
+        target = pct / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                bound = LATENCY_BUCKETS_MS[bucket] if bucket < len(LATENCY_BUCKETS_MS) else self.max_ms
+                return min(bound, self.max_ms)
+        return 0.0
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total_ms,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'max_ms': self.max_ms,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'buckets': list(self.counts),
+        }
+
+
+class QueryStats:
+    """
+    Latency histograms, row counts and errors per SQL statement, plus the time
+    spent waiting for the pool and the writer. Slow and failed statements are
+    written with their plan to a rotating log (log_path, or SLOW_QUERY_LOG
+    next to the database).
+    """
+    def __init__(self, slow_ms=SLOW_QUERY_MS, log_path=None):
+        self.slow_ms = slow_ms
+        self._log_path = log_path
+        self._lock = threading.Lock()
+        self._logger = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._statements = {}  # SQL normalizado -> [Histogram, linhas, erros]
+            self._waits = {}  # 'pool', 'writer', ... -> Histogram
+            self.slow_queries = 0
+            self.since = datetime.now()
+
+    def _entry(self, sql):
+        key = _normalize_sql(sql)
+        entry = self._statements.get(key)
+        if entry is None:
+            if len(self._statements) >= MAX_STATEMENTS:
+                key = OTHER_STATEMENTS
+                entry = self._statements.get(key)
+            if entry is None:
+                entry = self._statements[key] = [Histogram(), 0, 0]
+        return entry
+
+    def record(self, conn, sql, params, seconds, rows):
+        ms = seconds * 1000
+        with self._lock:
+            entry = self._entry(sql)
+            entry[0].add(ms)
+            entry[1] += rows
+            slow = ms >= self.slow_ms
+            if slow:
+                self.slow_queries += 1
+        if slow:
+            self._log(
+                logging.WARNING,
+                f"{ms:.1f} ms, {rows} linhas: {_normalize_sql(sql)}\n{self._plan(conn, sql, params)}"
+            )
+
+    def record_error(self, conn, sql, params, seconds, error):
+        with self._lock:
+            entry = self._entry(sql)
+            entry[0].add(seconds * 1000)
+            entry[2] += 1
+        self._log(logging.ERROR, f"erro ({error}): {_normalize_sql(sql)}\n{self._plan(conn, sql, params)}")
+
+    def record_wait(self, kind, seconds):
+        with self._lock:
+            histogram = self._waits.get(kind)
+            if histogram is None:
+                histogram = self._waits[kind] = Histogram()
+            histogram.add(seconds * 1000)
+
+    def _plan(self, conn, sql, params):
+        if params is None or sql.lstrip().upper().startswith(('EXPLAIN', 'PRAGMA', 'BEGIN', 'COMMIT', 'ROLLBACK')):
+            return "    (sem plano)"
+        try:
+            # Pela classe base, para o EXPLAIN não contar nas estatísticas
+            rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        except (sqlite3.Error, ValueError) as e:
+            return f"    (plano indisponível: {e})"
+        return '\n'.join(f"    {row[3]}" for row in rows) or "    (sem plano)"
+
+    @property
+    def log_path(self):
+        return self._log_path or data_file(SLOW_QUERY_LOG)
+
+    def _log(self, level, message):
+        if self._logger is None:
+            # O ficheiro só é criado quando há algo para registar, e fica nesse sítio até ao fim
+            self._log_path = self.log_path
+            logger = logging.getLogger('gestor.sql')
+            handler = logging.handlers.RotatingFileHandler(
+                self._log_path, maxBytes=SLOW_QUERY_LOG_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS,
+                encoding='utf-8', delay=True
+            )
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.WARNING)
+            logger.propagate = False
+            self._logger = logger
+        self._logger.log(level, message)
+
+    def snapshot(self):
+        """
+        Returns the statistics collected since the last reset. Statements
+        are sorted by total time, the most expensive first.
+        """
+        with self._lock:
+            statements = [
+                dict(sql=sql, rows=rows, errors=errors, **histogram.snapshot())
+                for sql, (histogram, rows, errors) in self._statements.items()
+            ]
+            waits = {kind: histogram.snapshot() for kind, histogram in self._waits.items()}
+            slow_queries = self.slow_queries
+            since = self.since
+        statements.sort(key=lambda statement: statement['total_ms'], reverse=True)
+        return {
+            'since': since.isoformat(timespec='seconds'),
+            'statements': statements,
+            'waits': waits,
+            'slow_queries': slow_queries,
+            'slow_ms': self.slow_ms,
+            'log_path': self.log_path,
+        }
+
+
+# Estatísticas de todas as instruções SQL deste processo
+query_stats = QueryStats()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor that times each statement, including the fetch calls that read its
+    rows, into query_stats. Iterating the cursor directly is only timed up to
+    execute.
+    """
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._statement = None  # [sql, params, segundos, linhas] da instrução em curso
+
+    def _run(self, method, sql, parameters, params):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            method(self, sql, parameters)
+        except sqlite3.Error as e:
+            query_stats.record_error(self.connection, sql, params, time.perf_counter() - start, e)
+            raise
+        self._statement = [sql, params, time.perf_counter() - start, 0]
+        if self.description is None:
+            # Sem linhas para ler (INSERT, UPDATE, ...): conta as linhas alteradas
+            self._statement[3] = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(sqlite3.Cursor.execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # Os parâmetros podem ser um iterador já consumido: sem plano no registo
+        return self._run(sqlite3.Cursor.executemany, sql, seq_of_parameters, None)
+
+    def _fetched(self, start, rows, done):
+        if self._statement is not None:
+            self._statement[2] += time.perf_counter() - start
+            self._statement[3] += rows
+            if done:
+                self._finish()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None, True)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._fetched(start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is not None:
+            query_stats.record(self.connection, *statement)
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection whose statements all go through InstrumentedCursor.
+    """
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class ConnectionPool:
+    """
+    Pool of SQLite connections shared by all the managers. A thread reuses the
+    connection it has already checked out.
+    """
+    def __init__(self, db_path, size=POOL_SIZE, timeout=10.0, pragmas=None):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas if pragmas is not None else storage_pragmas()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._open = 0
+        # Métricas do pool
+        self.checkouts = 0
+        self.waits = 0
+        self.health_failures = 0
+
+    def _create(self):
+        # Cria uma conexão nova e aplica os pragmas uma única vez
+        conn = sqlite3.connect(
+            self.db_path, timeout=self.timeout, check_same_thread=False, factory=InstrumentedConnection
+        )
+        for pragma in self.pragmas:
+            conn.execute(f"PRAGMA {pragma}")
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._open -= 1
+
+    def _checkout(self):
+        with self._lock:
+            self.checkouts += 1
+            can_open = self._idle.empty() and self._open < self.size
+            if can_open:
+                self._open += 1
+
+        if can_open:
+            try:
+                return self._create()
+            except sqlite3.Error:
+                with self._lock:
+                    self._open -= 1
+                raise
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            # Todas as conexões estão em uso, esperar que uma seja devolvida
+            with self._lock:
+                self.waits += 1
+            try:
+                conn = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise sqlite3.OperationalError("Timeout waiting for a database connection")
+
+        if not self._is_healthy(conn):
+            with self._lock:
+                self.health_failures += 1
+            self._discard(conn)
+            return self._checkout()
+        return conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a connection for the current thread; commits on success and
+        rolls back on error.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            # Reentrant use on the same thread
+            yield conn
+            return
+
+        start = time.perf_counter()
+        conn = self._checkout()
+        query_stats.record_wait('pool', time.perf_counter() - start)
+        self._local.conn = conn
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool metrics.
+        """
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': self._idle.qsize(),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'health_failures': self.health_failures,
+            }
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+class SerializedWriter:
+    """
+    Owns the only connection that writes to the database. Writes are queued
+    and run one transaction at a time on a dedicated thread.
+    """
+    def __init__(self, db_path, pragmas=None):
+        self.db_path = db_path
+        self.pragmas = pragmas if pragmas is not None else storage_pragmas()
+        self._queue = queue.Queue()
+        self._conn = None
+        self._data_version = None
+        self._startup_error = None
+        # Métricas do writer
+        self.transactions = 0
+        self.max_queue = 0
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=InstrumentedConnection)
+            for pragma in self.pragmas:
+                self._conn.execute(f"PRAGMA {pragma}")
+            self._external_commits()
+        except sqlite3.Error as e:
+            print(f"Error opening the database writer: {e}")
+            self._startup_error = e
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            func, future, queued_at = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            if self._startup_error is not None:
+                # Sem conexão: todas as escritas falham com o erro da abertura
+                future.set_exception(self._startup_error)
+                continue
+            start = time.perf_counter()
+            query_stats.record_wait('writer', start - queued_at)
+            cache = _caches.get(self.db_path)
+            if cache is not None:
+                cache.begin_local_commit()
+            result = error = None
+            try:
+                with self._conn:
+                    result = func(self._conn)
+                self.transactions += 1
+                query_stats.record_wait('writer_transaction', time.perf_counter() - start)
+            except BaseException as e:
+                error = e
+            if cache is not None:
+                cache.end_local_commit()
+            # Um commit de outro posto durante a transação também tem de limpar a cache
+            if self._external_commits() and cache is not None:
+                cache.clear_stale()
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+        if self._conn is not None:
+            self._conn.close()
+
+    def _external_commits(self):
+        # O data_version da própria conexão só muda com commits de outras conexões (outros postos)
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = self._data_version is not None and version != self._data_version
+        self._data_version = version
+        return changed
+
+    def submit(self, func):
+        """
+        Queues func(conn) to run inside a write transaction and returns a Future.
+        """
+        future = Future()
+        self._queue.put((func, future, time.perf_counter()))
+        self.max_queue = max(self.max_queue, self._queue.qsize())
+        return future
+
+    def run(self, func):
+        """
+        Runs func(conn) inside a write transaction and waits for its result.
+        """
+        if threading.current_thread() is self._thread:
+            # Already inside a write transaction
+            return func(self._conn)
+        return self.submit(func).result()
+
+    def execute(self, sql, params=()):
+        """
+        Executes a single write statement and returns its cursor.
+        """
+        return self.run(lambda conn: conn.execute(sql, params))
+
+    def stats(self):
+        return {
+            'transactions': self.transactions,
+            'queued': self._queue.qsize(),
+            'max_queue': self.max_queue,
+        }
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+# Número máximo de resultados guardados pela cache de leitura
+CACHE_SIZE = 256
+
+
+class QueryCache:
+    """
+    Read-through LRU cache for reference data. Local writes drop only the
+    entries of the tables they changed; a commit from another connection
+    (PRAGMA data_version) clears everything. Cached values are shared and must
+    not be modified.
+    """
+    def __init__(self, db_path, maxsize=CACHE_SIZE):
+        self.db_path = db_path
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (value, tables)
+        self._lock = threading.Lock()
+        self._version_conn = None
+        self._data_version = None
+        self._local_commits = 0  # Transações do writer deste processo em curso
+        # Métricas da cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_clears = 0
+
+    def _current_data_version(self):
+        # Conexão própria: data_version só muda com commits feitos por outras conexões
+        if self._version_conn is None:
+            self._version_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_version(self):
+        if self._local_commits:
+            # Quem mudou o data_version pode ter sido o writer: end_local_commit decide
+            return
+        version = self._current_data_version()
+        if version != self._data_version:
+            if self._data_version is not None:
+                self._clear_stale()
+            self._data_version = version
+
+    def _clear_stale(self):
+        if self._entries:
+            self.stale_clears += 1
+        self._entries.clear()
+
+    def begin_local_commit(self):
+        """
+        Called by the writer before each transaction of this process.
+        """
+        with self._lock:
+            self._local_commits += 1
+
+    def end_local_commit(self):
+        """
+        Called by the writer after the transaction: records the data_version
+        it left behind, so the local commit does not clear the cache.
+        """
+        with self._lock:
+            self._local_commits -= 1
+            self._data_version = self._current_data_version()
+
+    def clear_stale(self):
+        """
+        Clears everything after a commit from another process.
+        """
+        with self._lock:
+            self._clear_stale()
+
+    def get(self, key, loader, tables):
+        """
+        Returns the cached value for key, calling loader() to read it from
+        the database on a miss. `tables` lists the tables the value depends on.
+        """
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            version = self._data_version
+
+        value = loader()
+
+        with self._lock:
+            # Só guarda se nada mudou entretanto
+            if version == self._data_version:
+                self._entries[key] = (value, frozenset(tables))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, table=None):
+        """
+        Drops every entry read from the given table, or everything.
+        """
+        with self._lock:
+            if table is None:
+                stale = list(self._entries)
+            else:
+                stale = [key for key, (_, tables) in self._entries.items() if table in tables]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def stats(self):
+        """
+        Returns a snapshot of the cache metrics.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'stale_clears': self.stale_clears,
+            }
+
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+            if self._version_conn is not None:
+                self._version_conn.close()
+                self._version_conn = None
+
+
+# Tamanho por defeito de uma página nas listagens
+PAGE_SIZE = 100
+
+
+def encode_cursor(values):
+    """
+    Encodes the sort key of the last row of a page into an opaque cursor token.
+    """
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def decode_cursor(token):
+    """
+    Decodes a cursor token produced by encode_cursor.
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {token!r}")
+
+
+def record_type(name, fields):
+    """
+    Creates a namedtuple row type that also accepts row['field'], get() and
+    keys().
+    """
+    base = namedtuple(name, fields)
+    positions = {field: position for position, field in enumerate(base._fields)}
+    getitem = tuple.__getitem__
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getitem(self, positions[key])
+        return getitem(self, key)
+
+    def get(self, key, default=None):
+        position = positions.get(key)
+        return default if position is None else getitem(self, position)
+
+    def keys(self):
+        return self._fields
+
+    record = type(name, (base,), {
+        '__slots__': (), '__getitem__': __getitem__, 'get': get, 'keys': keys,
+    })
+    # from_row(row) builds the record from a sqlite3 row tuple without any Python-level call
+    record.from_row = functools.partial(tuple.__new__, record)
+    # row_factory for cursors that should return records directly
+    record.row_factory = staticmethod(lambda cursor, row: record.from_row(row))
+    return record
+
+
+ClienteRow = record_type('ClienteRow', ('id', 'nome', 'telefone', 'endereco', 'email', 'data_nascimento'))
+MedicoRow = record_type('MedicoRow', ('id', 'nome', 'telefone', 'email', 'crm'))
+UserRow = record_type('UserRow', ('id', 'nome', 'username', 'email', 'role'))
+ConsultaRow = record_type('ConsultaRow', ('id', 'cliente_nome', 'medico_nome', 'data', 'hora', 'status'))
+# Consulta alterada: in_scope diz se ainda pertence ao âmbito e aos filtros da lista
+ConsultaChangeRow = record_type('ConsultaChangeRow', ConsultaRow._fields + ('in_scope',))
+ChangeRow = record_type('ChangeRow', ('id', 'tabela', 'linha_id', 'operacao'))
+
+# Linhas lidas de cada vez pelos iteradores
+FETCH_SIZE = 1000
+
+
+def fetch_records(query, record, params=(), db_path=None):
+    """
+    Runs query and returns every row as a `record` instance.
+    """
+    with get_pool(db_path).connection() as conn:
+        cursor = conn.execute(query, params)
+        # fetchmany aos blocos: o cursor não é iterado linha a linha, e a leitura fica medida
+        rows = itertools.chain.from_iterable(iter(functools.partial(cursor.fetchmany, FETCH_SIZE), []))
+        return list(map(record.from_row, rows))
+
+
+def iter_records(query, record, params=(), db_path=None, size=FETCH_SIZE):
+    """
+    Yields the rows of query as `record` instances, `size` at a time. The
+    connection stays checked out until the iterator is exhausted or closed.
+    """
+    with get_pool(db_path).connection() as conn:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            yield from map(record.from_row, rows)
+
+
+def fetch_page_by_id(query, record, page_size=PAGE_SIZE, cursor=None, db_path=None,
+                     conditions=(), params=(), id_column='id'):
+    """
+    Runs a keyset page ordered by id. `query` selects the id first and has a
+    `{where}` placeholder before its ORDER BY id; `conditions` are ANDed with
+    the keyset condition. Returns (rows as `record` instances, next_cursor).
+    """
+    conditions, params = list(conditions), list(params)
+    if cursor is not None:
+        conditions.append(f"{id_column} > ?")
+        params.append(decode_cursor(cursor)[0])
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    with get_pool(db_path).connection() as conn:
+        cursor_db = conn.cursor()
+        cursor_db.execute(query.format(where=where) + " LIMIT ?", params + [page_size + 1])
+        rows = cursor_db.fetchall()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor((rows[-1][0],))
+    return list(map(record.from_row, rows)), next_cursor
+
+
+def get_row_version(db_path=None):
+    """
+    Returns the current value of the global row version counter. Every
+    insert, update or delete in a versioned table increments it.
+    """
+    with get_pool(db_path).connection() as conn:
+        return conn.execute("SELECT atual FROM row_version WHERE id = 1").fetchone()[0]
+
+
+def fetch_changes(table, query, record, since, db_path=None, params=None):
+    """
+    Returns (changed rows as `record` instances, removed ids, version) for
+    `table` after row version `since`, read from one snapshot. `query` bounds
+    the range with :since and :version.
+    """
+    with get_pool(db_path).connection() as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN")  # Uma única leitura consistente
+        version = conn.execute("SELECT atual FROM row_version WHERE id = 1").fetchone()[0]
+        if version == since:
+            return [], [], version
+        rows = conn.execute(query, dict(params or {}, since=since, version=version)).fetchall()
+        removed = conn.execute(
+            "SELECT linha_id FROM linhas_removidas WHERE tabela = ? AND versao > ? AND versao <= ?",
+            (table, since, version)
+        ).fetchall()
+    return list(map(record.from_row, rows)), [row[0] for row in removed], version
+
+
+# Número de entradas mais recentes mantidas no registo de alterações
+CHANGE_LOG_KEEP = 100000
+
+
+def get_last_change_id(db_path=None):
+    """
+    Returns the id of the most recent entry in the change log (0 if empty).
+    """
+    with get_pool(db_path).connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM alteracoes").fetchone()[0]
+
+
+def get_changes_after(last_id, limit=1000, db_path=None):
+    """
+    Returns up to `limit` change log entries newer than last_id, oldest
+    first, as ChangeRow records.
+    """
+    with get_pool(db_path).connection() as conn:
+        rows = conn.execute(
+            "SELECT id, tabela, linha_id, operacao FROM alteracoes WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, limit)
+        ).fetchall()
+    return list(map(ChangeRow.from_row, rows))
+
+
+def prune_changes(keep=CHANGE_LOG_KEEP, db_path=None):
+    """
+    Drops all but the `keep` most recent change log entries.
+    """
+    get_writer(db_path).execute(
+        "DELETE FROM alteracoes WHERE id <= (SELECT MAX(id) FROM alteracoes) - ?", (keep,)
     )
-''', ('Administrador', 'admin', ad_pw, 'null@email.com', 'admin', 'admin'))
 
 
-conexao.commit()
+def fts_query(text):
+    """
+    Turns what the user typed into an FTS5 prefix query ('joão sil' ->
+    '"joão"* "sil"*'), or None if there is nothing to search for.
+    """
+    terms = re.findall(r'\w+', text or '')
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+_pools = {}
+_writers = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path=None, size=POOL_SIZE):
+    """
+    Returns the shared pool for the given database file, creating it on first use.
+    """
+    db_path = db_path or DB_PATH
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path, size=size)
+        return pool
+
+
+def get_writer(db_path=None):
+    """
+    Returns the serialized writer for the given database file.
+    """
+    db_path = db_path or DB_PATH
+    with _pools_lock:
+        writer = _writers.get(db_path)
+        if writer is None:
+            writer = _writers[db_path] = SerializedWriter(db_path)
+        return writer
+
+
+_caches = {}
+
+
+def get_cache(db_path=None):
+    """
+    Returns the read cache for the given database file.
+    """
+    db_path = db_path or DB_PATH
+    with _pools_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = _caches[db_path] = QueryCache(db_path)
+        return cache
+
+
+def diagnostics(db_path=None):
+    """
+    Returns this station's database metrics for the diagnostics dialog.
+    """
+    snapshot = query_stats.snapshot()
+    snapshot['pool'] = get_pool(db_path).stats()
+    snapshot['writer'] = get_writer(db_path).stats()
+    snapshot['cache'] = get_cache(db_path).stats()
+    return snapshot
+
+
+_initialized = set()
+
+
+def init_db(db_path=None):
+    """
+    Brings the schema up to date and seeds the admin user. Cheap to call
+    again.
+    """
+    db_path = db_path or DB_PATH
+    if db_path in _initialized:
+        return
+
+    # Aplica as migrações pendentes (ver migrations.py)
+    writer = get_writer(db_path)
+    writer.run(migrate)
+    # Índices/triggers de uma importação em massa interrompida
+    writer.run(restore_deferred)
+
+    # O hash do bcrypt só é calculado se o admin ainda não existir
+    with get_pool(db_path).connection() as conn:
+        admin_exists = conn.execute("SELECT 1 FROM users WHERE username = ?", ('admin',)).fetchone()
+    if not admin_exists:
+        ad_pw = hashpw('admin'.encode(), gensalt(BCRYPT_ROUNDS))
+        writer.execute('''
+            INSERT INTO users (nome, username, password, email, role)
+            SELECT ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM users WHERE username = ?
+            )
+        ''', ('Administrador', 'admin', ad_pw, 'null@email.com', 'admin', 'admin'))
+
+    # O registo de alterações só precisa das entradas recentes
+    prune_changes(db_path=db_path)
+
+    _initialized.add(db_path)
+
+
+# Custo (log2 das iterações) usado pelo bcrypt nas passwords novas
+BCRYPT_ROUNDS = 12
+
+
+def bcrypt_rounds(hashed_password):
+    """
+    Returns the cost factor stored in a bcrypt hash ($2b$<cost>$...).
+    """
+    try:
+        return int(hashed_password.split(b'$')[2])
+    except (IndexError, ValueError):
+        return None
 
 
 class UserManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path, rounds=BCRYPT_ROUNDS):
         # Inicializa a conexão com o banco de dados.
         self.db_path = db_path
+        self.rounds = rounds
 
     def _connect(self):
-        # Cria uma conexão com o banco de dados
-        return sqlite3.connect(self.db_path)
+        # Obtém uma conexão do pool partilhado
+        return get_pool(self.db_path).connection()
+
+    def _writer(self):
+        # Todas as escritas passam pelo writer serializado
+        return get_writer(self.db_path)
+
+    def _hash_password(self, password):
+        return hashpw(password.encode(), gensalt(self.rounds))
 
     def create_user(self, nome, username, password, email, role='padrao'):
-        hashed_password = hashpw(password.encode(), gensalt())
+        hashed_password = self._hash_password(password)
         
         try:
-            with self._connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO users (nome, username, password, email, role)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (nome, username, hashed_password, email, role))
-                conn.commit()
-                return True, "User created successfully"
+            self._writer().execute("""
+                INSERT INTO users (nome, username, password, email, role)
+                VALUES (?, ?, ?, ?, ?)
+            """, (nome, username, hashed_password, email, role))
+            return True, "User created successfully"
                 
         except sqlite3.IntegrityError as e:
             if "username" in str(e):
@@ -114,54 +1047,82 @@ class UserManager:
         try:
             with self._connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute("SELECT password, role FROM users WHERE username = ? OR email = ?", (username, username))
+                cursor.execute("SELECT id, password, role FROM users WHERE username = ? OR email = ?", (username, username))
                 row = cursor.fetchone()
 
-                if row:
-                    stored_password = row[0]  # This should be the hashed binary data
-                    if isinstance(stored_password, str):
-                        stored_password = stored_password.encode()  # Ensure it's bytes
+            if row:
+                stored_password = row[1]  # This should be the hashed binary data
+                if isinstance(stored_password, str):
+                    stored_password = stored_password.encode()  # Ensure it's bytes
 
-                    if checkpw(password.encode(), stored_password):
-                        return True, row[1]
-                
-                return False, print("Invalid username or password")
+                if checkpw(password.encode(), stored_password):
+                    if bcrypt_rounds(stored_password) != self.rounds:
+                        self._rehash(row[0], password)
+                    return True, row[2]
+            
+            return False, print("Invalid username or password")
         except sqlite3.Error as e:
             return False, str(e)
+
+    def _rehash(self, user_id, password):
+        # A password está correta mas foi guardada com outro custo: atualizar o hash
+        try:
+            self._writer().execute(
+                "UPDATE users SET password = ? WHERE id = ?",
+                (self._hash_password(password), user_id)
+            )
+        except sqlite3.Error as e:
+            print(f"Error rehashing password for user {user_id}: {e}")
     
+    SQL_USERS = "SELECT id, nome, username, email, role FROM users"
+
     def get_all_users(self):
         try:
-            with self._connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, nome, username, email, role FROM users")
-                rows = cursor.fetchall()
-                users = []
-                for row in rows:
-                    users.append({
-                        'id': row[0],
-                        'nome': row[1],
-                        'username': row[2],
-                        'email': row[3],
-                        'role': row[4]
-                    })
-                return users  # List of tuples containing user data
+            return fetch_records(self.SQL_USERS, UserRow, db_path=self.db_path)  # List of UserRow records
         except sqlite3.Error as e:
             print(f"Erro ao buscar usuários: {e}")
             return []
 
+    def iter_users(self):
+        """
+        Yields every user as a UserRow without loading them all at once.
+        """
+        return iter_records(self.SQL_USERS, UserRow, db_path=self.db_path)
+
+    def get_users_page(self, page_size=PAGE_SIZE, cursor=None):
+        """
+        Returns one page of users ordered by id as (users, next_cursor).
+        """
+        try:
+            return fetch_page_by_id(
+                "SELECT id, nome, username, email, role FROM users {where} ORDER BY id",
+                UserRow, page_size, cursor, self.db_path
+            )
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar usuários: {e}")
+            return [], None
+
+    def get_users_changes(self, since):
+        """
+        Returns the users added, changed or removed after row version since
+        as (users, removed_ids, version).
+        """
+        return fetch_changes(
+            'users',
+            "SELECT id, nome, username, email, role FROM users WHERE versao > :since AND versao <= :version",
+            UserRow, since, self.db_path
+        )
+
     def update_user(self, user_id, nome, username, password, email, role):
         try:
-            hashed_password = hashpw(password.encode(), gensalt())
+            hashed_password = self._hash_password(password)
 
-            with self._connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    UPDATE users 
-                    SET nome = ?, username = ?, password = ?, email = ?, role = ? 
-                    WHERE id = ?
-                """, (nome, username, hashed_password, email, role, user_id))
-                conn.commit()
-                return True, "User updated successfully"
+            self._writer().execute("""
+                UPDATE users 
+                SET nome = ?, username = ?, password = ?, email = ?, role = ? 
+                WHERE id = ?
+            """, (nome, username, hashed_password, email, role, user_id))
+            return True, "User updated successfully"
 
         except sqlite3.IntegrityError as e:
             if "username" in str(e):
@@ -175,12 +1136,9 @@ class UserManager:
 
     def delete_user(self, user_id):
         try:
-            with self._connect() as conn:
-                cursor = conn.cursor()
-                # Delete the user with the specified ID
-                cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-                conn.commit()
-                print(f"User with ID {user_id} removed successfully.")
+            # Delete the user with the specified ID
+            self._writer().execute("DELETE FROM users WHERE id = ?", (user_id,))
+            print(f"User with ID {user_id} removed successfully.")
         except sqlite3.Error as e:
             print(f"Error removing user: {e}")
 
@@ -225,17 +1183,17 @@ class ClienteManager:
     def set_data_nascimento(self, data_nascimento):
         self.__data_nascimento = data_nascimento
         
+    SQL_CLIENTES = "SELECT id, nome, telefone, endereco, email, data_nascimento FROM clientes"
+
     # Método para adicionar um novo cliente ao banco de dados
     @staticmethod
     def add_cliente(nome, telefone, endereco, email, data_nascimento):
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO clientes (nome, telefone, endereco, email, data_nascimento)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (nome, telefone, endereco, email, data_nascimento))
-                conn.commit()
+            get_writer().execute("""
+                INSERT INTO clientes (nome, telefone, endereco, email, data_nascimento)
+                VALUES (?, ?, ?, ?, ?)
+            """, (nome, telefone, endereco, email, data_nascimento))
+            get_cache().invalidate('clientes')
 
         except sqlite3.Error as e:
             print(f"Erro ao adicionar cliente: {e}")
@@ -244,51 +1202,115 @@ class ClienteManager:
     # Método para atualizar um cliente existente no banco de dados
     @staticmethod
     def update_cliente(id, nome, telefone, endereco, email, data_nascimento):
-        with sqlite3.connect("sistema_clinico.db") as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE clientes
-                SET nome=?, telefone=?, endereco=?, email=?, data_nascimento=?
-                WHERE id=?
-            """, (nome, telefone, endereco, email, data_nascimento, id))
-            conn.commit()
-            print("Cliente atualizado com sucesso!")
+        get_writer().execute("""
+            UPDATE clientes
+            SET nome=?, telefone=?, endereco=?, email=?, data_nascimento=?
+            WHERE id=?
+        """, (nome, telefone, endereco, email, data_nascimento, id))
+        get_cache().invalidate('clientes')
+        print("Cliente atualizado com sucesso!")
             
     # Método para excluir um cliente do banco de dados
     @staticmethod
     def delete_cliente(id):
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM clientes WHERE id=?", (id,))
-                conn.commit()
-                print("Cliente removido com sucesso!")
+            get_writer().execute("DELETE FROM clientes WHERE id=?", (id,))
+            get_cache().invalidate('clientes')
+            print("Cliente removido com sucesso!")
         except sqlite3.Error as e:
             print(f"Erro ao excluir cliente: {e}")
             raise
 
+    @staticmethod
+    def _load_all_clients():
+        return fetch_records(ClienteManager.SQL_CLIENTES, ClienteRow)
+
+    @staticmethod
+    def iter_clients():
+        """
+        Yields every client as a ClienteRow without loading them all at once.
+        """
+        return iter_records(ClienteManager.SQL_CLIENTES, ClienteRow)
+
     @staticmethod
     def get_all_clients():
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, nome, telefone, endereco, email, data_nascimento FROM clientes")
-                rows = cursor.fetchall()
-                clientes = []
-                for row in rows:
-                    clientes.append({
-                        'id': row[0],
-                        'nome': row[1],
-                        'telefone': row[2],
-                        'endereco': row[3],
-                        'email': row[4],
-                        'data_nascimento': row[5]
-                    })
-                return clientes
+            # Lida através da cache; as escritas em clientes invalidam-na
+            return get_cache().get(('clientes', 'all'), ClienteManager._load_all_clients, ('clientes',))
         except sqlite3.Error as e:
             print(f"Erro ao buscar clientes: {e}")
             return []
 
+    @staticmethod
+    def _load_cliente(id):
+        rows = fetch_records(ClienteManager.SQL_CLIENTES + " WHERE id=?", ClienteRow, (id,))
+        return rows[0] if rows else None
+
+    @staticmethod
+    def get_cliente(id):
+        """
+        Returns one client as a ClienteRow (read-only, also indexable by
+        column name), or None if it does not exist.
+        """
+        try:
+            return get_cache().get(('clientes', id), lambda: ClienteManager._load_cliente(id), ('clientes',))
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar cliente: {e}")
+            return None
+
+    @staticmethod
+    def get_clients_page(page_size=PAGE_SIZE, cursor=None):
+        """
+        Returns one page of clients ordered by id as (clientes, next_cursor).
+        """
+        try:
+            return fetch_page_by_id(
+                "SELECT id, nome, telefone, endereco, email, data_nascimento FROM clientes {where} ORDER BY id",
+                ClienteRow, page_size, cursor
+            )
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar clientes: {e}")
+            return [], None
+
+    @staticmethod
+    def get_clients_changes(since):
+        """
+        Returns the clients added, changed or removed after row version since
+        as (clientes, removed_ids, version).
+        """
+        return fetch_changes(
+            'clientes',
+            """
+            SELECT id, nome, telefone, endereco, email, data_nascimento FROM clientes
+            WHERE versao > :since AND versao <= :version
+            """,
+            ClienteRow, since
+        )
+
+    @staticmethod
+    def search_clients(text, page_size=PAGE_SIZE, cursor=None):
+        """
+        Searches clients by name, phone, email and address (FTS5, prefix and
+        accent-insensitive). Returns one page as (clientes, next_cursor).
+        """
+        match = fts_query(text)
+        if match is None:
+            return ClienteManager.get_clients_page(page_size, cursor)
+        try:
+            return fetch_page_by_id(
+                """
+                SELECT clientes.id, clientes.nome, clientes.telefone, clientes.endereco,
+                       clientes.email, clientes.data_nascimento
+                FROM clientes_fts JOIN clientes ON clientes.id = clientes_fts.rowid
+                {where} ORDER BY clientes_fts.rowid
+                """,
+                ClienteRow, page_size, cursor,
+                conditions=["clientes_fts MATCH ?"], params=[match], id_column='clientes_fts.rowid'
+            )
+        except sqlite3.Error as e:
+            print(f"Erro ao pesquisar clientes: {e}")
+            return [], None
+
     def __str__(self):
         return f"Cliente: {self.__nome}, Telefone: {self.__telefone}"
 
@@ -338,50 +1360,132 @@ class MedicoManager:
     # Método para adicionar um novo médico ao banco de dados
     def add_medico(self, nome, telefone, email, crm):
 
-        with sqlite3.connect("sistema_clinico.db") as conn:
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO medicos (nome, telefone, email, crm) VALUES (?, ?, ?, ?);''', (nome, telefone, email, crm))
-            conn.commit()
+        get_writer().execute('''INSERT INTO medicos (nome, telefone, email, crm) VALUES (?, ?, ?, ?);''', (nome, telefone, email, crm))
+        get_cache().invalidate('medicos')
     
     # Método para atualizar um médico existente no banco de dados
     def update_medico(self, medico_id, nome, telefone, email, crm):
         # Dar update à base de dados
-        with sqlite3.connect("sistema_clinico.db") as conn:
-            cursor = conn.cursor()
-            cursor.execute("""UPDATE medicos
-                    SET nome = ?, telefone = ?, email = ?, crm = ?
-                    WHERE id = ?;""", (nome, telefone, email, crm, medico_id))
-            conn.commit()
-            print("Dados do médico atualizados com sucesso!")
+        get_writer().execute("""UPDATE medicos
+                SET nome = ?, telefone = ?, email = ?, crm = ?
+                WHERE id = ?;""", (nome, telefone, email, crm, medico_id))
+        get_cache().invalidate('medicos')
+        print("Dados do médico atualizados com sucesso!")
 
     # Método para excluir um médico do banco de dados
     def delete_medico(self, medico_id):
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                # Apagar oo médico com o id passado como parâmetro
-                cursor.execute("DELETE FROM medicos WHERE id = ?", (medico_id,))
-                conn.commit()
-                print(f"Medic with ID {medico_id} removed successfully.")
+            # Apagar oo médico com o id passado como parâmetro
+            get_writer().execute("DELETE FROM medicos WHERE id = ?", (medico_id,))
+            get_cache().invalidate('medicos')
+            print(f"Medic with ID {medico_id} removed successfully.")
         except sqlite3.Error as e:
             print(f"Error removing medic: {e}")    
 
+    SQL_MEDICOS = "SELECT id, nome, telefone, email, crm FROM medicos"
+
+    def _load_all_medicos(self):
+        return fetch_records(self.SQL_MEDICOS, MedicoRow)
+
+    def iter_medicos(self):
+        """
+        Yields every doctor as a MedicoRow without loading them all at once.
+        """
+        return iter_records(self.SQL_MEDICOS, MedicoRow)
+
     def get_all_medicos(self):
-        with sqlite3.connect('sistema_clinico.db') as conn:
-            cursor = conn.cursor()
-            query = "SELECT id, nome, telefone, email, crm FROM medicos;"
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            medicos = []
-            for row in rows:
-                medicos.append({
-                    'id': row[0],
-                    'nome': row[1],
-                    'telefone': row[2],
-                    'email': row[3],
-                    'crm': row[4]
-                })
-            return medicos
+        # Lida através da cache; as escritas em medicos invalidam-na
+        return get_cache().get(('medicos', 'all'), self._load_all_medicos, ('medicos',))
+
+    def _load_medico(self, medico_id):
+        rows = fetch_records(self.SQL_MEDICOS + " WHERE id = ?", MedicoRow, (medico_id,))
+        return rows[0] if rows else None
+
+    def get_medico(self, medico_id):
+        """
+        Returns one doctor as a MedicoRow (read-only, also indexable by
+        column name), or None if it does not exist.
+        """
+        try:
+            return get_cache().get(('medicos', medico_id), lambda: self._load_medico(medico_id), ('medicos',))
+        except sqlite3.Error as e:
+            print(f"Error fetching medic {medico_id}: {e}")
+            return None
+
+    def get_medicos_page(self, page_size=PAGE_SIZE, cursor=None):
+        """
+        Returns one page of doctors ordered by id as (medicos, next_cursor).
+        """
+        try:
+            return fetch_page_by_id(
+                "SELECT id, nome, telefone, email, crm FROM medicos {where} ORDER BY id",
+                MedicoRow, page_size, cursor
+            )
+        except sqlite3.Error as e:
+            print(f"Error fetching medics: {e}")
+            return [], None
+
+    def get_medicos_changes(self, since):
+        """
+        Returns the doctors added, changed or removed after row version since
+        as (medicos, removed_ids, version).
+        """
+        return fetch_changes(
+            'medicos',
+            "SELECT id, nome, telefone, email, crm FROM medicos WHERE versao > :since AND versao <= :version",
+            MedicoRow, since
+        )
+
+    def search_medicos(self, text, page_size=PAGE_SIZE, cursor=None):
+        """
+        Searches doctors by name, CRM and email (FTS5). Returns one page as
+        (medicos, next_cursor).
+        """
+        match = fts_query(text)
+        if match is None:
+            return self.get_medicos_page(page_size, cursor)
+        try:
+            return fetch_page_by_id(
+                """
+                SELECT medicos.id, medicos.nome, medicos.telefone, medicos.email, medicos.crm
+                FROM medicos_fts JOIN medicos ON medicos.id = medicos_fts.rowid
+                {where} ORDER BY medicos_fts.rowid
+                """,
+                MedicoRow, page_size, cursor,
+                conditions=["medicos_fts MATCH ?"], params=[match], id_column='medicos_fts.rowid'
+            )
+        except sqlite3.Error as e:
+            print(f"Error searching medics: {e}")
+            return [], None
+
+class ConflitoHorarioError(Exception):
+    """
+    Raised when a booking overlaps another consultation of the same doctor.
+    """
+    def __init__(self, medico_id, data, hora):
+        super().__init__(
+            f"O médico já tem uma consulta marcada a menos de {CONSULTA_DURACAO_MIN} minutos das {hora} em {data}."
+        )
+        self.medico_id = medico_id
+        self.data = data
+        self.hora = hora
+
+class ConflitoSerieError(ConflitoHorarioError):
+    """
+    Raised when occurrences of a series overlap other consultations of the
+    same doctor. conflitos lists the (data, hora) of every such occurrence.
+    """
+    def __init__(self, medico_id, conflitos):
+        data, hora = conflitos[0]
+        super().__init__(medico_id, data, hora)
+        self.conflitos = conflitos
+        datas = ', '.join(data for data, _ in conflitos[:5])
+        if len(conflitos) > 5:
+            datas += f" e mais {len(conflitos) - 5}"
+        self.args = (
+            f"O médico já tem consultas a menos de {CONSULTA_DURACAO_MIN} minutos em "
+            f"{len(conflitos)} das datas da série: {datas}.",
+        )
 
 class ConsultasManager:
     def __init__(self, data=None, hora=None, medico=None, cliente=None):
@@ -433,128 +1537,693 @@ class ConsultasManager:
         INNER JOIN medicos ON consultas.medico_id = medicos.id
     """
 
+    # Predicados por data sem funções sobre a coluna, para poderem usar idx_consultas_data
+    SQL_WHERE_FUTURE = " WHERE consultas.data >= DATE('now')"
+    SQL_WHERE_PAST = " WHERE consultas.data < DATE('now')"
+    SQL_WHERE_TODAY = " WHERE consultas.data = DATE('now')"
+    SQL_WHERE_TOMORROW = " WHERE consultas.data = DATE('now', '+1 day')"
+
+    PAGE_SIZE = PAGE_SIZE
+
+    # Âmbito -> (predicado, ordem). As consultas passadas aparecem das mais recentes para as mais antigas
+    PAGE_SCOPES = {
+        'future': (SQL_WHERE_FUTURE, 'ASC'),
+        'past': (SQL_WHERE_PAST, 'DESC'),
+        'today': (SQL_WHERE_TODAY, 'ASC'),
+        'tomorrow': (SQL_WHERE_TOMORROW, 'ASC'),
+    }
+
+    # Âmbitos de um só dia (a agenda): a data fica fora da ordem e do cursor.
+    # Valor: o modificador de DATE('now') que dá esse dia
+    AGENDA_SCOPES = {'today': '+0 days', 'tomorrow': '+1 day'}
+
+    # Ordenações das listas: coluna -> ORDER BY. Todas acabam em (data, hora, id), para servirem de cursor
+    SORT_COLUMNS = {
+        'data': ('consultas.data', 'consultas.hora', 'consultas.id'),
+        'cliente_nome': ('clientes.nome', 'consultas.data', 'consultas.hora', 'consultas.id'),
+        'medico_nome': ('medicos.nome', 'consultas.data', 'consultas.hora', 'consultas.id'),
+        'status': ('consultas.status', 'consultas.data', 'consultas.hora', 'consultas.id'),
+    }
+
+    # Posição de cada expressão de ordenação nas linhas de SQL_SELECT_QUERY (para o cursor)
+    SORT_FIELDS = {
+        'consultas.id': 0, 'clientes.nome': 1, 'medicos.nome': 2,
+        'consultas.data': 3, 'consultas.hora': 4, 'consultas.status': 5,
+    }
+
+    # Ordenar por nome: o CROSS JOIN percorre clientes/medicos pelo nome em vez de ordenar as consultas
+    SORT_JOINS = {
+        'cliente_nome': """
+            SELECT consultas.id, clientes.nome AS cliente_nome, medicos.nome AS medico_nome, consultas.data, consultas.hora, consultas.status
+            FROM clientes
+            CROSS JOIN consultas ON consultas.cliente_id = clientes.id
+            INNER JOIN medicos ON consultas.medico_id = medicos.id
+        """,
+        'medico_nome': """
+            SELECT consultas.id, clientes.nome AS cliente_nome, medicos.nome AS medico_nome, consultas.data, consultas.hora, consultas.status
+            FROM medicos
+            CROSS JOIN consultas ON consultas.medico_id = medicos.id
+            INNER JOIN clientes ON consultas.cliente_id = clientes.id
+        """,
+    }
+
+    # Filtros das listas -> condição com parâmetro com nome (o doente é pesquisado no FTS dos clientes)
+    FILTERS = {
+        'medico_id': "consultas.medico_id = :medico_id",
+        'status': "consultas.status = :status",
+        'date_from': "consultas.data >= :date_from",
+        'date_to': "consultas.data <= :date_to",
+        'cliente': "consultas.cliente_id IN (SELECT rowid FROM clientes_fts WHERE clientes_fts MATCH :cliente)",
+    }
+
+    # Filtro de datas do lado do limite do âmbito: uma só condição, para o índice usar a mais restritiva
+    SCOPE_DATE_FILTERS = {
+        ('future', 'date_from'): " WHERE consultas.data >= MAX(:date_from, DATE('now'))",
+        ('past', 'date_to'): " WHERE consultas.data < MIN(DATE(:date_to, '+1 day'), DATE('now'))",
+    }
+
+    # Até este número de consultas, ordená-las sai mais barato do que percorrer a lista (ver _plan)
+    SMALL_RESULT_ROWS = 5000
+
+    def _filter_conditions(self, scope, filters, cliente_index=True):
+        """
+        Returns the scope's WHERE clause, the extra SQL conditions and their
+        named parameters for a filters dict.
+        """
+        where = self.PAGE_SCOPES[scope][0]
+        conditions, params = [], {}
+        for name, value in (filters or {}).items():
+            if name not in self.FILTERS:
+                raise ValueError(f"Unknown filter: {name}")
+            if name == 'cliente':
+                value = fts_query(value)
+            if value is None or value == '':
+                continue
+            params[name] = value
+            if (scope, name) in self.SCOPE_DATE_FILTERS:
+                where = self.SCOPE_DATE_FILTERS[(scope, name)]
+            elif name == 'cliente' and not cliente_index:
+                conditions.append('+' + self.FILTERS[name])  # O + impede o uso do índice
+            else:
+                conditions.append(self.FILTERS[name])
+        return where, conditions, params
+
+    def _sort_columns(self, scope, sort):
+        if sort not in self.SORT_COLUMNS:
+            raise ValueError(f"Unknown sort: {sort}")
+        columns = self.SORT_COLUMNS[sort]
+        if scope in self.AGENDA_SCOPES:
+            # A data é sempre a mesma: fica fora da ordem e do cursor
+            columns = tuple(column for column in columns if column != 'consultas.data')
+        return columns
+
+    def _is_small(self, conn, where, conditions, params):
+        # Conta as consultas só até SMALL_RESULT_ROWS + 1: o custo fica limitado
+        if conditions:
+            where = (where + " AND " if where else " WHERE ") + " AND ".join(conditions)
+        count = conn.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM consultas{where} LIMIT :limit)",
+            dict(params, limit=self.SMALL_RESULT_ROWS + 1)
+        ).fetchone()[0]
+        return count <= self.SMALL_RESULT_ROWS
+
+    def _plan(self, conn, scope, sort, filters):
+        """
+        Returns (cliente_index, by_name): whether the patient filter drives
+        the query through idx_consultas_cliente, and whether a name sort walks
+        clientes/medicos by name (SORT_JOINS).
+        """
+        filters = dict(filters or {})
+        cliente = fts_query(filters.pop('cliente', None))
+        if cliente is not None and self._is_small(conn, "", [self.FILTERS['cliente']], {'cliente': cliente}):
+            return True, False
+        by_name = sort in self.SORT_JOINS and not self._is_small(conn, *self._filter_conditions(scope, filters))
+        return False, by_name
+
+    def _page_query(self, scope, cursor, sort='data', descending=None, filters=None, plan=(True, False)):
+        """
+        Builds the keyset query for one page with the plan chosen by _plan.
+        """
+        cliente_index, by_name = plan
+        scope_order = self.PAGE_SCOPES[scope][1]
+        order = scope_order if descending is None else ('DESC' if descending else 'ASC')
+        columns = self._sort_columns(scope, sort)
+        where, conditions, params = self._filter_conditions(scope, filters, cliente_index)
+        select = self.SORT_JOINS[sort] if by_name else self.SQL_SELECT_QUERY
+        if cursor is not None:
+            values = decode_cursor(cursor)
+            if len(values) != len(columns):
+                raise ValueError(f"Invalid cursor: {cursor!r}")
+            op = '<' if order == 'DESC' else '>'
+            names = [f"c{position}" for position in range(len(columns))]
+            if sort == 'data' and scope not in self.AGENDA_SCOPES and order == scope_order and where == self.PAGE_SCOPES[scope][0]:
+                # O cursor já está dentro do âmbito: só a comparação (data, hora, id) fica
+                where = ""
+            else:
+                conditions.append(f"{columns[0]} {op}= :c0")
+            conditions.append(f"({', '.join(columns)}) {op} ({', '.join(':' + name for name in names)})")
+            params.update(zip(names, values))
+        if conditions:
+            where = (where + " AND " if where else " WHERE ") + " AND ".join(conditions)
+        query = (select + where +
+                 " ORDER BY " + ", ".join(f"{column} {order}" for column in columns) + " LIMIT :limit")
+        return query, params
+
+    def get_consultas_page(self, scope='future', page_size=PAGE_SIZE, cursor=None, sort='data', descending=None,
+                           filters=None):
+        """
+        Returns one page of consultations for scope ('future', 'past', 'today'
+        or 'tomorrow') as (consultas, next_cursor). sort is one of
+        SORT_COLUMNS; filters may hold medico_id, status, date_from, date_to
+        and cliente.
+        """
+        if scope not in self.PAGE_SCOPES:
+            raise ValueError(f"Unknown scope: {scope}")
+        try:
+            with get_pool().connection() as conn:
+                plan = self._plan(conn, scope, sort, filters)
+                query, params = self._page_query(scope, cursor, sort, descending, filters, plan)
+                # Pede uma linha a mais para saber se existe página seguinte
+                params['limit'] = page_size + 1
+                cursor_db = conn.cursor()
+                cursor_db.execute(query, params)
+                rows = cursor_db.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error fetching {scope} consultations page: {e}")
+            return [], None
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = encode_cursor([last[self.SORT_FIELDS[column]] for column in self._sort_columns(scope, sort)])
+
+        return list(map(ConsultaRow.from_row, rows)), next_cursor
+
+    def get_consultas_changes(self, scope, since, filters=None):
+        """
+        Returns (consultas, removed_ids, version) for the consultations
+        changed after row version since, renamed clients and doctors included.
+        in_scope tells whether a row still matches the scope and filters.
+        """
+        if scope not in self.PAGE_SCOPES:
+            raise ValueError(f"Unknown scope: {scope}")
+        where, conditions, params = self._filter_conditions(scope, filters)
+        predicate = " AND ".join([where.replace(" WHERE ", "", 1)] + conditions)
+        # Cada ramo do UNION usa um índice: versao das consultas, ou versao de clientes/medicos
+        # seguida de idx_consultas_cliente / idx_consultas_medico
+        query = f"""
+            SELECT consultas.id, clientes.nome, medicos.nome, consultas.data, consultas.hora,
+                   consultas.status, {predicate}
+            FROM consultas
+            INNER JOIN clientes ON consultas.cliente_id = clientes.id
+            INNER JOIN medicos ON consultas.medico_id = medicos.id
+            WHERE consultas.id IN (
+                SELECT id FROM consultas WHERE versao > :since AND versao <= :version
+                UNION
+                SELECT consultas.id FROM clientes JOIN consultas ON consultas.cliente_id = clientes.id
+                WHERE clientes.versao > :since AND clientes.versao <= :version AND {predicate}
+                UNION
+                SELECT consultas.id FROM medicos JOIN consultas ON consultas.medico_id = medicos.id
+                WHERE medicos.versao > :since AND medicos.versao <= :version AND {predicate}
+            )
+        """
+        return fetch_changes(
+            'consultas', query,
+            ConsultaChangeRow, since, params=params
+        )
+
+    def get_agenda(self, scope='today', page_size=PAGE_SIZE):
+        """
+        Returns the first page of the 'today' or 'tomorrow' agenda as
+        (consultas, next_cursor, version), cached by day and row version.
+        Returns None on error.
+        """
+        if scope not in self.AGENDA_SCOPES:
+            raise ValueError(f"Unknown agenda scope: {scope}")
+        try:
+            with get_pool().connection() as conn:
+                day, version = conn.execute(
+                    "SELECT DATE('now', ?), atual FROM row_version WHERE id = 1", (self.AGENDA_SCOPES[scope],)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error fetching {scope} agenda: {e}")
+            return None
+
+        def load():
+            consultas, next_cursor = self.get_consultas_page(scope, page_size)
+            return consultas, next_cursor, version
+        # 'agenda' permite descartar só estas entradas (discard_agenda)
+        return get_cache().get(('agenda', scope, day, version, page_size), load, self.CACHE_TABLES + ('agenda',))
+
+    def prefetch_agenda(self, page_size=PAGE_SIZE):
+        """
+        Reads today's and tomorrow's agenda into the cache and returns them as
+        {scope: snapshot}.
+        """
+        agenda = {}
+        for scope in self.AGENDA_SCOPES:
+            snapshot = self.get_agenda(scope, page_size)
+            if snapshot is not None:
+                agenda[scope] = snapshot
+        return agenda
+
+    def discard_agenda(self):
+        # Um login falhado não deixa a agenda em memória
+        get_cache().invalidate('agenda')
+
     def get_future_consultas(self):
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                query = self.SQL_SELECT_QUERY + " WHERE DATE(consultas.data) >= DATE('now')"
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                consultas = []
-                for row in rows:
-                    consultas.append({
-                        'id': row[0],
-                        'cliente_nome': row[1],
-                        'medico_nome': row[2],
-                        'data': row[3],
-                        'hora': row[4],
-                        'status': row[5]
-                    })
-                print(f"Fetched {len(consultas)} future consultations.")
-                return consultas
+            consultas = fetch_records(self.SQL_SELECT_QUERY + self.SQL_WHERE_FUTURE, ConsultaRow)
+            print(f"Fetched {len(consultas)} future consultations.")
+            return consultas
         except sqlite3.Error as e:
             print(f"Error fetching future consultations: {e}")
             return []
 
     def get_past_consultas(self):
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                query = self.SQL_SELECT_QUERY + " WHERE DATE(consultas.data) < DATE('now')"
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                consultas = []
-                for row in rows:
-                    consultas.append({
-                        'id': row[0],
-                        'cliente_nome': row[1],
-                        'medico_nome': row[2],
-                        'data': row[3],
-                        'hora': row[4],
-                        'status': row[5]
-                    })
-                print(f"Fetched {len(consultas)} past consultations.")
-                return consultas
+            consultas = fetch_records(self.SQL_SELECT_QUERY + self.SQL_WHERE_PAST, ConsultaRow)
+            print(f"Fetched {len(consultas)} past consultations.")
+            return consultas
         except sqlite3.Error as e:
             print(f"Error fetching past consultations: {e}")
             return []
 
     def get_today_consultas(self):
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                query = self.SQL_SELECT_QUERY + " WHERE DATE(consultas.data) = DATE('now')"
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                consultas = []
-                for row in rows:
-                    consultas.append({
-                        'id': row[0],
-                        'cliente_nome': row[1],
-                        'medico_nome': row[2],
-                        'data': row[3],
-                        'hora': row[4],
-                        'status': row[5]
-                    })
-                print(f"Fetched {len(consultas)} consultations for today.")
-                return consultas
+            consultas = fetch_records(self.SQL_SELECT_QUERY + self.SQL_WHERE_TODAY, ConsultaRow)
+            print(f"Fetched {len(consultas)} consultations for today.")
+            return consultas
         except sqlite3.Error as e:
             print(f"Error fetching today's consultations: {e}")
             return []
 
+    def iter_consultas(self, scope='future'):
+        """
+        Yields the consultations of a scope ('future', 'past' or 'today') as
+        ConsultaRow records, in page order, without loading them all at once.
+        """
+        if scope not in self.PAGE_SCOPES:
+            raise ValueError(f"Unknown scope: {scope}")
+        where, order = self.PAGE_SCOPES[scope]
+        query = (self.SQL_SELECT_QUERY + where +
+                 f" ORDER BY consultas.data {order}, consultas.hora {order}, consultas.id {order}")
+        return iter_records(query, ConsultaRow)
+
     def add_consulta(self, cliente, medico, data, hora, status):
         if not cliente or not medico or not data or not hora:
             raise ValueError("Todos os campos devem ser preenchidos.")
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO consultas (cliente_id, medico_id, data, hora, status) 
-                    VALUES (?, ?, ?, ?, ?)
-                """, (cliente, medico, data, hora, status))
-                conn.commit()
-                print("Consulta added successfully.")
+            get_writer().execute("""
+                INSERT INTO consultas (cliente_id, medico_id, data, hora, status) 
+                VALUES (?, ?, ?, ?, ?)
+            """, (cliente, medico, data, hora, status))
+            get_cache().invalidate('consultas')
+            print("Consulta added successfully.")
+        except sqlite3.IntegrityError as e:
+            if CONFLITO_HORARIO in str(e):
+                raise ConflitoHorarioError(medico, data, hora) from e
+            print(f"Error adding consulta: {e}")
+            raise
         except sqlite3.Error as e:
             print(f"Error adding consulta: {e}")
             raise
 
     def update_consulta(self, consulta_id, cliente_id, medico_id, data, hora, status):
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    UPDATE consultas 
-                    SET cliente_id=?, medico_id=?, data=?, hora=?, status=?
-                    WHERE id=?
-                """, (cliente_id, medico_id, data, hora, status, consulta_id))
-                conn.commit()
-                print(f"Consulta {consulta_id} updated successfully.")
+            get_writer().execute("""
+                UPDATE consultas 
+                SET cliente_id=?, medico_id=?, data=?, hora=?, status=?
+                WHERE id=?
+            """, (cliente_id, medico_id, data, hora, status, consulta_id))
+            get_cache().invalidate('consultas')
+            print(f"Consulta {consulta_id} updated successfully.")
+        except sqlite3.IntegrityError as e:
+            if CONFLITO_HORARIO in str(e):
+                raise ConflitoHorarioError(medico_id, data, hora) from e
+            print(f"Error updating consulta {consulta_id}: {e}")
+            return None
         except sqlite3.Error as e:
             print(f"Error updating consulta {consulta_id}: {e}")
             return None
 
+    # Tabelas de que dependem as leituras de uma consulta (para invalidar a cache)
+    CACHE_TABLES = ('consultas', 'clientes', 'medicos')
+
+    def _load_consulta(self, consulta_id):
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT consultas.id, clientes.nome AS cliente_nome, medicos.nome AS medico_nome, consultas.data, consultas.hora, consultas.status
+                FROM consultas
+                JOIN clientes ON consultas.cliente_id = clientes.id
+                JOIN medicos ON consultas.medico_id = medicos.id
+                WHERE consultas.id = ?
+            """, (consulta_id,))
+            return cursor.fetchone()
+
     def get_consulta(self, consulta_id):
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT consultas.id, clientes.nome AS cliente_nome, medicos.nome AS medico_nome, consultas.data, consultas.hora, consultas.status
-                    FROM consultas
-                    JOIN clientes ON consultas.cliente_id = clientes.id
-                    JOIN medicos ON consultas.medico_id = medicos.id
-                    WHERE consultas.id = ?
-                """, (consulta_id,))
-                return cursor.fetchone()
+            return get_cache().get(
+                ('consultas', consulta_id), lambda: self._load_consulta(consulta_id), self.CACHE_TABLES
+            )
+        except sqlite3.Error as e:
+            print(f"Error fetching consulta {consulta_id}: {e}")
+            return None
+
+    def _load_consulta_participants(self, consulta_id):
+        with get_pool().connection() as conn:
+            row = conn.execute("""
+                SELECT consultas.cliente_id, clientes.nome, consultas.medico_id, medicos.nome, consultas.serie_id
+                FROM consultas
+                JOIN clientes ON consultas.cliente_id = clientes.id
+                JOIN medicos ON consultas.medico_id = medicos.id
+                WHERE consultas.id = ?
+            """, (consulta_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('cliente_id', 'cliente_nome', 'medico_id', 'medico_nome', 'serie_id'), row))
+
+    def get_consulta_participants(self, consulta_id):
+        """
+        Returns cliente_id, cliente_nome, medico_id, medico_nome and serie_id
+        of a consultation as a dict, or None.
+        """
+        try:
+            return get_cache().get(
+                ('consulta_participants', consulta_id),
+                lambda: self._load_consulta_participants(consulta_id), self.CACHE_TABLES
+            )
         except sqlite3.Error as e:
             print(f"Error fetching consulta {consulta_id}: {e}")
             return None
 
     def del_consulta(self, consulta_id):
         try:
-            with sqlite3.connect("sistema_clinico.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM consultas WHERE id = ?", (consulta_id,))
-                conn.commit()
-                print(f"Consulta with ID {consulta_id} removed successfully.")
+            get_writer().execute("DELETE FROM consultas WHERE id = ?", (consulta_id,))
+            get_cache().invalidate('consultas')
+            print(f"Consulta with ID {consulta_id} removed successfully.")
         except sqlite3.Error as e:
             print(f"Error removing consulta {consulta_id}: {e}")
+
+
+# Máximo de ocorrências marcadas de uma vez numa série
+MAX_OCORRENCIAS = 200
+
+
+class RecurrenceRule:
+    """
+    Repetition rule of a consultation series: 'semanal' every `intervalo`
+    weeks, 'mensal' every `intervalo` months on the same weekday of the month
+    (months without it are skipped).
+    """
+    REGRAS = ('semanal', 'mensal')
+
+    def __init__(self, regra, intervalo=1):
+        if regra not in self.REGRAS:
+            raise ValueError(f"Unknown rule: {regra}")
+        if int(intervalo) < 1:
+            raise ValueError("O intervalo deve ser pelo menos 1.")
+        self.regra = regra
+        self.intervalo = int(intervalo)
+
+    def _weekly(self, inicio):
+        step = timedelta(weeks=self.intervalo)
+        day = inicio
+        while True:
+            yield day
+            day += step
+
+    def _monthly(self, inicio):
+        nth = (inicio.day - 1) // 7
+        year, month = inicio.year, inicio.month
+        while True:
+            first = date(year, month, 1)
+            day = 1 + (inicio.weekday() - first.weekday()) % 7 + 7 * nth
+            if day <= calendar.monthrange(year, month)[1]:
+                yield date(year, month, day)
+            month += self.intervalo
+            year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+
+    def dates(self, inicio, ocorrencias=None, fim=None):
+        """
+        Yields the dates of the series from inicio (datetime.date), stopping
+        after `ocorrencias` dates or after fim, whichever comes first.
+        """
+        if ocorrencias is None and fim is None:
+            raise ValueError("Indique o número de ocorrências ou a data final.")
+        days = self._weekly(inicio) if self.regra == 'semanal' else self._monthly(inicio)
+        for count, day in enumerate(days):
+            if (ocorrencias is not None and count >= ocorrencias) or (fim is not None and day > fim):
+                return
+            yield day
+
+
+class SeriesManager:
+    """
+    Books and edits series of repeated consultations.
+    """
+    # Candidatos sobrepostos a outra consulta do médico, comparados em minutos como os triggers;
+    # as consultas da própria série a partir de :desde não contam, porque vão ser movidas
+    SQL_CONFLITOS = f"""
+        SELECT candidato.data, candidato.hora
+        FROM (
+            SELECT key, json_extract(value, '$[0]') AS data, json_extract(value, '$[1]') AS hora
+            FROM json_each(:candidatos)
+        ) AS candidato
+        WHERE EXISTS (
+            SELECT 1 FROM consultas
+            WHERE consultas.medico_id = :medico_id
+              AND consultas.data = candidato.data
+              AND ABS({minutes_sql('consultas.hora')} - {minutes_sql('candidato.hora')}) < {CONSULTA_DURACAO_MIN}
+              AND (:serie_id IS NULL OR consultas.serie_id IS NOT :serie_id OR consultas.data < :desde)
+        )
+        ORDER BY candidato.key
+    """
+
+    def _find_conflicts(self, conn, medico_id, slots, serie_id=None, desde=None):
+        rows = conn.execute(self.SQL_CONFLITOS, {
+            'candidatos': json.dumps(slots), 'medico_id': medico_id,
+            'serie_id': serie_id, 'desde': desde,
+        }).fetchall()
+        return [tuple(row) for row in rows]
+
+    def find_conflicts(self, medico_id, slots):
+        """
+        Returns the (data, hora) slots that overlap an existing consultation
+        of the doctor.
+        """
+        try:
+            with get_pool().connection() as conn:
+                return self._find_conflicts(conn, medico_id, [list(slot) for slot in slots])
+        except sqlite3.Error as e:
+            print(f"Error checking series conflicts: {e}")
+            raise
+
+    def add_series(self, cliente_id, medico_id, inicio, hora, status, rule, ocorrencias=None, fim=None,
+                   skip_conflicts=False):
+        """
+        Books a series starting on inicio at hora, repeated by rule up to
+        ocorrencias times or until fim. Overlaps raise ConflitoSerieError
+        unless skip_conflicts leaves them out. Returns (serie_id, booked,
+        skipped).
+        """
+        if not cliente_id or not medico_id or not inicio or not hora:
+            raise ValueError("Todos os campos devem ser preenchidos.")
+        ocorrencias = min(ocorrencias or MAX_OCORRENCIAS, MAX_OCORRENCIAS)
+        slots = [(day.isoformat(), hora) for day in rule.dates(inicio, ocorrencias, fim)]
+        if not slots:
+            raise ValueError("A série não tem nenhuma data.")
+
+        def run(conn):
+            if not conn.in_transaction:
+                conn.execute("BEGIN")  # A verificação e as inserções ficam na mesma transação
+            skipped = self._find_conflicts(conn, medico_id, slots)
+            if skipped and not skip_conflicts:
+                raise ConflitoSerieError(medico_id, skipped)
+            booked = [slot for slot in slots if slot not in set(skipped)]
+            if not booked:
+                raise ConflitoSerieError(medico_id, skipped)
+            serie_id = conn.execute("""
+                INSERT INTO series (cliente_id, medico_id, hora, regra, intervalo, inicio, fim)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (cliente_id, medico_id, hora, rule.regra, rule.intervalo, slots[0][0], slots[-1][0])).lastrowid
+            conn.executemany("""
+                INSERT INTO consultas (cliente_id, medico_id, data, hora, status, serie_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(cliente_id, medico_id, data, hora, status, serie_id) for data, hora in booked])
+            return serie_id, booked, skipped
+
+        try:
+            result = get_writer().run(run)
+            get_cache().invalidate('consultas')
+            print(f"Series {result[0]} added with {len(result[1])} consultations.")
+            return result
+        except sqlite3.IntegrityError as e:
+            if CONFLITO_HORARIO in str(e):
+                raise ConflitoHorarioError(medico_id, slots[0][0], hora) from e
+            print(f"Error adding series: {e}")
+            raise
+        except sqlite3.Error as e:
+            print(f"Error adding series: {e}")
+            raise
+
+    def update_following(self, consulta_id, cliente_id, medico_id, data, hora, status):
+        """
+        Edits a consultation and the following occurrences of its series;
+        earlier ones stay in the original series. Returns the number of
+        consultations changed.
+        """
+        novo_inicio = date.fromisoformat(data)
+
+        def run(conn):
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            row = conn.execute("""
+                SELECT consultas.serie_id, consultas.data, series.regra, series.intervalo, series.inicio
+                FROM consultas JOIN series ON series.id = consultas.serie_id
+                WHERE consultas.id = ?
+            """, (consulta_id,)).fetchone()
+            if row is None:
+                raise ValueError("A consulta não pertence a uma série.")
+            serie_id, desde, regra, intervalo, inicio = row
+            rule = RecurrenceRule(regra, intervalo)
+
+            # idx_consultas_serie (serie_id, data); a consulta editada é sempre a primeira
+            ids = [consulta_id] + [row_id for (row_id,) in conn.execute("""
+                SELECT id FROM consultas WHERE serie_id = ? AND data >= ? AND id != ? ORDER BY data, hora, id
+            """, (serie_id, desde, consulta_id)).fetchall()]
+            slots = [(day.isoformat(), hora) for day in rule.dates(novo_inicio, len(ids))]
+            conflitos = self._find_conflicts(conn, medico_id, slots, serie_id, desde)
+            if conflitos:
+                raise ConflitoSerieError(medico_id, conflitos)
+
+            if desde > inicio:
+                # Divide a série: as ocorrências anteriores ficam na original
+                nova_serie = conn.execute("""
+                    INSERT INTO series (cliente_id, medico_id, hora, regra, intervalo, inicio, fim)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (cliente_id, medico_id, hora, regra, intervalo, slots[0][0], slots[-1][0])).lastrowid
+                conn.execute("""
+                    UPDATE series SET fim = (SELECT MAX(data) FROM consultas WHERE serie_id = ? AND data < ?)
+                    WHERE id = ?
+                """, (serie_id, desde, serie_id))
+            else:
+                nova_serie = serie_id
+                conn.execute("""
+                    UPDATE series SET cliente_id = ?, medico_id = ?, hora = ?, inicio = ?, fim = ? WHERE id = ?
+                """, (cliente_id, medico_id, hora, slots[0][0], slots[-1][0], serie_id))
+
+            changes = [
+                (cliente_id, medico_id, slot_data, slot_hora, nova_serie, row_id)
+                for row_id, (slot_data, slot_hora) in zip(ids, slots)
+            ]
+            # Ao avançar as datas atualiza-se da última para a primeira, para que nenhuma
+            # ocorrência passe por cima de outra da mesma série que ainda não foi movida
+            if slots[0][0] > desde:
+                changes.reverse()
+            conn.executemany("""
+                UPDATE consultas SET cliente_id = ?, medico_id = ?, data = ?, hora = ?, serie_id = ? WHERE id = ?
+            """, changes)
+            conn.execute("UPDATE consultas SET status = ? WHERE id = ?", (status, consulta_id))
+            return len(ids)
+
+        try:
+            count = get_writer().run(run)
+            get_cache().invalidate('consultas')
+            print(f"Consulta {consulta_id} and {count - 1} following consultations updated successfully.")
+            return count
+        except sqlite3.IntegrityError as e:
+            if CONFLITO_HORARIO in str(e):
+                raise ConflitoHorarioError(medico_id, data, hora) from e
+            print(f"Error updating series of consulta {consulta_id}: {e}")
+            raise
+        except sqlite3.Error as e:
+            print(f"Error updating series of consulta {consulta_id}: {e}")
+            raise
+
+
+# Horário de trabalho por dia da semana (0 = segunda-feira). Dias sem entrada não têm consultas.
+HORARIO_TRABALHO = {
+    weekday: [('09:00', '13:00'), ('14:00', '18:00')] for weekday in range(5)
+}
+
+
+def _to_minutes(hora):
+    return int(hora[:2]) * 60 + int(hora[3:5])
+
+
+def _to_hora(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class AvailabilityManager:
+    """
+    Finds free appointment slots for a doctor.
+    """
+    def __init__(self, working_hours=None, duracao=CONSULTA_DURACAO_MIN):
+        self.working_hours = working_hours if working_hours is not None else HORARIO_TRABALHO
+        self.duracao = duracao
+
+    def _busy_index(self, medico_id, start_date, end_date):
+        # data -> horas de início ordenadas, a partir de idx_consultas_medico (medico_id, data, hora)
+        busy = {}
+        with get_pool().connection() as conn:
+            rows = conn.execute("""
+                SELECT data, hora FROM consultas
+                WHERE medico_id = ? AND data BETWEEN ? AND ?
+                ORDER BY data, hora
+            """, (medico_id, start_date.isoformat(), end_date.isoformat())).fetchall()
+        for data, hora in rows:
+            busy.setdefault(data, []).append(_to_minutes(hora))
+        return busy
+
+    def _is_free(self, starts, start, length):
+        # Sobrepõe-se a uma consulta existente b se b < start + length e start < b + duracao
+        i = bisect.bisect_right(starts, start - self.duracao)
+        return i == len(starts) or starts[i] >= start + length
+
+    def free_slots(self, medico_id, start_date, end_date, slot_min=None, limit=None):
+        """
+        Returns the free (data, hora) slots of the doctor between start_date
+        and end_date (datetime.date, inclusive), slot_min minutes long.
+        """
+        slot_min = slot_min or self.duracao
+        busy = self._busy_index(medico_id, start_date, end_date)
+        now = datetime.now()
+        slots = []
+        day = start_date
+        while day <= end_date:
+            data = day.isoformat()
+            starts = busy.get(data, [])
+            for inicio, fim in self.working_hours.get(day.weekday(), []):
+                minute = _to_minutes(inicio)
+                last = _to_minutes(fim) - slot_min
+                if day == now.date():
+                    # Hoje só interessam os horários que ainda não passaram
+                    minute = max(minute, -(-(now.hour * 60 + now.minute) // slot_min) * slot_min)
+                while minute <= last:
+                    if self._is_free(starts, minute, slot_min):
+                        slots.append((data, _to_hora(minute)))
+                        if limit and len(slots) >= limit:
+                            return slots
+                    minute += slot_min
+            day += timedelta(days=1)
+        return slots
+
+    def next_available(self, medico_id, from_date=None, slot_min=None, horizon_days=365):
+        """
+        Returns the first free (data, hora) slot of the doctor from from_date
+        onwards, or None if there is none within horizon_days.
+        """
+        day = from_date or date.today()
+        end = day + timedelta(days=horizon_days)
+        # Procura por semanas para não carregar o ano inteiro quando há vagas cedo
+        while day <= end:
+            week_end = min(day + timedelta(days=6), end)
+            slots = self.free_slots(medico_id, day, week_end, slot_min, limit=1)
+            if slots:
+                return slots[0]
+            day = week_end + timedelta(days=1)
+        return None
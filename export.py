@@ -0,0 +1,175 @@
+"""
+Exportação de consultas, clientes e médicos para CSV, JSON Lines ou formato colunar.
+
+As linhas são lidas da base de dados aos blocos (fetchmany) e escritas à medida
+que chegam, por isso a memória usada não depende do número de linhas.
+
+O formato colunar é JSON Lines por grupos de linhas: a primeira linha do
+ficheiro descreve as colunas e cada linha seguinte guarda um grupo de até
+ROW_GROUP_SIZE linhas, coluna a coluna. read_columnar() lê-o de volta.
+
+Uso:
+    python export.py consultas consultas.csv [--from 2024-01-01] [--to 2024-12-31]
+    python export.py clientes clientes.jsonl [--db sistema_clinico.db]
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+
+import database
+
+# Linhas pedidas à base de dados de cada vez
+FETCH_SIZE = 1000
+
+# Linhas por grupo no formato colunar
+ROW_GROUP_SIZE = 10000
+
+FORMATS = ('csv', 'jsonl', 'columnar')
+
+EXPORT_SOURCES = {
+    'consultas': (
+        ('id', 'cliente_nome', 'medico_nome', 'data', 'hora', 'status'),
+        database.ConsultasManager.SQL_SELECT_QUERY,
+        " ORDER BY consultas.data, consultas.hora, consultas.id",
+    ),
+    'clientes': (
+        ('id', 'nome', 'telefone', 'endereco', 'email', 'data_nascimento'),
+        "SELECT id, nome, telefone, endereco, email, data_nascimento FROM clientes",
+        " ORDER BY id",
+    ),
+    'medicos': (
+        ('id', 'nome', 'telefone', 'email', 'crm'),
+        "SELECT id, nome, telefone, email, crm FROM medicos",
+        " ORDER BY id",
+    ),
+}
+
+
+def iter_rows(source, date_from=None, date_to=None, db_path=None):
+    """
+    Yields the rows of an export source as tuples, FETCH_SIZE at a time
+    from the database. The date range (inclusive, 'YYYY-MM-DD') only
+    applies to consultations and is served by idx_consultas_data.
+    The whole export reads from one snapshot of the database.
+    """
+    if source not in EXPORT_SOURCES:
+        raise ValueError(f"Unknown source: {source}")
+    _, query, order = EXPORT_SOURCES[source]
+    conditions, params = [], []
+    if source == 'consultas':
+        if date_from:
+            conditions.append("consultas.data >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("consultas.data <= ?")
+            params.append(date_to)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    with database.get_pool(db_path).connection() as conn:
+        cursor = conn.execute(query + order, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+
+
+def write_csv(f, columns, rows):
+    out = csv.writer(f)
+    out.writerow(columns)
+    count = 0
+    for row in rows:
+        out.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(f, columns, rows):
+    count = 0
+    for row in rows:
+        f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def write_columnar(f, columns, rows):
+    f.write(json.dumps({'format': 'gestor-columnar', 'version': 1, 'columns': columns}) + '\n')
+    count = 0
+    while True:
+        group = list(itertools.islice(rows, ROW_GROUP_SIZE))
+        if not group:
+            break
+        data = [list(values) for values in zip(*group)]
+        f.write(json.dumps({'rows': len(group), 'data': data}, ensure_ascii=False) + '\n')
+        count += len(group)
+    return count
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'columnar': write_columnar}
+
+
+def read_columnar(path):
+    """
+    Yields the rows of a columnar export as dicts, one row group at a time.
+    """
+    with open(path, encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        columns = header['columns']
+        for line in f:
+            group = json.loads(line)
+            for values in zip(*group['data']):
+                yield dict(zip(columns, values))
+
+
+def format_for(path):
+    """
+    Guesses the export format from the file extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if extension in ('.col', '.columnar'):
+        return 'columnar'
+    return 'csv'
+
+
+def export(source, path, file_format=None, date_from=None, date_to=None, db_path=None):
+    """
+    Streams an export source ('consultas', 'clientes' or 'medicos') to a
+    file in the given format (default: from the extension) and returns
+    the number of rows written.
+    """
+    file_format = file_format or format_for(path)
+    if file_format not in WRITERS:
+        raise ValueError(f"Unknown format: {file_format}")
+    columns = list(EXPORT_SOURCES[source][0])
+    rows = iter_rows(source, date_from, date_to, db_path)
+    try:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            return WRITERS[file_format](f, columns, rows)
+    finally:
+        rows.close()  # Devolve a conexão ao pool mesmo que a escrita falhe
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportação de dados do Gestor de Consultas")
+    parser.add_argument('source', choices=sorted(EXPORT_SOURCES))
+    parser.add_argument('path', help="ficheiro de destino")
+    parser.add_argument('--format', choices=FORMATS, default=None, help="por defeito pela extensão")
+    parser.add_argument('--from', dest='date_from', default=None, help="data inicial (AAAA-MM-DD), só consultas")
+    parser.add_argument('--to', dest='date_to', default=None, help="data final (AAAA-MM-DD), só consultas")
+    parser.add_argument('--db', default=None, help="base de dados (por defeito a da aplicação)")
+    args = parser.parse_args()
+
+    if args.db:
+        database.DB_PATH = os.path.abspath(args.db)
+    database.init_db()
+    count = export(args.source, args.path, args.format, args.date_from, args.date_to)
+    print(f"{count} linhas exportadas para {args.path}")
+
+
+if __name__ == '__main__':
+    main()
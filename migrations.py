@@ -0,0 +1,479 @@
+"""
+Migrações versionadas do esquema do sistema_clinico.db.
+
+A versão do esquema fica guardada em PRAGMA user_version. Cada migração corre
+na sua própria transação e só avança a versão quando tudo corre bem, por isso
+uma falha deixa a base de dados na versão anterior.
+
+Uso:
+    python migrations.py [--db sistema_clinico.db] [--target N] [--dry-run]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+
+class Migration:
+    """
+    One ordered schema step. A statement may be SQL text or a callable taking
+    the connection. `indexes` steps only build indexes (writes wait for them)
+    and are followed by PRAGMA optimize.
+    """
+    def __init__(self, version, description, statements, indexes=False):
+        self.version = version
+        self.description = description
+        self.statements = statements
+        self.indexes = indexes
+
+    def apply(self, conn):
+        for statement in self.statements:
+            if callable(statement):
+                statement(conn)
+            else:
+                conn.execute(statement)
+
+
+# Comandos SQL para criar as tabelas
+create_users_table = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nome TEXT NOT NULL,
+    username TEXT NOT NULL UNIQUE,
+    password BLOB NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    role TEXT NOT NULL CHECK(role IN ('admin', 'padrao'))
+);
+"""
+
+create_clientes_table = """
+CREATE TABLE IF NOT EXISTS clientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nome TEXT NOT NULL,
+    telefone TEXT,
+    endereco TEXT,
+    email TEXT UNIQUE,
+    data_nascimento DATE
+);
+"""
+
+create_medicos_table = """
+CREATE TABLE IF NOT EXISTS medicos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nome TEXT NOT NULL,
+    telefone TEXT,
+    email TEXT UNIQUE,
+    crm TEXT NOT NULL UNIQUE
+);
+"""
+
+create_consultas_table = """
+CREATE TABLE IF NOT EXISTS consultas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cliente_id INTEGER NOT NULL,
+    medico_id INTEGER NOT NULL,
+    data DATE NOT NULL,
+    hora TIME NOT NULL,
+    status TEXT NOT NULL CHECK(status IN ('agendada', 'concluida')),
+    FOREIGN KEY(cliente_id) REFERENCES clientes(id),
+    FOREIGN KEY(medico_id) REFERENCES medicos(id)
+);
+"""
+
+# Índices das consultas: o primeiro cobre as listagens por data (ordem data, hora, id),
+# os restantes servem as pesquisas por médico e por cliente
+create_consultas_indexes = (
+    "CREATE INDEX IF NOT EXISTS idx_consultas_data ON consultas(data, hora, id, cliente_id, medico_id, status);",
+    "CREATE INDEX IF NOT EXISTS idx_consultas_medico ON consultas(medico_id, data, hora);",
+    "CREATE INDEX IF NOT EXISTS idx_consultas_cliente ON consultas(cliente_id, data);",
+)
+
+# Duração de uma consulta em minutos. Duas consultas do mesmo médico não se podem
+# sobrepor; alterar este valor exige uma migração nova que recrie os triggers.
+CONSULTA_DURACAO_MIN = 30
+
+# Mensagem usada pelos triggers quando um horário já está ocupado
+CONFLITO_HORARIO = 'conflito_horario'
+
+# Verificação de sobreposição: uma pesquisa por intervalo em idx_consultas_medico (medico_id, data, hora)
+_conflict_check = f"""
+    SELECT 1 FROM consultas
+    WHERE medico_id = NEW.medico_id
+      AND data = NEW.data
+      AND hora > strftime('%H:%M', NEW.hora, '-{CONSULTA_DURACAO_MIN} minutes')
+      AND hora < strftime('%H:%M', NEW.hora, '+{CONSULTA_DURACAO_MIN} minutes')
+"""
+
+
+
+def minutes_sql(column):
+    """
+    SQL expression for the minutes since midnight of an 'HH:MM' column.
+    """
+    return f"(CAST(substr({column}, 1, 2) AS INTEGER) * 60 + CAST(substr({column}, 4, 2) AS INTEGER))"
+
+
+# Comparação em minutos: ao contrário de strftime('%H:%M', hora, '-30 minutes'), não dá a volta à meia-noite
+_overlap_check = f"""
+    SELECT 1 FROM consultas
+    WHERE medico_id = NEW.medico_id
+      AND data = NEW.data
+      AND ABS({minutes_sql('hora')} - {minutes_sql('NEW.hora')}) < {CONSULTA_DURACAO_MIN}
+"""
+
+create_conflict_triggers = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_consultas_conflito_insert
+    BEFORE INSERT ON consultas
+    WHEN EXISTS ({_conflict_check})
+    BEGIN
+        SELECT RAISE(ABORT, '{CONFLITO_HORARIO}');
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_consultas_conflito_update
+    BEFORE UPDATE OF medico_id, data, hora ON consultas
+    WHEN EXISTS ({_conflict_check} AND id != NEW.id)
+    BEGIN
+        SELECT RAISE(ABORT, '{CONFLITO_HORARIO}');
+    END;
+    """,
+)
+
+# Versão 9 dos triggers de sobreposição: o de UPDATE só verifica quando o médico, a data ou a hora mudam
+recreate_conflict_triggers = (
+    "DROP TRIGGER IF EXISTS trg_consultas_conflito_insert;",
+    "DROP TRIGGER IF EXISTS trg_consultas_conflito_update;",
+    f"""
+    CREATE TRIGGER trg_consultas_conflito_insert
+    BEFORE INSERT ON consultas
+    WHEN EXISTS ({_overlap_check})
+    BEGIN
+        SELECT RAISE(ABORT, '{CONFLITO_HORARIO}');
+    END;
+    """,
+    f"""
+    CREATE TRIGGER trg_consultas_conflito_update
+    BEFORE UPDATE OF medico_id, data, hora ON consultas
+    WHEN (NEW.medico_id IS NOT OLD.medico_id OR NEW.data IS NOT OLD.data OR NEW.hora IS NOT OLD.hora)
+      AND EXISTS ({_overlap_check} AND id != NEW.id)
+    BEGIN
+        SELECT RAISE(ABORT, '{CONFLITO_HORARIO}');
+    END;
+    """,
+)
+
+# Pesquisa de texto (FTS5, external content) sobre clientes e médicos, sem acentos e por prefixo
+SEARCH_INDEXES = {
+    'clientes': ('nome', 'telefone', 'email', 'endereco'),
+    'medicos': ('nome', 'crm', 'email'),
+}
+
+
+def _search_index_statements(table, columns):
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    fts = f'{table}_fts'
+    return (
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {cols}, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        );
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values});
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});
+        END;
+        """,
+        # Indexa as linhas que já existiam antes da migração
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild');",
+    )
+
+
+create_search_indexes = [
+    statement
+    for table, columns in SEARCH_INDEXES.items()
+    for statement in _search_index_statements(table, columns)
+]
+
+# Versão de linha: cada escrita em VERSIONED_TABLES recebe o valor seguinte de row_version,
+# e cada remoção fica em linhas_removidas
+VERSIONED_TABLES = ('users', 'clientes', 'medicos', 'consultas')
+
+create_row_version_table = (
+    "CREATE TABLE IF NOT EXISTS row_version (id INTEGER PRIMARY KEY CHECK (id = 1), atual INTEGER NOT NULL);",
+    "INSERT OR IGNORE INTO row_version (id, atual) VALUES (1, 0);",
+    """
+    CREATE TABLE IF NOT EXISTS linhas_removidas (
+        versao INTEGER PRIMARY KEY,
+        tabela TEXT NOT NULL,
+        linha_id INTEGER NOT NULL
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_linhas_removidas_tabela ON linhas_removidas(tabela, versao);",
+)
+
+
+def _row_version_statements(table):
+    bump = "UPDATE row_version SET atual = atual + 1 WHERE id = 1;"
+    return (
+        f"ALTER TABLE {table} ADD COLUMN versao INTEGER NOT NULL DEFAULT 0;",
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_versao ON {table}(versao);",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_versao_insert AFTER INSERT ON {table} BEGIN
+            {bump}
+            UPDATE {table} SET versao = (SELECT atual FROM row_version WHERE id = 1) WHERE id = NEW.id;
+        END;
+        """,
+        # O WHEN evita que o próprio UPDATE de versao (feito pelos triggers) conte como alteração
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_versao_update AFTER UPDATE ON {table}
+        WHEN NEW.versao = OLD.versao BEGIN
+            {bump}
+            UPDATE {table} SET versao = (SELECT atual FROM row_version WHERE id = 1) WHERE id = NEW.id;
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_versao_delete AFTER DELETE ON {table} BEGIN
+            {bump}
+            INSERT INTO linhas_removidas (versao, tabela, linha_id)
+            VALUES ((SELECT atual FROM row_version WHERE id = 1), '{table}', OLD.id);
+        END;
+        """,
+    )
+
+
+create_row_versions = list(create_row_version_table) + [
+    statement for table in VERSIONED_TABLES for statement in _row_version_statements(table)
+]
+
+# Registo de alterações: uma linha por inserção, alteração ou remoção em VERSIONED_TABLES.
+# Os postos leem só as entradas com id maior do que a última que já viram.
+create_change_log_table = (
+    """
+    CREATE TABLE IF NOT EXISTS alteracoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tabela TEXT NOT NULL,
+        linha_id INTEGER NOT NULL,
+        operacao TEXT NOT NULL CHECK(operacao IN ('insert', 'update', 'delete')),
+        criado_em TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+    );
+    """,
+)
+
+
+def _change_log_statements(table):
+    log = "INSERT INTO alteracoes (tabela, linha_id, operacao) VALUES"
+    return (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_alteracoes_insert AFTER INSERT ON {table} BEGIN
+            {log} ('{table}', NEW.id, 'insert');
+        END;
+        """,
+        # Tal como em trg_{table}_versao_update, ignora o UPDATE de versao feito pelos triggers
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_alteracoes_update AFTER UPDATE ON {table}
+        WHEN NEW.versao = OLD.versao BEGIN
+            {log} ('{table}', NEW.id, 'update');
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_alteracoes_delete AFTER DELETE ON {table} BEGIN
+            {log} ('{table}', OLD.id, 'delete');
+        END;
+        """,
+    )
+
+
+create_change_log = list(create_change_log_table) + [
+    statement for table in VERSIONED_TABLES for statement in _change_log_statements(table)
+]
+
+# Séries de consultas repetidas: cada série guarda a regra de repetição e cada ocorrência
+# é uma consulta normal com serie_id. idx_consultas_serie serve "esta e as seguintes".
+create_series = (
+    """
+    CREATE TABLE IF NOT EXISTS series (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cliente_id INTEGER NOT NULL,
+        medico_id INTEGER NOT NULL,
+        hora TIME NOT NULL,
+        regra TEXT NOT NULL CHECK(regra IN ('semanal', 'mensal')),
+        intervalo INTEGER NOT NULL DEFAULT 1 CHECK(intervalo >= 1),
+        inicio DATE NOT NULL,
+        fim DATE,
+        FOREIGN KEY(cliente_id) REFERENCES clientes(id),
+        FOREIGN KEY(medico_id) REFERENCES medicos(id)
+    );
+    """,
+    "ALTER TABLE consultas ADD COLUMN serie_id INTEGER REFERENCES series(id);",
+    "CREATE INDEX IF NOT EXISTS idx_consultas_serie ON consultas(serie_id, data);",
+)
+
+# Ordenação e filtros das listas de consultas: por nome do doente/médico e por estado
+create_consultas_sort_indexes = (
+    "CREATE INDEX IF NOT EXISTS idx_clientes_nome ON clientes(nome);",
+    "CREATE INDEX IF NOT EXISTS idx_medicos_nome ON medicos(nome);",
+    "CREATE INDEX IF NOT EXISTS idx_consultas_status ON consultas(status, data, hora);",
+)
+
+# Índices e triggers apagados por bulk_import --defer-indexes, com o SQL para os recriar.
+# Se a importação for interrompida, restore_deferred (chamado pelo init_db) recria-os.
+create_deferred_table = (
+    """
+    CREATE TABLE IF NOT EXISTS objetos_adiados (
+        nome TEXT PRIMARY KEY,
+        sql TEXT NOT NULL,
+        fts TEXT
+    );
+    """,
+)
+
+# Lista ordenada de migrações. Nunca alterar uma migração já publicada: acrescentar uma nova.
+MIGRATIONS = [
+    Migration(1, "esquema inicial", [
+        create_users_table,
+        create_clientes_table,
+        create_medicos_table,
+        create_consultas_table,
+    ]),
+    Migration(2, "índices das consultas", create_consultas_indexes, indexes=True),
+    Migration(3, "impedir marcações sobrepostas", create_conflict_triggers),
+    Migration(4, "pesquisa de texto em clientes e médicos", create_search_indexes),
+    Migration(5, "versão de linha para atualizações incrementais", create_row_versions),
+    Migration(6, "registo de alterações para os vários postos", create_change_log),
+    Migration(7, "séries de consultas repetidas", create_series),
+    Migration(8, "ordenação e filtros das consultas", create_consultas_sort_indexes, indexes=True),
+    Migration(9, "sobreposições comparadas em minutos", recreate_conflict_triggers),
+    Migration(10, "índices adiados pela importação em massa", create_deferred_table),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pending(conn, target=None):
+    """
+    Returns the migrations not yet applied, up to target (default: latest).
+    """
+    version = current_version(conn)
+    target = LATEST_VERSION if target is None else target
+    return [migration for migration in MIGRATIONS if version < migration.version <= target]
+
+
+def migrate(conn, target=None):
+    """
+    Applies the pending migrations in order, each one in its own transaction.
+    Returns a list of (version, description, seconds) for the applied steps.
+    """
+    applied = []
+    for migration in pending(conn, target):
+        if conn.in_transaction:
+            conn.commit()
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migration.apply(conn)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if migration.indexes:
+            # Atualiza as estatísticas do planner para os índices novos
+            conn.execute("PRAGMA optimize")
+        applied.append((migration.version, migration.description, time.perf_counter() - start))
+    return applied
+
+
+def defer_objects(conn, names, fts=None):
+    """
+    Drops the given indexes/triggers, keeping their SQL in objetos_adiados
+    (with the FTS table to rebuild afterwards) until restore_deferred runs.
+    """
+    for name in names:
+        row = conn.execute("SELECT type, sql FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            continue
+        kind, sql = row
+        conn.execute("INSERT OR REPLACE INTO objetos_adiados (nome, sql, fts) VALUES (?, ?, ?)", (name, sql, fts))
+        conn.execute(f"DROP {kind.upper()} {name}")
+
+
+def restore_deferred(conn):
+    """
+    Recreates every index/trigger left in objetos_adiados and rebuilds the
+    search indexes whose insert trigger was dropped.
+    """
+    deferred = conn.execute("SELECT nome, sql, fts FROM objetos_adiados").fetchall()
+    for name, sql, fts in deferred:
+        conn.execute(sql)
+    # O trigger de pesquisa esteve desligado: reconstruir o índice FTS
+    for fts in {fts for name, sql, fts in deferred if fts and name.endswith('_fts_insert')}:
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    conn.execute("DELETE FROM objetos_adiados")
+
+
+def dry_run(db_path, target=None):
+    """
+    Runs the pending migrations on a copy of the database and returns how long
+    each one took.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='gestor_migrations_')
+    copy_path = os.path.join(tmp_dir, 'dry_run.db')
+    try:
+        with closing(sqlite3.connect(copy_path)) as copy:
+            with closing(sqlite3.connect(db_path)) as source:
+                source.backup(copy)
+            return migrate(copy, target)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrações do esquema do Gestor de Consultas")
+    parser.add_argument('--db', default='sistema_clinico.db')
+    parser.add_argument('--target', type=int, default=None, help="versão a atingir (por defeito a mais recente)")
+    parser.add_argument('--dry-run', action='store_true', help="corre as migrações numa cópia e mostra a duração estimada")
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.db) as conn:
+        version = current_version(conn)
+        steps = pending(conn, args.target)
+    print(f"Versão atual: {version}, migrações pendentes: {len(steps)}")
+
+    if args.dry_run:
+        report = dry_run(args.db, args.target)
+        print("Dry run (cópia da base de dados):")
+    else:
+        conn = sqlite3.connect(args.db)
+        try:
+            report = migrate(conn, args.target)
+        finally:
+            conn.close()
+
+    for version, description, seconds in report:
+        print(f"  v{version} {description}: {seconds * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
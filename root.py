@@ -233,4 +233,6 @@ current_theme = LIGHT_THEME
 user_manager = UserManager('sistema_clinico.db')
 consulta_manager = ConsultasManager()
 medico_manager = MedicoManager()
-cliente_manager = ClienteManager()
\ No newline at end of file
+cliente_manager = ClienteManager()
+availability_manager = AvailabilityManager()
+series_manager = SeriesManager()
\ No newline at end of file
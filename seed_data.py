@@ -0,0 +1,201 @@
+"""
+Gerador de dados sintéticos para o sistema_clinico.db.
+
+Preenche uma base de dados vazia com utilizadores, clientes, médicos e anos de
+consultas. O resultado depende só dos parâmetros, da semente e da data de
+referência (--hoje), por isso duas execuções iguais geram bases de dados
+iguais e os benchmarks podem ser comparados entre versões.
+
+As consultas respeitam o horário de trabalho (HORARIO_TRABALHO) e nunca se
+sobrepõem: cada uma ocupa um horário livre diferente de um médico. As
+passadas ficam quase todas concluídas e as futuras agendadas.
+
+Uso:
+    python seed_data.py --db sistema_clinico.db [--clientes 1000] [--medicos 20] [--consultas 10000]
+    python seed_data.py --db grande.db --consultas 1000000 --anos 5 --seed 7 --hoje 2025-01-01
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from bcrypt import hashpw, gensalt
+
+import database
+
+# Linhas inseridas por transação
+BATCH_SIZE = 10000
+
+# As consultas vão até este número de dias depois de hoje (agenda futura)
+FUTURO_DIAS = 90
+
+# Password de todos os utilizadores gerados. O hash é calculado uma vez, com custo baixo
+PASSWORD = 'password123'
+PASSWORD_ROUNDS = 4
+
+# Fração das consultas passadas que ficaram concluídas (as restantes são faltas)
+CONCLUIDAS = 0.9
+
+NOMES = [
+    'João', 'Maria', 'José', 'Ana', 'Luís', 'Inês', 'António', 'Beatriz', 'Rui', 'Carla',
+    'Pedro', 'Sofia', 'Miguel', 'Marta', 'Tiago', 'Rita', 'Paulo', 'Joana', 'Nuno', 'Helena',
+]
+APELIDOS = [
+    'Silva', 'Santos', 'Ferreira', 'Pereira', 'Oliveira', 'Costa', 'Rodrigues', 'Martins',
+    'Jesus', 'Sousa', 'Fernandes', 'Gonçalves', 'Gomes', 'Lopes', 'Marques', 'Simões',
+]
+RUAS = ['Rua das Flores', 'Avenida da Liberdade', 'Rua Direita', 'Largo do Rossio', 'Rua de Santa Catarina']
+
+
+def _nome(rng):
+    return f"{rng.choice(NOMES)} {rng.choice(APELIDOS)} {rng.choice(APELIDOS)}"
+
+
+def _users(rng, count, password):
+    for i in range(1, count + 1):
+        role = 'admin' if i % 10 == 1 else 'padrao'
+        yield (_nome(rng), f"user{i}", password, f"user{i}@exemplo.pt", role)
+
+
+def _clientes(rng, count, hoje):
+    for i in range(1, count + 1):
+        nascimento = hoje - timedelta(days=rng.randint(18 * 365, 90 * 365))
+        yield (
+            _nome(rng), f"9{rng.randint(10000000, 99999999)}",
+            f"{rng.choice(RUAS)} {rng.randint(1, 300)}", f"cliente{i}@exemplo.pt", nascimento.isoformat(),
+        )
+
+
+def _medicos(rng, count):
+    for i in range(1, count + 1):
+        yield (f"Dr. {_nome(rng)}", f"2{rng.randint(10000000, 99999999)}", f"medico{i}@exemplo.pt", f"CRM{i:06d}")
+
+
+def _agenda(inicio, fim):
+    # Dias de trabalho entre inicio e fim, com os horários de cada um (de CONSULTA_DURACAO_MIN em CONSULTA_DURACAO_MIN)
+    step = database.CONSULTA_DURACAO_MIN
+    dias = []
+    day = inicio
+    while day <= fim:
+        horas = [
+            database._to_hora(minute)
+            for abertura, fecho in database.HORARIO_TRABALHO.get(day.weekday(), [])
+            for minute in range(database._to_minutes(abertura), database._to_minutes(fecho) - step + 1, step)
+        ]
+        if horas:
+            dias.append((day.isoformat(), horas))
+        day += timedelta(days=1)
+    return dias
+
+
+def _consultas(rng, count, clientes, medicos, hoje, anos):
+    """
+    Picks `count` distinct (day, doctor, slot) positions out of every free
+    slot in the period and yields them in date order, so ids grow with time
+    like in real use.
+    """
+    fim = hoje + timedelta(days=FUTURO_DIAS)
+    inicio = fim - timedelta(days=round(365 * anos))
+    dias = _agenda(inicio, fim)
+    # Posição inicial de cada dia na numeração global dos horários
+    offsets = list(itertools.accumulate((medicos * len(horas) for _, horas in dias), initial=0))
+    capacity = offsets[-1]
+    if count > capacity:
+        raise ValueError(
+            f"Não cabem {count} consultas em {anos} anos com {medicos} médicos (máximo {capacity})."
+        )
+    hoje = hoje.isoformat()
+    for position in sorted(rng.sample(range(capacity), count)):
+        index = bisect.bisect_right(offsets, position) - 1
+        data, horas = dias[index]
+        medico, slot = divmod(position - offsets[index], len(horas))
+        if data < hoje:
+            status = 'concluida' if rng.random() < CONCLUIDAS else 'agendada'
+        else:
+            status = 'agendada'
+        yield (rng.randint(1, clientes), medico + 1, data, horas[slot], status)
+
+
+def _insert(writer, sql, rows, batch_size):
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return count
+        writer.run(lambda conn: conn.executemany(sql, batch))
+        count += len(batch)
+
+
+def generate(db_path=None, users=5, clientes=1000, medicos=20, consultas=10000, anos=2, seed=42, hoje=None,
+             batch_size=BATCH_SIZE):
+    """
+    Fills an empty database (only the admin user) with synthetic data and
+    returns the row counts and the time taken. hoje (datetime.date, default
+    today) is the reference date: consultations cover `anos` years ending
+    FUTURO_DIAS days after it.
+    """
+    if consultas and (not clientes or not medicos):
+        raise ValueError("As consultas precisam de pelo menos um cliente e um médico.")
+    hoje = hoje or date.today()
+    rng = random.Random(seed)
+    database.init_db(db_path)
+    with database.get_pool(db_path).connection() as conn:
+        existing = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM users WHERE username != 'admin') + (SELECT COUNT(*) FROM clientes)"
+            " + (SELECT COUNT(*) FROM medicos) + (SELECT COUNT(*) FROM consultas)"
+        ).fetchone()[0]
+    if existing:
+        raise ValueError("A base de dados já tem dados: o gerador só preenche bases de dados vazias.")
+
+    writer = database.get_writer(db_path)
+    password = hashpw(PASSWORD.encode(), gensalt(PASSWORD_ROUNDS))
+    start = time.perf_counter()
+    report = {
+        'users': _insert(writer, """
+            INSERT INTO users (nome, username, password, email, role) VALUES (?, ?, ?, ?, ?)
+        """, _users(rng, users, password), batch_size),
+        'clientes': _insert(writer, """
+            INSERT INTO clientes (nome, telefone, endereco, email, data_nascimento) VALUES (?, ?, ?, ?, ?)
+        """, _clientes(rng, clientes, hoje), batch_size),
+        'medicos': _insert(writer, """
+            INSERT INTO medicos (nome, telefone, email, crm) VALUES (?, ?, ?, ?)
+        """, _medicos(rng, medicos), batch_size),
+        'consultas': _insert(writer, """
+            INSERT INTO consultas (cliente_id, medico_id, data, hora, status) VALUES (?, ?, ?, ?, ?)
+        """, _consultas(rng, consultas, clientes, medicos, hoje, anos), batch_size),
+    }
+    # Cada inserção ficou no registo de alterações; só as recentes interessam aos postos
+    database.prune_changes(db_path=db_path)
+    writer.run(lambda conn: conn.execute("PRAGMA optimize"))
+    database.get_cache(db_path).invalidate()
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dados sintéticos para o Gestor de Consultas")
+    parser.add_argument('--db', default=database.DB_PATH, help="base de dados a preencher (tem de estar vazia)")
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--clientes', type=int, default=1000)
+    parser.add_argument('--medicos', type=int, default=20)
+    parser.add_argument('--consultas', type=int, default=10000)
+    parser.add_argument('--anos', type=float, default=2, help="anos de consultas até 90 dias depois de hoje")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--hoje', type=date.fromisoformat, default=None, help="data de referência (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    database.DB_PATH = os.path.abspath(args.db)
+    report = generate(
+        users=args.users, clientes=args.clientes, medicos=args.medicos, consultas=args.consultas,
+        anos=args.anos, seed=args.seed, hoje=args.hoje
+    )
+    print(f"{report['users']} utilizadores, {report['clientes']} clientes, {report['medicos']} médicos e "
+          f"{report['consultas']} consultas gerados em {report['seconds']:.1f} s "
+          f"(password dos utilizadores: {PASSWORD})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""
+Fixtures partilhadas pelos testes. Cada teste corre contra uma base de dados
+temporária; o sistema_clinico.db real nunca é aberto.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+# Custo baixo do bcrypt para o admin criado pelo init_db
+TEST_BCRYPT_ROUNDS = 4
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """
+    An empty, migrated database set as database.DB_PATH.
+    """
+    monkeypatch.setattr(database, 'BCRYPT_ROUNDS', TEST_BCRYPT_ROUNDS)
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'test.db'))
+    database.init_db()
+    return database.DB_PATH
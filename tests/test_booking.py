@@ -0,0 +1,105 @@
+"""
+Marcações concorrentes: várias "rececionistas" tentam marcar os mesmos
+horários do mesmo médico ao mesmo tempo, e nenhuma consulta guardada se
+pode sobrepor a outra.
+"""
+import threading
+
+import pytest
+
+import database
+
+THREADS = 8
+DATA = '2030-01-07'
+
+
+def _minutes(hora):
+    return int(hora[:2]) * 60 + int(hora[3:])
+
+
+def _seed(clientes, medicos=1):
+    writer = database.get_writer()
+    writer.run(lambda conn: conn.executemany(
+        "INSERT INTO clientes (nome, telefone, endereco, email, data_nascimento) VALUES (?, ?, ?, ?, ?)",
+        [(f"Cliente {i}", "900000000", "Rua", f"cliente{i}@teste.pt", "1980-01-01") for i in range(clientes)]
+    ))
+    writer.run(lambda conn: conn.executemany(
+        "INSERT INTO medicos (nome, telefone, email, crm) VALUES (?, ?, ?, ?)",
+        [(f"Medico {i}", "910000000", f"medico{i}@teste.pt", f"CRM{i}") for i in range(medicos)]
+    ))
+
+
+def _booked(medico_id=1):
+    with database.get_pool().connection() as conn:
+        rows = conn.execute(
+            "SELECT data, hora FROM consultas WHERE medico_id = ? ORDER BY data, hora", (medico_id,)
+        ).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def test_concurrent_bookings_never_overlap(db):
+    _seed(clientes=THREADS)
+    manager = database.ConsultasManager()
+    # Horários de 15 em 15 minutos: metade deles sobrepõe-se ao anterior
+    horas = [database._to_hora(8 * 60 + i * 15) for i in range(40)]
+    booked, conflicts, errors = [], [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(THREADS)
+
+    def receptionist(cliente_id):
+        barrier.wait()
+        for hora in horas:
+            try:
+                manager.add_consulta(cliente_id, 1, DATA, hora, 'agendada')
+                outcome = booked
+            except database.ConflitoHorarioError:
+                outcome = conflicts
+            except Exception as e:
+                outcome = errors
+                hora = repr(e)
+            with lock:
+                outcome.append(hora)
+
+    workers = [threading.Thread(target=receptionist, args=(i + 1,)) for i in range(THREADS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    assert len(booked) + len(conflicts) == THREADS * len(horas)
+    stored = _booked()
+    assert sorted(hora for _, hora in stored) == sorted(booked)
+    gaps = [_minutes(b) - _minutes(a) for (_, a), (_, b) in zip(stored, stored[1:])]
+    assert all(gap >= database.CONSULTA_DURACAO_MIN for gap in gaps)
+
+
+def test_overlap_is_detected_across_midnight(db):
+    _seed(clientes=1)
+    manager = database.ConsultasManager()
+    manager.add_consulta(1, 1, DATA, '00:10', 'agendada')
+    with pytest.raises(database.ConflitoHorarioError):
+        manager.add_consulta(1, 1, DATA, '00:00', 'agendada')
+    manager.add_consulta(1, 1, DATA, '23:50', 'agendada')
+    manager.add_consulta(1, 1, DATA, '00:40', 'agendada')
+    assert _booked() == [(DATA, '00:10'), (DATA, '00:40'), (DATA, '23:50')]
+
+
+def test_status_only_update_keeps_existing_overlap(db):
+    _seed(clientes=1)
+    manager = database.ConsultasManager()
+
+    def legacy_rows(conn):
+        # Duas consultas sobrepostas, como as que existiam antes dos triggers de sobreposição
+        conn.execute("DROP TRIGGER trg_consultas_conflito_insert")
+        conn.executemany(
+            "INSERT INTO consultas (cliente_id, medico_id, data, hora, status) VALUES (1, 1, ?, ?, 'agendada')",
+            [(DATA, '10:00'), (DATA, '10:15')]
+        )
+    database.get_writer().run(legacy_rows)
+    with database.get_pool().connection() as conn:
+        consulta_id = conn.execute("SELECT id FROM consultas WHERE hora = '10:15'").fetchone()[0]
+    manager.update_consulta(consulta_id, 1, 1, DATA, '10:15', 'concluida')
+    assert manager.get_consulta(consulta_id)[5] == 'concluida'
+    with pytest.raises(database.ConflitoHorarioError):
+        manager.update_consulta(consulta_id, 1, 1, DATA, '10:20', 'concluida')
@@ -0,0 +1,48 @@
+"""
+Importação em massa com --defer-indexes: os índices e triggers apagados
+voltam a existir no fim, e também depois de uma importação interrompida.
+"""
+import csv
+
+import bulk_import
+import database
+import migrations
+
+
+def _objects(db_path):
+    with database.get_pool(db_path).connection() as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")}
+
+
+def _clientes_csv(path, count):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(('nome', 'telefone', 'endereco', 'email', 'data_nascimento'))
+        for i in range(count):
+            writer.writerow((f'Cliente {i}', '900000000', 'Rua', f'c{i}@exemplo.pt', '1980-01-01'))
+    return str(path)
+
+
+def test_deferred_objects_are_restored(db, tmp_path):
+    before = _objects(db)
+    report = bulk_import.bulk_import('clientes', _clientes_csv(tmp_path / 'c.csv', 10), defer_indexes=True, db_path=db)
+    assert report['imported'] == 10
+    assert _objects(db) == before
+    assert len(database.ClienteManager.search_clients('Cliente')[0]) == 10
+
+
+def test_interrupted_import_is_repaired_by_init_db(db):
+    before = _objects(db)
+    spec = bulk_import.IMPORT_SPECS['clientes']
+    writer = database.get_writer(db)
+    # Processo morto a meio da importação: os objetos foram apagados e nunca recriados
+    writer.run(lambda conn: migrations.defer_objects(conn, spec.deferrable, spec.fts))
+    writer.execute("INSERT INTO clientes (nome) VALUES (?)", ('Cliente importado',))
+    assert not set(spec.deferrable) & _objects(db)
+
+    database._initialized.discard(db)
+    database.init_db(db)
+    assert _objects(db) == before
+    assert len(database.ClienteManager.search_clients('importado')[0]) == 1
+    with database.get_pool(db).connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM objetos_adiados").fetchone()[0] == 0
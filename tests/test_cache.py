@@ -0,0 +1,45 @@
+"""
+Cache de leitura: as escritas deste posto só invalidam as tabelas que
+mudaram, e os commits de outros postos limpam tudo.
+"""
+import sqlite3
+
+import database
+
+
+def test_local_write_keeps_other_tables(db):
+    medicos = database.MedicoManager()
+    medicos.add_medico("Dr. Teste", "910000000", "medico@teste.pt", "CRM1")
+    cache = database.get_cache()
+    first = medicos.get_all_medicos()
+    database.ClienteManager.add_cliente("Cliente", "900000000", "Rua", "cliente@teste.pt", "1980-01-01")
+    assert medicos.get_all_medicos() is first
+    assert cache.stats()['stale_clears'] == 0
+    # Uma escrita em medicos invalida só essa entrada
+    medicos.add_medico("Dr. Outro", "910000001", "outro@teste.pt", "CRM2")
+    assert len(medicos.get_all_medicos()) == 2
+    assert cache.stats()['stale_clears'] == 0
+
+
+def test_commit_from_another_process_clears_everything(db):
+    medicos = database.MedicoManager()
+    medicos.add_medico("Dr. Teste", "910000000", "medico@teste.pt", "CRM1")
+    cache = database.get_cache()
+    medicos.get_all_medicos()
+    # Outro posto escreve diretamente na base de dados
+    with sqlite3.connect(db) as other:
+        other.execute("INSERT INTO medicos (nome, crm) VALUES ('Dr. Remoto', 'CRM9')")
+    assert len(medicos.get_all_medicos()) == 2
+    assert cache.stats()['stale_clears'] == 1
+
+
+def test_outside_commit_before_local_write_is_not_missed(db):
+    medicos = database.MedicoManager()
+    medicos.add_medico("Dr. Teste", "910000000", "medico@teste.pt", "CRM1")
+    medicos.get_all_medicos()
+    with sqlite3.connect(db) as other:
+        other.execute("INSERT INTO medicos (nome, crm) VALUES ('Dr. Remoto', 'CRM9')")
+    # O commit local que se segue não pode esconder o do outro posto
+    database.ClienteManager.add_cliente("Cliente", "900000000", "Rua", "cliente@teste.pt", "1980-01-01")
+    assert len(medicos.get_all_medicos()) == 2
+    assert database.get_cache().stats()['stale_clears'] == 1
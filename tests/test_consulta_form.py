@@ -0,0 +1,39 @@
+"""
+Formulário de edição de consultas: o botão Guardar só fica bloqueado
+enquanto o cliente e o médico da consulta são procurados.
+"""
+import os
+import time
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication, QMessageBox  # noqa: E402
+
+import windows  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+class FailingManager:
+    def get_consulta_participants(self, consulta_id):
+        raise RuntimeError('base de dados bloqueada')
+
+
+def test_failed_participant_lookup_keeps_the_form_usable(app, db, monkeypatch):
+    monkeypatch.setattr(windows, 'consulta_manager', FailingManager())
+    warnings = []
+    monkeypatch.setattr(QMessageBox, 'warning', lambda *args: warnings.append(args[2]))
+    dialog = windows.ConsultaEditar(mode='edit', consulta_id=1)
+    dialog.set_data(1, 'Cliente', 'Médico', '2030-01-01', '10:00', 'agendada')
+    assert not dialog.save_button.isEnabled()
+    deadline = time.perf_counter() + 5
+    while not warnings and time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert warnings
+    assert dialog.save_button.isEnabled()
@@ -0,0 +1,74 @@
+"""
+Login: a agenda é lida ao mesmo tempo que a password é verificada, e só é
+usada se a password for aceite.
+"""
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication, QMessageBox  # noqa: E402
+
+import windows  # noqa: E402
+
+AGENDA = {'today': ([], None, 1)}
+
+
+@pytest.fixture
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+class FakeManagers:
+    def __init__(self, ok):
+        self.ok = ok
+        self.prefetch_started = threading.Event()
+        self.overlapped = False
+        self.discarded = 0
+
+    def authenticate(self, username, password):
+        # O bcrypt: a agenda tem de começar a ser lida antes de isto acabar
+        self.overlapped = self.prefetch_started.wait(2)
+        return (True, 'admin') if self.ok else (False, None)
+
+    def prefetch_agenda(self):
+        self.prefetch_started.set()
+        time.sleep(0.05)
+        return AGENDA
+
+    def discard_agenda(self):
+        self.discarded += 1
+
+
+def _login(app, monkeypatch, ok):
+    fake = FakeManagers(ok)
+    monkeypatch.setattr(windows, 'user_manager', fake)
+    monkeypatch.setattr(windows, 'consulta_manager', fake)
+    monkeypatch.setattr(QMessageBox, 'warning', lambda *args: None)
+    opened = []
+    dialog = windows.LoginWindow()
+    monkeypatch.setattr(dialog, 'open_main_window', opened.append)
+    dialog.call_login('user', 'password')
+    deadline = time.perf_counter() + 5
+    while (dialog.user is None or dialog.agenda_pending) and time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    return fake, dialog, opened
+
+
+def test_agenda_is_read_while_the_password_is_checked(app, monkeypatch):
+    fake, dialog, opened = _login(app, monkeypatch, ok=True)
+    assert fake.overlapped
+    assert opened == [AGENDA]
+    assert fake.discarded == 0
+
+
+def test_failed_login_discards_the_agenda(app, monkeypatch):
+    fake, dialog, opened = _login(app, monkeypatch, ok=False)
+    assert fake.overlapped
+    assert opened == []
+    assert dialog.agenda is None
+    assert fake.discarded == 1
@@ -0,0 +1,32 @@
+"""
+ChangeNotifier: a consulta periódica do registo de alterações para quando a
+última janela que o observa é fechada, mesmo sem alterações novas.
+"""
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication, QWidget  # noqa: E402
+
+import windows  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def test_polling_stops_when_the_last_window_closes(app, db):
+    notifier = windows.ChangeNotifier()
+    window = QWidget()
+    window.show()
+    notifier.watch(window, ('consultas',), lambda changes: None)
+    assert notifier.timer.isActive()
+
+    window.close()
+    notifier.poll()
+    assert notifier.watchers == []
+    assert not notifier.timer.isActive()
+    assert not notifier.polling
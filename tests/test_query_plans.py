@@ -0,0 +1,115 @@
+"""
+Regressão dos planos das consultas críticas: nenhuma pode voltar a percorrer
+uma tabela inteira. As páginas de consultas são construídas por
+ConsultasManager._page_query, tal como na aplicação, por isso o plano
+verificado é o da consulta que corre de facto.
+"""
+import itertools
+
+import pytest
+
+import database
+import seed_data
+
+# Mais consultas do que ConsultasManager.SMALL_RESULT_ROWS, para que _plan escolha os
+# planos das bases de dados grandes
+SEED = {'clientes': 300, 'medicos': 5, 'consultas': 8000, 'anos': 1}
+
+PAGE_FILTERS = [
+    None,
+    {'medico_id': 1},
+    {'status': 'agendada'},
+    {'cliente': 'silva'},
+    {'medico_id': 2, 'status': 'concluida', 'date_from': '2000-01-01', 'date_to': '2100-12-31'},
+]
+
+# Na primeira página das ordenações por nome, o índice do nome é percorrido por ordem
+# e a leitura pára no LIMIT
+ORDERED_WALKS = {
+    'cliente_nome': 'SCAN clientes USING COVERING INDEX idx_clientes_nome',
+    'medico_nome': 'SCAN medicos USING COVERING INDEX idx_medicos_nome',
+}
+
+OTHER_QUERIES = {
+    # Listas completas sem paginação (get_future_consultas, get_past_consultas, get_today_consultas)
+    'consultas_future': (database.ConsultasManager.SQL_SELECT_QUERY + database.ConsultasManager.SQL_WHERE_FUTURE, ()),
+    'consultas_past': (database.ConsultasManager.SQL_SELECT_QUERY + database.ConsultasManager.SQL_WHERE_PAST, ()),
+    'consultas_today': (database.ConsultasManager.SQL_SELECT_QUERY + database.ConsultasManager.SQL_WHERE_TODAY, ()),
+    'consultas_by_medico': (
+        database.ConsultasManager.SQL_SELECT_QUERY + " WHERE consultas.medico_id = ? AND consultas.data >= DATE('now')",
+        (1,),
+    ),
+    'consultas_by_cliente': (database.ConsultasManager.SQL_SELECT_QUERY + " WHERE consultas.cliente_id = ?", (1,)),
+    'consultas_changed_since': ("SELECT id FROM consultas WHERE versao > ? AND versao <= ?", (0, 10)),
+    'removed_since': ("SELECT linha_id FROM linhas_removidas WHERE tabela = 'consultas' AND versao > ?", (0,)),
+    'changes_after': ("SELECT id, tabela, linha_id, operacao FROM alteracoes WHERE id > ? ORDER BY id LIMIT 1000", (0,)),
+    'medico_busy_slots': (
+        "SELECT data, hora FROM consultas WHERE medico_id = ? AND data BETWEEN ? AND ? ORDER BY data, hora",
+        (1, '2000-01-01', '2000-12-31'),
+    ),
+    'series_conflicts': (
+        database.SeriesManager.SQL_CONFLITOS,
+        {'candidatos': '[["2000-01-03", "09:00"]]', 'medico_id': 1, 'serie_id': 1, 'desde': '2000-01-01'},
+    ),
+    'series_following': (
+        "SELECT id FROM consultas WHERE serie_id = ? AND data >= ? ORDER BY data, hora, id", (1, '2000-01-01')
+    ),
+}
+
+
+def find_table_scans(conn, query, params=()):
+    """
+    Runs EXPLAIN QUERY PLAN on query and returns every step that scans a
+    whole table or index instead of searching it.
+    """
+    scans = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + query, params):
+        detail = row[3]
+        # Percorrer uma tabela virtual (json_each com a lista de candidatos) não lê a base de dados
+        if detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail:
+            scans.append(detail)
+    return scans
+
+
+@pytest.fixture(scope='module')
+def seeded_db(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(database, 'BCRYPT_ROUNDS', 4)
+        patch.setattr(database, 'DB_PATH', str(tmp_path_factory.mktemp('plans') / 'plans.db'))
+        seed_data.generate(**SEED)
+        # Hoje e amanhã podem não ser dias de trabalho: acrescenta consultas ao fim do dia,
+        # para que as páginas seguintes da agenda também sejam verificadas
+        rows = [
+            (slot * 7 + medico_id, medico_id, day, f"{20 + slot // 2}:{slot % 2 * 30:02d}",
+             'concluida' if slot % 2 else 'agendada')
+            for day in ('+0 days', '+1 day') for medico_id in (1, 2) for slot in range(8)
+        ]
+        database.get_writer().run(lambda conn: conn.executemany(
+            "INSERT INTO consultas (cliente_id, medico_id, data, hora, status) VALUES (?, ?, DATE('now', ?), ?, ?)",
+            rows
+        ))
+        yield database.DB_PATH
+
+
+@pytest.mark.parametrize('scope, sort, filters', list(itertools.product(
+    database.ConsultasManager.PAGE_SCOPES, database.ConsultasManager.SORT_COLUMNS, PAGE_FILTERS
+)))
+def test_consultas_pages_use_indexes(seeded_db, scope, sort, filters):
+    manager = database.ConsultasManager()
+    _, next_cursor = manager.get_consultas_page(scope, 2, sort=sort, filters=filters)
+    with database.get_pool().connection() as conn:
+        plan = manager._plan(conn, scope, sort, filters)
+        for cursor in (None, next_cursor):
+            query, params = manager._page_query(scope, cursor, sort, None, filters, plan)
+            params['limit'] = 3
+            scans = find_table_scans(conn, query, params)
+            if cursor is None:
+                scans = [detail for detail in scans if detail != ORDERED_WALKS.get(sort)]
+            assert scans == [], f"cursor={cursor!r}, plan={plan}"
+
+
+@pytest.mark.parametrize('name', sorted(OTHER_QUERIES))
+def test_hot_queries_use_indexes(seeded_db, name):
+    query, params = OTHER_QUERIES[name]
+    with database.get_pool().connection() as conn:
+        assert find_table_scans(conn, query, params) == []
@@ -0,0 +1,31 @@
+"""
+Writer: se a conexão não abrir, as escritas em fila e as seguintes falham com
+o erro da abertura em vez de ficarem à espera para sempre.
+"""
+import sqlite3
+
+import pytest
+
+import database
+
+
+def test_startup_error_fails_every_write(tmp_path):
+    writer = database.SerializedWriter(str(tmp_path / 'nao_existe' / 'x.db'))
+    try:
+        first = writer.submit(lambda conn: 1)
+        with pytest.raises(sqlite3.OperationalError):
+            first.result(timeout=5)
+        with pytest.raises(sqlite3.OperationalError):
+            writer.execute("SELECT 1")
+        assert writer.stats()['transactions'] == 0
+    finally:
+        writer.close()
+
+
+def test_pragma_error_fails_every_write(tmp_path):
+    writer = database.SerializedWriter(str(tmp_path / 'x.db'), pragmas=['journal_mode = WAL', 'nao_existe('])
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            writer.run(lambda conn: 1)
+    finally:
+        writer.close()
@@ -1,12 +1,916 @@
 from PySide6.QtWidgets import (
     QMainWindow, QDialog, QLabel, QPushButton, QVBoxLayout, QWidget,
     QLineEdit, QApplication, QTableView, QHeaderView, QMessageBox,
-    QFormLayout, QHBoxLayout, QComboBox, QMenuBar, QDateEdit, QSizePolicy, QTimeEdit
+    QFormLayout, QHBoxLayout, QComboBox, QMenuBar, QDateEdit, QSizePolicy, QTimeEdit, QCompleter,
+    QFileDialog, QSpinBox, QTableWidget, QTableWidgetItem, QCheckBox
 )
-from PySide6.QtCore import QDate, QTime, Qt
-from PySide6.QtGui import QPixmap, QStandardItemModel, QStandardItem, QAction, QIcon
-from root import user_manager, consulta_manager, medico_manager, cliente_manager, LIGHT_THEME, DARK_THEME, current_theme
+from PySide6.QtCore import (
+    QDate, QTime, QTimer, Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, Signal, QEvent
+)
+from PySide6.QtGui import QPixmap, QAction, QIcon
+from root import user_manager, consulta_manager, medico_manager, cliente_manager, availability_manager, series_manager, LIGHT_THEME, DARK_THEME, current_theme
+from database import (
+    init_db, get_row_version, get_last_change_id, get_changes_after, ConflitoHorarioError, ConflitoSerieError,
+    RecurrenceRule, MAX_OCORRENCIAS, diagnostics, query_stats, data_file
+)
+from contextlib import contextmanager, nullcontext
+from datetime import date
+import export
+import functools
+import json
+import operator
+import os
+import shiboken6
 import sys
+import time
+
+class QueryWorker(QRunnable):
+    """
+    Runs one database call on a pool thread and reports back through the runner signals.
+    """
+    def __init__(self, runner, request_id, func, args, kwargs):
+        super().__init__()
+        self.runner = runner
+        self.request_id = request_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self.seconds = time.perf_counter() - start
+            self.runner.failed.emit(self.request_id, e)
+        else:
+            self.seconds = time.perf_counter() - start
+            self.runner.finished.emit(self.request_id, result)
+
+class QueryRunner(QObject):
+    """
+    Runs database calls in the background and delivers their results on the
+    GUI thread. A newer request with the same key drops the older result.
+    """
+    finished = Signal(int, object)
+    failed = Signal(int, object)
+    busy_changed = Signal(bool)
+
+    def __init__(self, max_threads=4):
+        super().__init__()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+        self._next_id = 0
+        self._pending = {}  # request_id -> (key, owner, on_result, on_error)
+        self._latest = {}  # key -> most recent request_id
+        self._workers = {}  # request_id -> worker, kept alive until it stops running
+        self._quiet = set()  # request ids that do not show the busy cursor
+        self._ops = {}  # request_id -> UI operation being timed (see UiTimings)
+        self.finished.connect(self._on_finished)
+        self.failed.connect(self._on_failed)
+
+    def submit(self, func, *args, on_result=None, on_error=None, key=None, owner=None, quiet=False, **kwargs):
+        """
+        Queues func(*args, **kwargs) and returns the request id.
+        Quiet requests (e.g. periodic polling) do not show the busy cursor.
+        """
+        self._next_id += 1
+        request_id = self._next_id
+        if key is not None:
+            self.cancel(key)
+            self._latest[key] = request_id
+        if quiet:
+            self._quiet.add(request_id)
+        op = ui_timings.attach()
+        if op is not None:
+            self._ops[request_id] = op
+
+        worker = QueryWorker(self, request_id, func, args, kwargs)
+        worker.setAutoDelete(False)
+        self._workers[request_id] = worker
+        self._pending[request_id] = (key, owner, on_result, on_error)
+        self._update_busy()
+        self.pool.start(worker)
+        return request_id
+
+    def cancel(self, key):
+        """
+        Cancels the current request for the given key. If it has not started
+        yet it is removed from the queue, otherwise its result is ignored.
+        """
+        request_id = self._latest.pop(key, None)
+        self._quiet.discard(request_id)
+        op = self._ops.pop(request_id, None)
+        if op is not None:
+            ui_timings.detach(op)
+        if self._pending.pop(request_id, None) is None:
+            return
+        if self.pool.tryTake(self._workers[request_id]):
+            del self._workers[request_id]
+        self._update_busy()
+
+    def is_busy(self):
+        return any(request_id not in self._quiet for request_id in self._pending)
+
+    def _take(self, request_id):
+        self._workers.pop(request_id, None)
+        self._quiet.discard(request_id)
+        entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return None  # Cancelled or superseded
+        key, owner, on_result, on_error = entry
+        if key is not None and self._latest.get(key) == request_id:
+            del self._latest[key]
+        self._update_busy()
+        if owner is not None and not shiboken6.isValid(owner):
+            return None  # The window that asked for it is gone
+        return on_result, on_error
+
+    def _timed(self, request_id):
+        # Conta o tempo do pedido e da resposta na operação da interface a que pertence
+        op = self._ops.pop(request_id, None)
+        worker = self._workers.get(request_id)
+        callbacks = self._take(request_id)
+        if op is None:
+            return callbacks, nullcontext()
+        if callbacks is None:
+            ui_timings.detach(op)
+            return None, nullcontext()
+        return callbacks, ui_timings.callback(op, getattr(worker, 'seconds', 0.0))
+
+    def _on_finished(self, request_id, result):
+        callbacks, timing = self._timed(request_id)
+        with timing:
+            if callbacks and callbacks[0]:
+                callbacks[0](result)
+
+    def _on_failed(self, request_id, error):
+        callbacks, timing = self._timed(request_id)
+        if callbacks is None:
+            return
+        with timing:
+            if callbacks[1]:
+                callbacks[1](error)
+            else:
+                print(f"Background query failed: {error}")
+
+    def _update_busy(self):
+        busy = self.is_busy()
+        if busy == getattr(self, '_busy', False):
+            return
+        self._busy = busy
+        # Busy cursor while anything is running in the background
+        if QApplication.instance() is not None:
+            if busy:
+                QApplication.setOverrideCursor(Qt.BusyCursor)
+            else:
+                QApplication.restoreOverrideCursor()
+        self.busy_changed.emit(busy)
+
+# Shared executor used by every window
+query_runner = QueryRunner()
+
+class UiOperation:
+    """
+    One timed UI action, split into query, model and paint time.
+    """
+    def __init__(self, name, window, widget_attr):
+        self.name = name
+        self.window = window
+        self.widget_attr = widget_attr
+        self.start = time.perf_counter()
+        self.phases = {'query': 0.0, 'model': 0.0, 'paint': 0.0}
+        self.pending = 0  # Pedidos ao query_runner ainda sem resposta
+        self.paused = 0.0  # Tempo à espera do utilizador (caixas de mensagem), fora das contas
+        self.running = True  # A chamada decorada ainda não devolveu
+        self.model_end = None
+        self.done = False
+
+class UiTimings(QObject):
+    """
+    Opt-in timing of UI operations (GESTOR_UI_TIMINGS=log, overlay or both).
+    The report is saved at exit to GESTOR_UI_TIMINGS_REPORT, by default
+    ui_timings.json next to the database.
+    """
+    # Tempo máximo à espera da pintura depois de o modelo estar pronto
+    PAINT_TIMEOUT_MS = 1000
+    OVERLAY_MS = 4000
+
+    def __init__(self, modes=None):
+        super().__init__()
+        if modes is None:
+            modes = os.environ.get('GESTOR_UI_TIMINGS', '')
+        self.modes = {mode.strip() for mode in modes.split(',') if mode.strip()}
+        self.enabled = bool(self.modes)
+        self.report_path = os.environ.get('GESTOR_UI_TIMINGS_REPORT')
+        self.current = None  # Operação a que pertencem os pedidos feitos agora
+        self.samples = {}  # nome -> [(total, query, model, paint)] em segundos
+        self._waiting = {}  # id(widget) -> (widget, [operações à espera da pintura])
+        self._overlays = {}  # id(janela) -> QLabel
+
+    def begin(self, name, window=None, widget_attr=None):
+        """
+        Starts timing an operation, unless timing is off or another
+        operation is already running (nested calls count towards it).
+        """
+        if not self.enabled or self.current is not None:
+            return None
+        self.current = UiOperation(name, window, widget_attr)
+        return self.current
+
+    def end_call(self, op):
+        # A chamada decorada devolveu: falta esperar pelos pedidos que fez e pela pintura
+        self.current = None
+        op.running = False
+        self._check_done(op)
+
+    def attach(self):
+        """
+        Called by query_runner.submit: returns the operation the new request
+        belongs to, if any.
+        """
+        op = self.current
+        if op is not None:
+            op.pending += 1
+        return op
+
+    def detach(self, op):
+        # Pedido cancelado ou descartado: já não há resposta por esperar
+        op.pending -= 1
+        self._check_done(op)
+
+    @contextmanager
+    def callback(self, op, query_seconds):
+        """
+        Wraps the result callback of a request of op. Requests made from
+        the callback (the next page, ...) belong to the same operation.
+        """
+        op.phases['query'] += query_seconds
+        previous, self.current = self.current, op
+        paused = op.paused
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            op.phases['model'] += time.perf_counter() - start - (op.paused - paused)
+            self.current = previous
+            self.detach(op)
+
+    @contextmanager
+    def paused(self):
+        """
+        Leaves the time inside the block (waiting for the user to close a
+        message box) out of the current operation.
+        """
+        op = self.current
+        if op is None:
+            yield
+            return
+        self.current = None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            op.paused += time.perf_counter() - start
+            self.current = op
+
+    def _widget(self, op):
+        widget = getattr(op.window, op.widget_attr, None) if op.widget_attr else None
+        if widget is None or not shiboken6.isValid(widget) or not widget.isVisible():
+            return None  # Sem vista no ecrã não há pintura a medir
+        return widget.viewport() if hasattr(widget, 'viewport') else widget
+
+    def _check_done(self, op):
+        if op.running or op.pending or op.model_end is not None:
+            return
+        op.model_end = time.perf_counter()
+        widget = self._widget(op)
+        if widget is None:
+            self._finish(op, op.model_end)
+            return
+        # A operação acaba quando a vista voltar a ser pintada. O update() junta-se ao redesenho
+        # pedido pelo modelo, ou garante um quando nada mudou, para a pintura ser sempre medida
+        entry = self._waiting.setdefault(id(widget), (widget, []))
+        entry[1].append(op)
+        widget.installEventFilter(self)
+        widget.update()
+        QTimer.singleShot(self.PAINT_TIMEOUT_MS, lambda: self._paint_timeout(op))
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and id(watched) in self._waiting:
+            _, ops = self._waiting.pop(id(watched))
+            watched.removeEventFilter(self)
+            # O filtro corre antes da pintura: o fim conta-se quando o evento de pintura terminar
+            QTimer.singleShot(0, lambda: [self._finish(op, time.perf_counter(), painted=True) for op in ops])
+        return False
+
+    def _paint_timeout(self, op):
+        # A vista não chegou a ser redesenhada (janela tapada ou minimizada): acaba com o modelo
+        if op.done:
+            return
+        for key, (widget, ops) in list(self._waiting.items()):
+            if op in ops:
+                ops.remove(op)
+                if not ops:
+                    del self._waiting[key]
+                    if shiboken6.isValid(widget):
+                        widget.removeEventFilter(self)
+        self._finish(op, op.model_end)
+
+    def _finish(self, op, end, painted=False):
+        if op.done:
+            return
+        op.done = True
+        if painted:
+            op.phases['paint'] = end - op.model_end
+        total = end - op.start - op.paused
+        sample = (total, op.phases['query'], op.phases['model'], op.phases['paint'])
+        self.samples.setdefault(op.name, []).append(sample)
+        text = (f"{op.name}: {total * 1000:.1f} ms (consulta {sample[1] * 1000:.1f}, "
+                f"modelo {sample[2] * 1000:.1f}, pintura {sample[3] * 1000:.1f})")
+        if 'log' in self.modes:
+            print(f"[ui] {text}")
+        if 'overlay' in self.modes:
+            self._show_overlay(op.window, text)
+
+    def _show_overlay(self, window, text):
+        if not isinstance(window, QWidget) or not shiboken6.isValid(window) or not window.isVisible():
+            return
+        label = self._overlays.get(id(window))
+        if label is None or not shiboken6.isValid(label):
+            label = QLabel(window)
+            label.setStyleSheet(
+                "background-color: rgba(0, 0, 0, 160); color: white; padding: 4px 8px; border-radius: 4px;"
+            )
+            label.setAttribute(Qt.WA_TransparentForMouseEvents)
+            timer = QTimer(label)
+            timer.setSingleShot(True)
+            timer.timeout.connect(label.hide)
+            label.hide_timer = timer
+            self._overlays[id(window)] = label
+        label.setText(text)
+        label.adjustSize()
+        label.move(window.width() - label.width() - 12, 12)
+        label.raise_()
+        label.show()
+        label.hide_timer.start(self.OVERLAY_MS)
+
+    def report(self):
+        """
+        Returns the session's timings per operation: count and the p50, p95
+        and max of the total and of each phase, in milliseconds.
+        """
+        report = {}
+        for name, samples in sorted(self.samples.items()):
+            entry = {'count': len(samples)}
+            for phase, values in zip(('total', 'query', 'model', 'paint'), zip(*samples)):
+                values = sorted(value * 1000 for value in values)
+                entry[phase] = {
+                    'p50_ms': values[(len(values) - 1) // 2],
+                    'p95_ms': values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))],
+                    'max_ms': values[-1],
+                }
+            report[name] = entry
+        return report
+
+    def finish_session(self):
+        """
+        Prints the aggregated report and saves it as JSON. Connected to
+        QApplication.aboutToQuit.
+        """
+        if not self.enabled or not self.samples:
+            return
+        report = self.report()
+        print("Tempos da interface nesta sessão (p50 / p95 ms):")
+        for name, entry in report.items():
+            phases = ', '.join(
+                f"{phase} {entry[phase]['p50_ms']:.1f} / {entry[phase]['p95_ms']:.1f}"
+                for phase in ('total', 'query', 'model', 'paint')
+            )
+            print(f"  {name} ({entry['count']}x): {phases}")
+        path = self.report_path or data_file('ui_timings.json')
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        except OSError as e:
+            print(f"Error saving UI timings report: {e}")
+
+# Tempos da interface, desligados por defeito (ver GESTOR_UI_TIMINGS)
+ui_timings = UiTimings()
+
+def ui_timed(widget_attr=None):
+    """
+    Times the decorated window method as one UI operation (see UiTimings).
+    widget_attr names the view whose next repaint ends the operation.
+    """
+    def decorate(func):
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            op = ui_timings.begin(name, self, widget_attr)
+            if op is None:
+                return func(self, *args, **kwargs)
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                ui_timings.end_call(op)
+        return wrapper
+    return decorate
+
+
+class ChangeNotifier(QObject):
+    """
+    Polls the change log (alteracoes) and hands new entries to the windows
+    watching those tables.
+    """
+    def __init__(self, interval=2000, batch=1000):
+        super().__init__()
+        self.batch = batch
+        self.last_id = None
+        self.polling = False
+        self.watchers = []  # (window, tables, callback)
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.poll)
+
+    def watch(self, window, tables, callback):
+        """
+        Calls callback(changes) when rows of the given tables change, while
+        the window is open.
+        """
+        self.watchers.append((window, frozenset(tables), callback))
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def poll(self):
+        # Drop windows that were closed or destroyed; with none left polling stops
+        self.watchers = [
+            watcher for watcher in self.watchers
+            if shiboken6.isValid(watcher[0]) and watcher[0].isVisible()
+        ]
+        if not self.watchers:
+            self.timer.stop()
+            self.last_id = None
+            return
+        if self.polling:
+            return
+        self.polling = True
+        if self.last_id is None:
+            # First poll: only changes made from now on matter
+            query_runner.submit(
+                get_last_change_id, key=(id(self), 'poll'), quiet=True,
+                on_result=self.on_start, on_error=self.on_poll_failed
+            )
+        else:
+            query_runner.submit(
+                get_changes_after, self.last_id, self.batch, key=(id(self), 'poll'), quiet=True,
+                on_result=self.on_changes, on_error=self.on_poll_failed
+            )
+
+    def on_start(self, last_id):
+        self.polling = False
+        if self.timer.isActive():
+            self.last_id = last_id
+
+    def on_poll_failed(self, error):
+        print(f"Error polling changes: {error}")
+        self.polling = False
+
+    def on_changes(self, changes):
+        self.polling = False
+        if not changes or not self.timer.isActive():
+            return  # Nothing new, or the last watcher left meanwhile
+        self.last_id = changes[-1].id
+        for window, tables, callback in self.watchers:
+            if not shiboken6.isValid(window):
+                continue  # Destroyed while the poll was running
+            relevant = [change for change in changes if change.tabela in tables]
+            if relevant:
+                callback(relevant)
+
+        if len(changes) == self.batch:
+            self.poll()  # More are waiting
+
+# Shared change feed used by every list window
+change_notifier = ChangeNotifier()
+
+class LazyTableModel(QAbstractTableModel):
+    """
+    Read-only table model shared by all list windows, filled one page at a
+    time in the background. With fetch_changes, refresh() applies only the
+    changed rows; sort_key and descending must match the page order.
+    """
+    def __init__(self, columns, fetch_page, parent=None, fetch_changes=None, sort_key=None, descending=False):
+        super().__init__(parent)
+        # columns: list of (key, header label); fetch_page(cursor) -> (rows, next_cursor)
+        self.keys = tuple(key for key, _ in columns)
+        self.values = operator.attrgetter(*self.keys)
+        self.headers = [label for _, label in columns]
+        self.fetch_page = fetch_page
+        # fetch_changes(version) -> (changed rows, removed ids, new version)
+        self.fetch_changes = fetch_changes
+        self.sort_key = sort_key or (lambda values: values[0])
+        self.descending = descending
+        self.version = None
+        self.rows = []
+        self.next_cursor = None
+        self.exhausted = False
+        self.loading = False
+        self.page_key = (id(self), 'page')
+        self.changes_key = (id(self), 'changes')
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.keys)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        value = self.rows[index.row()][index.column()]
+        return '' if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section]
+        return str(section + 1)  # Row numbers, like QStandardItemModel
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted or self.loading:
+            return
+        self.loading = True
+        query_runner.submit(
+            self.load_page, self.next_cursor,
+            on_result=self.on_page_loaded, on_error=self.on_page_failed,
+            key=self.page_key, owner=self
+        )
+
+    def load_page(self, cursor):
+        """
+        Runs on the worker thread. The first page also records the row
+        version it was read at, so refresh() knows where to start from.
+        """
+        version = None
+        if self.fetch_changes is not None and cursor is None:
+            version = get_row_version()
+        results, next_cursor = self.fetch_page(cursor)
+        return results, next_cursor, version
+
+    def on_page_loaded(self, page):
+        results, self.next_cursor, version = page
+        if version is not None:
+            self.version = version
+        self.exhausted = self.next_cursor is None
+        self.loading = False
+        self.append_rows(results)
+
+    def on_page_failed(self, error):
+        print(f"Error loading page: {error}")
+        self.loading = False
+        self.exhausted = True
+
+    def append_rows(self, results):
+        """
+        Appends rows (records with one attribute per column) to the end of the model.
+        """
+        if not results:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(results) - 1)
+        self.rows.extend(map(self.values, results))
+        self.endInsertRows()
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        if parent.isValid() or row < 0 or row + count > len(self.rows):
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        del self.rows[row:row + count]
+        self.endRemoveRows()
+        return True
+
+    def reload(self):
+        """
+        Drops every loaded row and fetches the first page again.
+        """
+        query_runner.cancel(self.page_key)  # Any page still loading is stale now
+        query_runner.cancel(self.changes_key)
+        self.beginResetModel()
+        self.rows = []
+        self.next_cursor = None
+        self.exhausted = False
+        self.loading = False
+        self.version = None
+        self.endResetModel()
+        self.fetchMore()
+
+    def load_snapshot(self, page):
+        """
+        Replaces the loaded rows with a page read beforehand (rows,
+        next_cursor, version), e.g. the agenda prefetched at login.
+        """
+        query_runner.cancel(self.page_key)
+        query_runner.cancel(self.changes_key)
+        self.beginResetModel()
+        self.rows = []
+        self.endResetModel()
+        self.on_page_loaded(page)
+
+    def set_order(self, sort_key, descending=False):
+        """
+        Changes the order the pages come in (after a new sort was chosen on
+        the server side) and loads them again.
+        """
+        self.sort_key = sort_key
+        self.descending = descending
+        self.reload()
+
+    def refresh(self):
+        """
+        Applies only the rows changed since the last load, keeping scroll
+        position and selection. Falls back to reload() when changes cannot be
+        tracked.
+        """
+        if self.fetch_changes is None or self.version is None or self.loading:
+            self.reload()
+            return
+        query_runner.submit(
+            self.fetch_changes, self.version,
+            on_result=self.apply_changes, on_error=lambda e: self.reload(),
+            key=self.changes_key, owner=self
+        )
+
+    def _insert_position(self, key):
+        # Posição de inserção segundo a ordem das páginas (crescente ou decrescente)
+        lo, hi = 0, len(self.rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = self.sort_key(self.rows[mid])
+            if (mid_key > key) if self.descending else (mid_key < key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def apply_changes(self, changes):
+        """
+        Applies (changed rows, removed ids, version) with the minimal set of
+        row updates, removals and insertions.
+        """
+        changed, removed, self.version = changes
+        if not changed and not removed:
+            return
+        positions = {values[0]: row for row, values in enumerate(self.rows)}
+        drop = {positions[row_id] for row_id in removed if row_id in positions}
+        inserts = []
+        last_column = len(self.keys) - 1
+        for result in changed:
+            values = self.values(result)
+            row = positions.get(values[0])
+            in_scope = getattr(result, 'in_scope', True)
+            if row is not None and in_scope and self.sort_key(self.rows[row]) == self.sort_key(values):
+                # Same place in the order: update the row in place
+                if self.rows[row] != values:
+                    self.rows[row] = values
+                    self.dataChanged.emit(self.index(row, 0), self.index(row, last_column))
+                continue
+            if row is not None:
+                drop.add(row)  # Left the scope or moved: remove and insert again where it belongs
+            if in_scope:
+                inserts.append(values)
+
+        for row in sorted(drop, reverse=True):
+            self.removeRows(row, 1)
+
+        for values in inserts:
+            row = self._insert_position(self.sort_key(values))
+            if row == len(self.rows) and not self.exhausted:
+                continue  # Belongs to a page not loaded yet; paging will bring it
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.rows.insert(row, values)
+            self.endInsertRows()
+
+    def row_text(self, row):
+        """
+        Returns the displayed text of every column in the given row.
+        """
+        return ['' if value is None else str(value) for value in self.rows[row]]
+
+    def remove_row_by_id(self, row_id):
+        """
+        Removes the loaded row whose first column matches row_id, if any.
+        """
+        for row, values in enumerate(self.rows):
+            if str(values[0]) == str(row_id):
+                self.removeRows(row, 1)
+                return True
+        return False
+
+class SearchBox(QLineEdit):
+    """
+    Search field that emits `search` once the user stops typing for `delay`
+    milliseconds.
+    """
+    search = Signal(str)
+
+    def __init__(self, placeholder="Pesquisar...", delay=250, parent=None):
+        super().__init__(parent)
+        self.setPlaceholderText(placeholder)
+        self.setClearButtonEnabled(True)
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(delay)
+        self.debounce.timeout.connect(lambda: self.search.emit(self.text().strip()))
+        self.textChanged.connect(lambda _: self.debounce.start())  # Restart the wait on every keystroke
+
+class AsyncCompleterCombo(QComboBox):
+    """
+    Editable combo box that completes a client or doctor from `search(text,
+    limit)` in the background. Each item keeps the row id as its data.
+    """
+    def __init__(self, search, limit=20, delay=200, parent=None):
+        super().__init__(parent)
+        self.search = search
+        self.limit = limit
+        self.search_key = (id(self), 'completer')
+        self.setEditable(True)
+        self.setInsertPolicy(QComboBox.NoInsert)
+        self.lineEdit().setPlaceholderText("Escreva para pesquisar...")
+
+        # The popup lists whatever the last search returned, without filtering it again
+        completer = QCompleter(self.model(), self)
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setCompleter(completer)
+
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(delay)
+        self.debounce.timeout.connect(lambda: self.load(self.currentText().strip(), popup=True))
+        self.lineEdit().textEdited.connect(lambda _: self.debounce.start())
+
+    def load(self, text='', popup=False):
+        """
+        Fetches the first matches for text; a newer call supersedes this one.
+        """
+        query_runner.submit(
+            self.search, text, self.limit, owner=self, key=self.search_key,
+            on_result=lambda rows: self.fill(rows, popup)
+        )
+
+    def fill(self, rows, popup=False):
+        typed = self.currentText()
+        self.blockSignals(True)
+        self.clear()
+        for row in rows:
+            self.addItem(row.nome, row.id)
+        self.setCurrentIndex(-1)
+        self.setEditText(typed)  # Keep what the user is typing
+        self.blockSignals(False)
+        if popup and self.lineEdit().hasFocus() and rows:
+            self.completer().complete()
+
+    def set_selected(self, row_id, nome):
+        """
+        Shows the given row as the current choice.
+        """
+        query_runner.cancel(self.search_key)
+        self.clear()
+        self.addItem(nome, row_id)
+        self.setCurrentIndex(0)
+
+    def selected_id(self):
+        """
+        Returns the id of the chosen item, or None when the text typed
+        does not correspond to a listed item.
+        """
+        index = self.currentIndex()
+        if index < 0 or self.itemText(index) != self.currentText():
+            index = self.findText(self.currentText())
+        return self.itemData(index) if index >= 0 else None
+
+# Columns shown by every consultations table
+CONSULTA_COLUMNS = [
+    ('id', 'ID'), ('cliente_nome', 'Nome Doente'), ('medico_nome', 'Nome Medico'),
+    ('data', 'Data'), ('hora', 'Hora'), ('status', 'Estado')
+]
+
+def consulta_sort_key(values):
+    """
+    Order of the consultation pages: (data, hora, id).
+    """
+    return values[3], values[4], values[0]
+
+# Column clicked -> server-side sort (ConsultasManager.SORT_COLUMNS), and the matching row order
+CONSULTA_SORTS = {1: 'cliente_nome', 2: 'medico_nome', 3: 'data', 4: 'data', 5: 'status'}
+CONSULTA_SORT_KEYS = {
+    'data': consulta_sort_key,
+    'cliente_nome': lambda values: (values[1],) + consulta_sort_key(values),
+    'medico_nome': lambda values: (values[2],) + consulta_sort_key(values),
+    'status': lambda values: (values[5],) + consulta_sort_key(values),
+}
+
+class ConsultaFiltros(QWidget):
+    """
+    Filter bar of the consultations tables; filters() returns them as expected
+    by ConsultasManager.get_consultas_page.
+    """
+    changed = Signal()
+
+    def __init__(self, dates=True, delay=250, parent=None):
+        super().__init__(parent)
+        self.current = {}
+
+        self.medico_field = AsyncCompleterCombo(
+            lambda text, limit: medico_manager.search_medicos(text, page_size=limit)[0]
+        )
+        self.medico_field.lineEdit().setPlaceholderText("Todos os médicos")
+        self.medico_field.load()
+        self.status_field = QComboBox()
+        self.status_field.addItem("Todos os estados", None)
+        self.status_field.addItem("agendada", 'agendada')
+        self.status_field.addItem("concluida", 'concluida')
+        self.cliente_field = SearchBox("Nome do doente...", delay=delay)
+        self.clear_btn = QPushButton("Limpar")
+        self.clear_btn.clicked.connect(self.clear)
+
+        # Wait for a pause before filtering, like SearchBox
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(delay)
+        self.debounce.timeout.connect(self.emit_if_changed)
+
+        # Only a doctor picked from the list (or clearing the field) filters, not every keystroke
+        self.medico_field.activated.connect(lambda _: self.debounce.start())
+        self.medico_field.lineEdit().editingFinished.connect(self.debounce.start)
+        self.medico_field.lineEdit().textChanged.connect(lambda text: text or self.debounce.start())
+        self.status_field.currentIndexChanged.connect(lambda _: self.debounce.start())
+        self.cliente_field.search.connect(lambda _: self.emit_if_changed())
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.medico_field, 2)
+        layout.addWidget(self.status_field, 1)
+
+        self.dates_field = None
+        if dates:
+            today = QDate.currentDate()
+            self.dates_field = QCheckBox("Entre")
+            self.from_field = QDateEdit(today.addMonths(-1))
+            self.from_field.setCalendarPopup(True)
+            self.to_field = QDateEdit(today.addMonths(1))
+            self.to_field.setCalendarPopup(True)
+            self.dates_field.toggled.connect(lambda _: self.debounce.start())
+            self.from_field.dateChanged.connect(lambda _: self.dates_field.isChecked() and self.debounce.start())
+            self.to_field.dateChanged.connect(lambda _: self.dates_field.isChecked() and self.debounce.start())
+            layout.addWidget(self.dates_field)
+            layout.addWidget(self.from_field)
+            layout.addWidget(QLabel("e"))
+            layout.addWidget(self.to_field)
+
+        layout.addWidget(self.cliente_field, 2)
+        layout.addWidget(self.clear_btn)
+
+    def filters(self):
+        """
+        Returns the chosen filters; the ones left empty are not included.
+        """
+        filters = {}
+        medico_id = self.medico_field.selected_id()
+        if medico_id is not None:
+            filters['medico_id'] = medico_id
+        if self.status_field.currentData():
+            filters['status'] = self.status_field.currentData()
+        if self.dates_field is not None and self.dates_field.isChecked():
+            filters['date_from'] = self.from_field.date().toString('yyyy-MM-dd')
+            filters['date_to'] = self.to_field.date().toString('yyyy-MM-dd')
+        if self.cliente_field.text().strip():
+            filters['cliente'] = self.cliente_field.text().strip()
+        return filters
+
+    def emit_if_changed(self):
+        self.debounce.stop()
+        filters = self.filters()
+        if filters != self.current:
+            self.current = filters
+            self.changed.emit()
+
+    def clear(self):
+        """
+        Removes every filter.
+        """
+        self.medico_field.setCurrentIndex(-1)
+        self.medico_field.setEditText('')
+        self.status_field.setCurrentIndex(0)
+        if self.dates_field is not None:
+            self.dates_field.setChecked(False)
+        self.cliente_field.clear()
+        self.emit_if_changed()
 
 class StartWindow(QMainWindow):
     """
@@ -76,27 +980,74 @@ class LoginWindow(QDialog):
         layout.addWidget(self.login_btn)
     
     def call_login(self, username, password):
+        # Authenticate the user in the background; bcrypt is deliberately slow
+        self.login_btn.setEnabled(False)
+        # A agenda de hoje e de amanhã é lida noutra thread enquanto o bcrypt corre,
+        # e só é usada se a password for aceite
+        self.user = None
+        self.agenda = None
+        self.agenda_pending = True
+        query_runner.submit(
+            consulta_manager.prefetch_agenda,
+            key=(id(self), 'agenda'), owner=self, quiet=True,
+            on_result=self.on_agenda_loaded, on_error=lambda error: self.on_agenda_loaded({})
+        )
+        query_runner.submit(
+            user_manager.authenticate, username, password,
+            key=(id(self), 'login'), owner=self,
+            on_result=self.on_login_result, on_error=self.on_login_failed
+        )
+
+    def on_agenda_loaded(self, agenda):
+        self.agenda_pending = False
+        if self.user is None:
+            self.agenda = agenda  # O login ainda não terminou
+        elif self.user[0]:
+            self.open_main_window(agenda)
+        else:
+            consulta_manager.discard_agenda()
+
+    def on_login_failed(self, error):
+        self.user = (False, None)
+        self.discard_agenda()
+        self.login_btn.setEnabled(True)
+        QMessageBox.warning(self, 'Falha no Login', f'Ocorreu um erro: {error}')
+
+    def discard_agenda(self):
+        self.agenda = None
+        if not self.agenda_pending:
+            consulta_manager.discard_agenda()
+
+    def on_login_result(self, user):
         global role
-        # Authenticate the user with the provided username and password
-        user = user_manager.authenticate(username, password)
+        self.user = user
         if user[0]:  # If authentication is successful
             role = user[1]  # Store the user's role
-            self.consultas = ConsultasMainWindow(role)  # Create an instance of the main window
-            self.consultas.show()  # Show the main window
-
-            self.accept()  # Close the login dialog
-            
-            if self.parent():  # If there is a parent window, close it
-                self.parent().close()
+            if not self.agenda_pending:
+                self.open_main_window(self.agenda)
         else:
+            self.discard_agenda()
+            self.login_btn.setEnabled(True)
             # Show a warning message if authentication fails
             QMessageBox.warning(self, 'Falha no Login', 'Nome de utilizador ou palavra-passe inválidos. Por favor, tente novamente.')
 
+    def open_main_window(self, agenda):
+        self.login_btn.setEnabled(True)
+        self.consultas = ConsultasMainWindow(role, agenda)  # Create an instance of the main window
+        self.consultas.show()  # Show the main window
+
+        self.accept()  # Close the login dialog
+
+        if self.parent():  # If there is a parent window, close it
+            self.parent().close()
+
 class ConsultasMainWindow(QMainWindow):
     """
-    Main application window displaying today's consultations and menu options
+    Main application window displaying today's (or tomorrow's) consultations
+    and menu options. agenda holds the snapshots prefetched at login.
     """
-    def __init__(self, role):
+    @ui_timed('consultas_table')
+    def __init__(self, role, agenda=None):
         super().__init__()
         self.setWindowTitle("Consultas do Dia")
         screen = QApplication.primaryScreen().geometry()
@@ -131,6 +1082,8 @@ class ConsultasMainWindow(QMainWindow):
         medicos_action.triggered.connect(lambda: self.call_medicos())
         clientes_action = QAction('Clientes', self)
         clientes_action.triggered.connect(lambda: self.call_clientes())
+        diagnostics_action = QAction('Diagnóstico', self)
+        diagnostics_action.triggered.connect(lambda: self.call_diagnostics(role))
         about_action = QAction('Sobre', self)
         about_action.triggered.connect(lambda: self.call_about())
         logout_action = QAction('Logout', self)
@@ -141,6 +1094,7 @@ class ConsultasMainWindow(QMainWindow):
         self.files_menu.addAction(users_action)
         self.files_menu.addAction(medicos_action)
         self.files_menu.addAction(clientes_action)
+        self.files_menu.addAction(diagnostics_action)
         self.files_menu.addAction(about_action)
         self.files_menu.addAction(logout_action)
 
@@ -153,14 +1107,43 @@ class ConsultasMainWindow(QMainWindow):
         self.consultas_table.setSelectionBehavior(QTableView.SelectRows)
         self.consultas_table.setSelectionMode(QTableView.SingleSelection)
 
-        # Set up the model for the table
-        self.model = QStandardItemModel()
-        self.model.setHorizontalHeaderLabels(['ID', 'Nome Doente', 'Nome Medico', 'Data', 'Hora', 'Estado'])
+        # Set up the model for the table; sorting and filtering are done by the database
+        self.sort, self.descending, self.filters = 'data', False, {}
+        self.scope = 'today'
+        self.agenda = dict(agenda or {})
+        self.model = LazyTableModel(
+            CONSULTA_COLUMNS,
+            lambda cursor: consulta_manager.get_consultas_page(
+                self.scope, cursor=cursor, sort=self.sort, descending=self.descending, filters=self.filters
+            ),
+            fetch_changes=lambda since: consulta_manager.get_consultas_changes(self.scope, since, self.filters),
+            sort_key=consulta_sort_key
+        )
+        snapshot = self.agenda.pop(self.scope, None)
+        if snapshot is not None:
+            # Agenda lida durante o login: a tabela aparece logo preenchida
+            self.model.load_snapshot(snapshot)
         self.refresh_table()
+        change_notifier.watch(self, ('consultas', 'clientes', 'medicos'), lambda changes: self.refresh_table())
         self.consultas_table.setModel(self.model)
         self.consultas_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.consultas_table.setColumnHidden(0, True)  # Optionally hide the ID column
 
+        # Clicking a column header sorts by it (in the database)
+        self.consultas_table.horizontalHeader().setSortIndicator(3, Qt.AscendingOrder)
+        self.consultas_table.setSortingEnabled(True)
+        self.consultas_table.horizontalHeader().sortIndicatorChanged.connect(self.on_sort_changed)
+
+        # Filters by doctor, status and patient name
+        self.filter_bar = ConsultaFiltros(dates=False)
+        self.filter_bar.changed.connect(self.on_filters_changed)
+
+        # Agenda de hoje ou de amanhã
+        self.scope_combo = QComboBox()
+        self.scope_combo.addItem("Hoje", 'today')
+        self.scope_combo.addItem("Amanhã", 'tomorrow')
+        self.scope_combo.currentIndexChanged.connect(self.on_scope_changed)
+
         # Initialize buttons for editing and canceling consultations
         self.edit_btn = QPushButton("Editar Consulta")
         self.edit_btn.clicked.connect(lambda: self.call_edit())
@@ -170,7 +1153,12 @@ class ConsultasMainWindow(QMainWindow):
     
         # Set up the layout for the main window
         self.layout = QVBoxLayout()
-        self.layout.addWidget(self.label)
+        header_layout = QHBoxLayout()
+        header_layout.addWidget(self.label)
+        header_layout.addStretch()
+        header_layout.addWidget(self.scope_combo)
+        self.layout.addLayout(header_layout)
+        self.layout.addWidget(self.filter_bar)
         self.layout.addWidget(self.consultas_table)
 
         # Create a horizontal layout for buttons
@@ -185,23 +1173,34 @@ class ConsultasMainWindow(QMainWindow):
         central_widget.setLayout(self.layout)
         self.setCentralWidget(central_widget)
 
+    @ui_timed('consultas_table')
     def refresh_table(self):
         """
-        Clears the current table and reloads all data from the database.
+        Brings the table up to date, applying only the consultations that changed.
         """
-        self.model.removeRows(0, self.model.rowCount())  # Clear the table
-
-        results = consulta_manager.get_today_consultas()  # Fetch consultations for today
-        for row in results:
-            new_row = [
-                QStandardItem(str(row['id'])),  # consulta_id
-                QStandardItem(row['cliente_nome']),  # cliente_nome
-                QStandardItem(row['medico_nome']),  # medico_nome
-                QStandardItem(row['data']),  # data
-                QStandardItem(row['hora']),  # hora
-                QStandardItem(row['status'])  # status
-            ]
-            self.model.appendRow(new_row)  # Add the new row to the table
+        self.model.refresh()
+
+    @ui_timed('consultas_table')
+    def on_sort_changed(self, column, order):
+        self.sort = CONSULTA_SORTS.get(column, 'data')
+        self.descending = order == Qt.DescendingOrder
+        self.model.set_order(CONSULTA_SORT_KEYS[self.sort], self.descending)
+
+    @ui_timed('consultas_table')
+    def on_filters_changed(self):
+        self.filters = self.filter_bar.filters()
+        self.model.reload()
+
+    @ui_timed('consultas_table')
+    def on_scope_changed(self, index):
+        self.scope = self.scope_combo.itemData(index)
+        snapshot = self.agenda.pop(self.scope, None)
+        if snapshot is not None and self.sort == 'data' and not self.descending and not self.filters:
+            # A agenda de amanhã também foi lida no login: só falta o que mudou desde então
+            self.model.load_snapshot(snapshot)
+            self.model.refresh()
+        else:
+            self.model.reload()
 
     def delete_selected_consulta(self):
         """
@@ -224,10 +1223,16 @@ class ConsultasMainWindow(QMainWindow):
         )
 
         if confirm == QMessageBox.Yes:
-            consulta_manager.del_consulta(consulta_id)  # Remove from the database
-            self.model.removeRow(selected_row)  # Remove from the table model
-            self.refresh_table()  # Refresh the table
-            QMessageBox.information(self, "Sucesso", "Consulta cancelada com sucesso.")
+            # Remove from the database in the background, then refresh the table
+            query_runner.submit(
+                consulta_manager.del_consulta, consulta_id, owner=self,
+                on_result=lambda _: self.on_consulta_deleted(consulta_id)
+            )
+
+    def on_consulta_deleted(self, consulta_id):
+        self.model.remove_row_by_id(consulta_id)  # Remove from the table model
+        self.refresh_table()  # Refresh the table
+        QMessageBox.information(self, "Sucesso", "Consulta cancelada com sucesso.")
 
     def call_edit(self):
         """
@@ -240,14 +1245,11 @@ class ConsultasMainWindow(QMainWindow):
             return
 
         selected_row = selected_indexes[0].row()
-        consulta_id = int(self.consultas_table.model().item(selected_row, 0).text())  # Get consulta ID
+        consulta_id = int(self.model.data(self.model.index(selected_row, 0)))  # Get consulta ID
 
         # Open the dialog in "edit" mode
         dialog = ConsultaEditar(mode='edit', consulta_id=consulta_id)
-        dialog.set_data(consulta_id, *[
-            self.consultas_table.model().item(selected_row, col).text() 
-            for col in range(1, self.model.columnCount())
-        ])  # Pass data from the selected row
+        dialog.set_data(consulta_id, *self.model.row_text(selected_row)[1:])  # Pass data from the selected row
 
         if dialog.exec() == QDialog.Accepted:  # Refresh the table if dialog is accepted
             self.refresh_table()
@@ -295,6 +1297,16 @@ class ConsultasMainWindow(QMainWindow):
     def call_about(self):
         about = About()
         about.exec()
+
+    def call_diagnostics(self, role):
+        """
+        Opens the database diagnostics dialog (administrators only).
+        """
+        if role == 'padrao':
+            QMessageBox.warning(self, 'Permissão insuficiente', 'Não tem permissão para ver o diagnóstico')
+        else:
+            dialog = Diagnostico()
+            dialog.exec()
     
     def toggle_theme(self):
         """
@@ -322,6 +1334,14 @@ class ConsultasMainWindow(QMainWindow):
             self.start_window = StartWindow()  # Reopen the start window
             self.start_window.show()
 
+# Opções de repetição ao marcar uma consulta ('semanas' usa o intervalo escolhido no formulário)
+REPETICOES = [
+    ("Não repetir", None),
+    ("Todas as semanas", 'semanal'),
+    ("A cada N semanas", 'semanas'),
+    ("Todos os meses (mesmo dia da semana)", 'mensal'),
+]
+
 class ConsultaEditar(QDialog):
     """
     Dialog for adding or editing consultation details
@@ -329,17 +1349,23 @@ class ConsultaEditar(QDialog):
     def __init__(self, mode='add', consulta_id=None):
         super().__init__()
         self.setWindowTitle("Detalhes da Consulta")
-        self.setFixedSize(400, 300)
+        self.setFixedSize(400, 430 if mode == 'add' else 340)
 
         self.mode = mode
         self.consulta_id = consulta_id if mode == 'edit' else None
+        self.serie_id = None  # Preenchido em set_data quando a consulta faz parte de uma série
 
         # Create layout for input fields
         self.form_layout = QFormLayout()
 
         # Initialize fields for client, doctor, date, time, and status
-        self.nome_cliente_field = QComboBox()  # ComboBox for selecting the client
-        self.nome_medico_field = QComboBox()  # ComboBox for selecting the doctor
+        # Type-ahead fields for selecting the client and doctor
+        self.nome_cliente_field = AsyncCompleterCombo(
+            lambda text, limit: cliente_manager.search_clients(text, page_size=limit)[0]
+        )
+        self.nome_medico_field = AsyncCompleterCombo(
+            lambda text, limit: medico_manager.search_medicos(text, page_size=limit)[0]
+        )
         self.data_field = QDateEdit()  # Date selection field
         self.data_field.setCalendarPopup(True)
         self.hora_field = QTimeEdit()  # Time selection field
@@ -353,6 +1379,30 @@ class ConsultaEditar(QDialog):
         self.form_layout.addRow("Hora:", self.hora_field)
         self.form_layout.addRow("Status:", self.status_field)
 
+        # Fills date and time with the doctor's first free slot
+        self.next_slot_button = QPushButton("Próxima vaga")
+        self.next_slot_button.clicked.connect(self.pick_next_available)
+        self.form_layout.addRow("", self.next_slot_button)
+
+        # Repetition, only when booking: the whole series is booked at once
+        self.repeat_field = QComboBox()
+        for label, repeat in REPETICOES:
+            self.repeat_field.addItem(label, repeat)
+        self.intervalo_field = QSpinBox()
+        self.intervalo_field.setRange(2, 12)
+        self.intervalo_field.setSuffix(" semanas")
+        self.ocorrencias_field = QSpinBox()
+        self.ocorrencias_field.setRange(2, MAX_OCORRENCIAS)
+        self.ocorrencias_field.setValue(10)
+        self.repeat_field.currentIndexChanged.connect(self.on_repeat_changed)
+        self.on_repeat_changed()
+        if mode == 'add':
+            repeat_layout = QHBoxLayout()
+            repeat_layout.addWidget(self.repeat_field, 1)
+            repeat_layout.addWidget(self.intervalo_field)
+            self.form_layout.addRow("Repetir:", repeat_layout)
+            self.form_layout.addRow("Ocorrências:", self.ocorrencias_field)
+
         # Create layout for buttons
         self.button_layout = QHBoxLayout()
         self.save_button = QPushButton("Salvar")
@@ -392,6 +1442,7 @@ class ConsultaEditar(QDialog):
             self.populate_cliente_combo(cliente_nome=cliente_id)
             self.populate_medico_combo(medico_nome=medico_id)
 
+    @ui_timed()
     def save_consulta(self):
         """
         Handles saving the new consultation to the database.
@@ -401,65 +1452,189 @@ class ConsultaEditar(QDialog):
 
         # Validate required fields
         if not data["cliente_id"] or not data["medico_id"] or not data["data"] or not data["hora"] or not data["status"]:
-            QMessageBox.warning(self, "Campos obrigatórios", "Por favor, preencha todos os campos obrigatórios.")
+            with ui_timings.paused():
+                QMessageBox.warning(self, "Campos obrigatórios", "Por favor, preencha todos os campos obrigatórios.")
             return
         
-        try:
-            if self.mode == 'add':  # Adding a new consultation
-                consulta_manager.add_consulta(
-                    data["cliente_id"], 
-                    data["medico_id"], 
-                    data["data"], 
-                    data["hora"], 
-                    data["status"]
-                )
-                QMessageBox.information(self, "Consulta Adicionada", "A consulta foi adicionada com sucesso!")
-            elif self.mode == 'edit':  # Editing an existing consultation
-                consulta_manager.update_consulta(
-                    self.consulta_id, 
-                    data["cliente_id"], 
-                    data["medico_id"], 
-                    data["data"], 
-                    data["hora"], 
-                    data["status"]
+        if self.mode == 'add' and self.get_rule() is not None:  # Booking a series
+            self.save_series(data)
+            return
+
+        if self.mode == 'add':  # Adding a new consultation
+            save = lambda: consulta_manager.add_consulta(
+                data["cliente_id"], 
+                data["medico_id"], 
+                data["data"], 
+                data["hora"], 
+                data["status"]
+            )
+            message = ("Consulta Adicionada", "A consulta foi adicionada com sucesso!")
+        else:  # Editing an existing consultation
+            following = False
+            if self.serie_id is not None:
+                following = self.ask_series_scope()
+                if following is None:
+                    return
+            update = series_manager.update_following if following else consulta_manager.update_consulta
+            save = lambda: update(
+                self.consulta_id, 
+                data["cliente_id"], 
+                data["medico_id"], 
+                data["data"], 
+                data["hora"], 
+                data["status"]
+            )
+            if following:
+                message = ("Consultas Atualizadas", "A consulta e as seguintes da série foram atualizadas com sucesso!")
+            else:
+                message = ("Consulta Atualizada", "A consulta foi atualizada com sucesso!")
+
+        # Save in the background; the dialog closes once the database confirms
+        self.save_button.setEnabled(False)
+        query_runner.submit(
+            save, owner=self,
+            on_result=lambda _: self.on_saved(*message),
+            on_error=self.on_save_failed
+        )
+
+    def on_saved(self, title, message):
+        with ui_timings.paused():
+            QMessageBox.information(self, title, message)
+        self.accept()  # Close the dialog
+
+    def on_save_failed(self, e):
+        self.save_button.setEnabled(True)
+        with ui_timings.paused():
+            if isinstance(e, ConflitoHorarioError):
+                QMessageBox.warning(self, "Horário ocupado", str(e))
+            elif isinstance(e, ValueError):
+                QMessageBox.warning(self, "Erro", f"Erro ao adicionar/atualizar consulta: {e}")
+            else:
+                QMessageBox.warning(self, "Erro", f"Ocorreu um erro: {e}")
+
+    def on_repeat_changed(self):
+        repeat = self.repeat_field.currentData()
+        self.intervalo_field.setEnabled(repeat == 'semanas')
+        self.ocorrencias_field.setEnabled(repeat is not None)
+
+    def get_rule(self):
+        """
+        Returns the RecurrenceRule chosen in the form, or None for a single consultation.
+        """
+        repeat = self.repeat_field.currentData()
+        if repeat == 'semanas':
+            return RecurrenceRule('semanal', self.intervalo_field.value())
+        if repeat:
+            return RecurrenceRule(repeat)
+        return None
+
+    def save_series(self, data, skip_conflicts=False):
+        """
+        Books the whole series in the background. If some dates are taken,
+        offers to book only the free ones.
+        """
+        self.save_button.setEnabled(False)
+        query_runner.submit(
+            series_manager.add_series,
+            data["cliente_id"],
+            data["medico_id"],
+            self.data_field.date().toPython(),
+            data["hora"],
+            data["status"],
+            self.get_rule(),
+            self.ocorrencias_field.value(),
+            skip_conflicts=skip_conflicts,
+            owner=self,
+            on_result=self.on_series_saved,
+            on_error=lambda e: self.on_series_failed(e, data, skip_conflicts)
+        )
+
+    def on_series_saved(self, result):
+        _, booked, skipped = result
+        message = f"Foram marcadas {len(booked)} consultas."
+        if skipped:
+            message += f" {len(skipped)} datas ficaram de fora por o médico já ter consulta."
+        self.on_saved("Série Marcada", message)
+
+    def on_series_failed(self, e, data, skip_conflicts):
+        if isinstance(e, ConflitoSerieError) and not skip_conflicts and len(e.conflitos) < self.ocorrencias_field.value():
+            with ui_timings.paused():
+                confirm = QMessageBox.question(
+                    self,
+                    "Horários ocupados",
+                    f"{e}\n\nMarcar apenas as restantes datas?",
+                    QMessageBox.Yes | QMessageBox.No
                 )
-                QMessageBox.information(self, "Consulta Atualizada", "A consulta foi atualizada com sucesso!")
-            self.accept()  # Close the dialog
-        
-        except ValueError as e:
-            QMessageBox.warning(self, "Erro", f"Erro ao adicionar/atualizar consulta: {e}")
-        except Exception as e:
-            QMessageBox.warning(self, "Erro", f"Ocorreu um erro: {e}")
+            if confirm == QMessageBox.Yes:
+                self.save_series(data, skip_conflicts=True)
+                return
+        self.on_save_failed(e)
+
+    def ask_series_scope(self):
+        """
+        Asks whether an edit also applies to the following consultations of
+        the series. Returns True, False, or None if cancelled.
+        """
+        box = QMessageBox(self)
+        box.setWindowTitle("Consulta repetida")
+        box.setText("Esta consulta faz parte de uma série. Aplicar a alteração a:")
+        only_this = box.addButton("Só esta", QMessageBox.AcceptRole)
+        following = box.addButton("Esta e as seguintes", QMessageBox.AcceptRole)
+        box.addButton("Cancelar", QMessageBox.RejectRole)
+        with ui_timings.paused():
+            box.exec()
+        if box.clickedButton() is only_this:
+            return False
+        if box.clickedButton() is following:
+            return True
+        return None
+
+    def pick_next_available(self):
+        """
+        Looks up the selected doctor's next free slot from the chosen date
+        onwards and puts it in the date and time fields.
+        """
+        medico_id = self.nome_medico_field.selected_id()
+        if not medico_id:
+            QMessageBox.warning(self, "Campos obrigatórios", "Por favor, selecione um médico.")
+            return
+        from_date = max(self.data_field.date().toPython(), date.today())
+        self.next_slot_button.setEnabled(False)
+        query_runner.submit(
+            availability_manager.next_available, medico_id, from_date,
+            owner=self, key=(id(self), 'vaga'),
+            on_result=self.on_next_available,
+            on_error=self.on_next_available_failed
+        )
+
+    def on_next_available(self, slot):
+        self.next_slot_button.setEnabled(True)
+        if slot is None:
+            QMessageBox.information(self, "Sem vagas", "O médico não tem horários livres no próximo ano.")
+            return
+        data, hora = slot
+        self.data_field.setDate(QDate.fromString(data, 'yyyy-MM-dd'))
+        self.hora_field.setTime(QTime.fromString(hora, 'HH:mm'))
+
+    def on_next_available_failed(self, e):
+        self.next_slot_button.setEnabled(True)
+        QMessageBox.warning(self, "Erro", f"Ocorreu um erro: {e}")
 
-    def populate_cliente_combo(self, selected_cliente_nome=None):
+    @ui_timed('nome_cliente_field')
+    def populate_cliente_combo(self):
         """
-        Populates the client combo box with names and ids.
-        Optionally selects the given client name.
+        Loads the first clients into the client field; the rest are
+        fetched as the user types.
         """
-        clientes = cliente_manager.get_all_clients()  # Retrieve all clients
-        self.nome_cliente_field.clear()  # Clear previous items
-        for cliente in clientes:
-            self.nome_cliente_field.addItem(cliente['nome'], cliente['id'])  # Add client name and ID
-        if selected_cliente_nome:
-            # If a name is passed, select the corresponding item
-            index = self.nome_cliente_field.findText(selected_cliente_nome)
-            if index != -1:
-                self.nome_cliente_field.setCurrentIndex(index)
+        self.nome_cliente_field.load()
 
-    def populate_medico_combo(self, selected_medico_nome=None):
+    @ui_timed('nome_medico_field')
+    def populate_medico_combo(self):
         """
-        Populates the doctor combo box with names and ids.
-        Optionally selects the given doctor name.
+        Loads the first doctors into the doctor field; the rest are
+        fetched as the user types.
         """
-        medicos = medico_manager.get_all_medicos()  # Retrieve all doctors
-        self.nome_medico_field.clear()  # Clear previous items
-        for medico in medicos:
-            self.nome_medico_field.addItem(medico['nome'], medico['id'])  # Add doctor name and ID
-        if selected_medico_nome:
-            # If a name is passed, select the corresponding item
-            index = self.nome_medico_field.findText(selected_medico_nome)
-            if index != -1:
-                self.nome_medico_field.setCurrentIndex(index)
+        self.nome_medico_field.load()
 
     def set_data(self, consulta_id, cliente_id, medico_id, data, hora, status):
         """
@@ -470,8 +1645,27 @@ class ConsultaEditar(QDialog):
         self.hora_field.setTime(QTime.fromString(hora, 'HH:mm'))  # Set time from string
         self.status_field.setCurrentText(status)
 
-        self.populate_cliente_combo(selected_cliente_nome=cliente_id)  # Populate client combo
-        self.populate_medico_combo(selected_medico_nome=medico_id)  # Populate doctor combo
+        # The table row only has the names: look up the ids of this consultation's client and doctor
+        self.nome_cliente_field.set_selected(None, cliente_id)
+        self.nome_medico_field.set_selected(None, medico_id)
+        self.save_button.setEnabled(False)
+        query_runner.submit(
+            consulta_manager.get_consulta_participants, consulta_id, owner=self,
+            on_result=self.on_participants_loaded,
+            on_error=self.on_participants_failed
+        )
+
+    def on_participants_loaded(self, participants):
+        if participants:
+            self.nome_cliente_field.set_selected(participants['cliente_id'], participants['cliente_nome'])
+            self.nome_medico_field.set_selected(participants['medico_id'], participants['medico_nome'])
+            self.serie_id = participants['serie_id']
+        self.save_button.setEnabled(True)
+
+    def on_participants_failed(self, e):
+        # O formulário continua utilizável: basta escolher de novo o cliente e o médico
+        self.save_button.setEnabled(True)
+        QMessageBox.warning(self, "Erro", f"Ocorreu um erro: {e}")
 
     def get_data(self):
         """
@@ -479,8 +1673,8 @@ class ConsultaEditar(QDialog):
         """
         return {
             "consulta_id": self.consulta_id,
-            "cliente_id": self.nome_cliente_field.currentData(),  # Get client ID (stored data)
-            "medico_id": self.nome_medico_field.currentData(),  # Get doctor ID (stored data)
+            "cliente_id": self.nome_cliente_field.selected_id(),  # Get client ID (stored data)
+            "medico_id": self.nome_medico_field.selected_id(),  # Get doctor ID (stored data)
             "data": self.data_field.date().toString('yyyy-MM-dd'),  # Get formatted date
             "hora": self.hora_field.time().toString('HH:mm'),  # Get formatted time
             "status": self.status_field.currentText()
@@ -509,26 +1703,46 @@ class TodasConsultas(QMainWindow):
         self.consultas_table.setSelectionBehavior(QTableView.SelectRows)
         self.consultas_table.setSelectionMode(QTableView.SingleSelection)
 
-        # Set up the model for the table with headers
-        self.model = QStandardItemModel()
-        self.model.setHorizontalHeaderLabels(['ID', 'Nome Doente', 'Nome Medico', 'Data', 'Hora', 'Estado'])
+        # Set up the model for the table; pages are fetched as the view scrolls,
+        # already sorted and filtered by the database
+        self.scope = 'past' if past else 'future'
+        self.sort, self.descending, self.filters = 'data', past, {}
+        self.model = LazyTableModel(
+            CONSULTA_COLUMNS,
+            lambda cursor: consulta_manager.get_consultas_page(
+                self.scope, cursor=cursor, sort=self.sort, descending=self.descending, filters=self.filters
+            ),
+            fetch_changes=lambda since: consulta_manager.get_consultas_changes(self.scope, since, self.filters),
+            sort_key=consulta_sort_key, descending=past
+        )
         self.refresh_table(past)
+        change_notifier.watch(self, ('consultas', 'clientes', 'medicos'), lambda changes: self.refresh_table(past))
         self.consultas_table.setModel(self.model)
         self.consultas_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.consultas_table.setColumnHidden(0, True)
 
+        # Clicking a column header sorts by it (in the database)
+        self.consultas_table.horizontalHeader().setSortIndicator(3, Qt.DescendingOrder if past else Qt.AscendingOrder)
+        self.consultas_table.setSortingEnabled(True)
+        self.consultas_table.horizontalHeader().sortIndicatorChanged.connect(self.on_sort_changed)
+
+        # Filters by doctor, status, date range and patient name
+        self.filter_bar = ConsultaFiltros()
+        self.filter_bar.changed.connect(self.on_filters_changed)
+
         # Set text color to red if past consultations
         if past:
             self.consultas_table.setStyleSheet("QTableView { color: red; }")
 
         # Initialize layout for the main window
         self.layout = QVBoxLayout()
+        self.layout.addWidget(self.filter_bar)
         self.layout.addWidget(self.consultas_table)
 
+        button_layout = QHBoxLayout()  # Create a horizontal layout for buttons
+
         # Add buttons for future consultations
         if not past:
-            button_layout = QHBoxLayout()  # Create a horizontal layout for buttons
-
             self.add_btn = QPushButton('Marcar Consulta')
             self.add_btn.clicked.connect(lambda: self.call_add(past))
             button_layout.addWidget(self.add_btn)
@@ -541,7 +1755,11 @@ class TodasConsultas(QMainWindow):
             self.cancel_btn.clicked.connect(self.delete_selected_consulta)
             button_layout.addWidget(self.cancel_btn)
 
-            self.layout.addLayout(button_layout)  # Add the button layout to the main layout
+        self.export_btn = QPushButton("Exportar")
+        self.export_btn.clicked.connect(self.call_export)
+        button_layout.addWidget(self.export_btn)
+
+        self.layout.addLayout(button_layout)  # Add the button layout to the main layout
 
         # Set the central widget with the layout
         central_widget = QWidget()
@@ -568,13 +1786,17 @@ class TodasConsultas(QMainWindow):
         )
 
         if confirm == QMessageBox.Yes:
-            # Remove from the database
-            consulta_manager.del_consulta(consulta_id)
+            # Remove from the database in the background
+            query_runner.submit(
+                consulta_manager.del_consulta, consulta_id, owner=self,
+                on_result=lambda _: self.on_consulta_deleted(consulta_id)
+            )
 
-            # Remove from the table model
-            self.model.removeRow(selected_row)
+    def on_consulta_deleted(self, consulta_id):
+        # Remove from the table model
+        self.model.remove_row_by_id(consulta_id)
 
-            QMessageBox.information(self, "Success", "Consultation canceled successfully.")
+        QMessageBox.information(self, "Success", "Consultation canceled successfully.")
 
     def call_add(self, past):
         # Open the dialog to add a new consultation
@@ -592,41 +1814,109 @@ class TodasConsultas(QMainWindow):
 
         # Get the selected row
         selected_row = selected_indexes[0].row()
-        consulta_id = int(self.consultas_table.model().item(selected_row, 0).text())  # Get consulta ID from the table
+        consulta_id = int(self.model.data(self.model.index(selected_row, 0)))  # Get consulta ID from the table
 
         # Open the dialog in "edit" mode, passing the selected consulta_id
         dialog = ConsultaEditar(mode='edit', consulta_id=consulta_id)
         
         # Pass the data to the dialog from the selected row
-        dialog.set_data(consulta_id, *[
-            self.consultas_table.model().item(selected_row, col).text() 
-            for col in range(1, self.model.columnCount())
-        ])  
+        dialog.set_data(consulta_id, *self.model.row_text(selected_row)[1:])
 
         if dialog.exec() == QDialog.Accepted:  # If the dialog is accepted
             # Refresh the table to reflect any changes
             self.refresh_table(past)
 
+    def call_export(self):
+        """
+        Asks for a date range and a file, then exports the consultations in the background.
+        """
+        dialog = ExportarConsultas(past=self.scope == 'past')
+        if dialog.exec() != QDialog.Accepted:
+            return
+        date_from, date_to, file_format = dialog.get_data()
+        extension = {'csv': 'csv', 'jsonl': 'jsonl', 'columnar': 'col'}[file_format]
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Exportar Consultas", f"consultas.{extension}", f"{file_format} (*.{extension})"
+        )
+        if not path:
+            return
+        self.export_btn.setEnabled(False)
+        query_runner.submit(
+            export.export, 'consultas', path, file_format, date_from, date_to, owner=self,
+            on_result=self.on_exported, on_error=self.on_export_failed
+        )
+
+    def on_exported(self, count):
+        self.export_btn.setEnabled(True)
+        QMessageBox.information(self, "Exportação concluída", f"{count} consultas exportadas.")
+
+    def on_export_failed(self, e):
+        self.export_btn.setEnabled(True)
+        QMessageBox.warning(self, "Erro", f"Falha ao exportar consultas: {e}")
+
+    @ui_timed('consultas_table')
     def refresh_table(self, past):
-        # Clear the current model
-        self.model.removeRows(0, self.model.rowCount())
+        # Apply only the consultations that changed; the first call loads the first page
+        # and the rest is loaded on demand while scrolling
+        self.model.refresh()
+
+    @ui_timed('consultas_table')
+    def on_sort_changed(self, column, order):
+        self.sort = CONSULTA_SORTS.get(column, 'data')
+        self.descending = order == Qt.DescendingOrder
+        self.model.set_order(CONSULTA_SORT_KEYS[self.sort], self.descending)
+
+    @ui_timed('consultas_table')
+    def on_filters_changed(self):
+        self.filters = self.filter_bar.filters()
+        self.model.reload()
+
+class ExportarConsultas(QDialog):
+    """
+    Dialog for choosing the date range and format of a consultations export
+    """
+    def __init__(self, past=False):
+        super().__init__()
+        self.setWindowTitle("Exportar Consultas")
+        self.setFixedSize(360, 220)
+
+        # Default range: the last year for past consultations, the next year for future ones
+        today = QDate.currentDate()
+        self.from_field = QDateEdit(today.addYears(-1) if past else today)
+        self.from_field.setCalendarPopup(True)
+        self.to_field = QDateEdit(today.addDays(-1) if past else today.addYears(1))
+        self.to_field.setCalendarPopup(True)
+        self.format_field = QComboBox()
+        self.format_field.addItem("CSV", 'csv')
+        self.format_field.addItem("JSON Lines", 'jsonl')
+        self.format_field.addItem("Colunar", 'columnar')
+
+        form_layout = QFormLayout()
+        form_layout.addRow("De:", self.from_field)
+        form_layout.addRow("Até:", self.to_field)
+        form_layout.addRow("Formato:", self.format_field)
+
+        self.export_button = QPushButton("Exportar")
+        self.export_button.clicked.connect(self.accept)
+        self.cancel_button = QPushButton("Cancelar")
+        self.cancel_button.clicked.connect(self.reject)
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.export_button)
+        button_layout.addWidget(self.cancel_button)
 
-        # Fetch and populate the data based on consultation type
-        if past:
-            results = consulta_manager.get_past_consultas()
-        else:
-            results = consulta_manager.get_future_consultas()
-        
-        for row in results:
-            new_row = [
-                QStandardItem(str(row['id'])),           # consulta_id
-                QStandardItem(row['cliente_nome']),      # cliente_nome
-                QStandardItem(row['medico_nome']),       # medico_nome
-                QStandardItem(row['data']),              # data
-                QStandardItem(row['hora']),              # hora
-                QStandardItem(row['status'])             # status
-            ]
-            self.model.appendRow(new_row)
+        self.layout = QVBoxLayout(self)
+        self.layout.addLayout(form_layout)
+        self.layout.addLayout(button_layout)
+
+    def get_data(self):
+        """
+        Returns (date_from, date_to, format) as chosen in the dialog.
+        """
+        return (
+            self.from_field.date().toString('yyyy-MM-dd'),
+            self.to_field.date().toString('yyyy-MM-dd'),
+            self.format_field.currentData(),
+        )
 
 class TodosUsers(QMainWindow):
     """
@@ -649,9 +1939,13 @@ class TodosUsers(QMainWindow):
         self.users_table.setSelectionMode(QTableView.SingleSelection)
 
         # Initialize the model for the user data
-        self.model = QStandardItemModel()
-        self.model.setHorizontalHeaderLabels(['ID', 'Nome', 'Username ', 'Email', 'Role'])
+        self.model = LazyTableModel(
+            [('id', 'ID'), ('nome', 'Nome'), ('username', 'Username '), ('email', 'Email'), ('role', 'Role')],
+            lambda cursor: user_manager.get_users_page(cursor=cursor),
+            fetch_changes=user_manager.get_users_changes
+        )
         self.refresh_table()  # Load initial data into the table
+        change_notifier.watch(self, ('users',), lambda changes: self.refresh_table())
         self.users_table.setModel(self.model)
         self.users_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 
@@ -682,23 +1976,12 @@ class TodosUsers(QMainWindow):
         central_widget.setLayout(self.layout)
         self.setCentralWidget(central_widget)
 
+    @ui_timed('users_table')
     def refresh_table(self):
         """
-        Clears the current table and reloads all user data from the database.
+        Brings the table up to date, applying only the users that changed.
         """
-        self.model.removeRows(0, self.model.rowCount())  # Clear existing rows
-
-        # Fetch and populate the user data
-        results = user_manager.get_all_users()  # Fetch all users
-        for row in results:
-            new_row = [
-                QStandardItem(str(row['id'])),
-                QStandardItem(row['nome']),
-                QStandardItem(row['username']),
-                QStandardItem(row['email']),
-                QStandardItem(row['role'])
-            ]
-            self.model.appendRow(new_row)  # Add new row to the model
+        self.model.refresh()
 
     def call_add(self):
         # Open the dialog to add a new user
@@ -715,14 +1998,11 @@ class TodosUsers(QMainWindow):
             return
         
         selected_row = selected_indexes[0].row()  # Get the first selected row
-        user_id = int(self.users_table.model().item(selected_row, 0).text())
+        user_id = int(self.model.data(self.model.index(selected_row, 0)))
 
         # Retrieve user data for the selected row
-        nome_utilizador = self.users_table.model().item(selected_row, 1).text()
-        username = self.users_table.model().item(selected_row, 2).text()
+        _, nome_utilizador, username, email_utilizador, role = self.model.row_text(selected_row)
         password_utilizador = ""  # Placeholder for password
-        email_utilizador = self.users_table.model().item(selected_row, 3).text()
-        role = self.users_table.model().item(selected_row, 4).text()
 
         # Open the dialog to edit the selected user
         edit_user = UserEditar(mode='edit', user_id=user_id)
@@ -749,13 +2029,17 @@ class TodosUsers(QMainWindow):
             QMessageBox.Yes | QMessageBox.No
         )
         if confirm == QMessageBox.Yes:
-            try:
-                user_manager.delete_user(user_id)  # Remove user from the database
-                self.refresh_table()  # Refresh the table after deletion
+            # Remove user from the database in the background
+            query_runner.submit(
+                user_manager.delete_user, user_id, owner=self,
+                on_result=lambda _: self.on_user_deleted(),
+                on_error=lambda e: QMessageBox.critical(self, "Erro", f"Falha ao remover utilizador: {e}")
+            )
+
+    def on_user_deleted(self):
+        self.refresh_table()  # Refresh the table after deletion
 
-                QMessageBox.information(self, "Sucesso", "Utilizador removido com sucesso.")
-            except Exception as e:
-                QMessageBox.critical(self, "Erro", f"Falha ao remover utilizador: {e}")
+        QMessageBox.information(self, "Sucesso", "Utilizador removido com sucesso.")
 
 class UserEditar(QDialog):
     """
@@ -817,32 +2101,44 @@ class UserEditar(QDialog):
             QMessageBox.warning(self, "Campos em falta", "Por favor, preencha todos os campos.")
             return
 
-        try:
-            # Add or update user based on mode
-            if self.mode == 'add':
-                user_manager.create_user(
-                    data["nome"],
-                    data["username"],
-                    data["password"],
-                    data["email"],
-                    data["role"]
-                )
-                QMessageBox.information(self, "Utilizador Adicionado", "O utilizador foi adicionada com sucesso!")
-            elif self.mode == 'edit':
-                user_manager.update_user(
-                    self.user_id,
-                    data["nome"],
-                    data["username"],
-                    data["password"],
-                    data["email"],
-                    data["role"]
-                )
-                QMessageBox.information(self, "Utilizador Atualizado", "O utilizador foi atualizado com sucesso!")
-            self.accept()
-        
-        except ValueError as e:
+        # Add or update user based on mode
+        if self.mode == 'add':
+            save = lambda: user_manager.create_user(
+                data["nome"],
+                data["username"],
+                data["password"],
+                data["email"],
+                data["role"]
+            )
+            message = ("Utilizador Adicionado", "O utilizador foi adicionada com sucesso!")
+        else:
+            save = lambda: user_manager.update_user(
+                self.user_id,
+                data["nome"],
+                data["username"],
+                data["password"],
+                data["email"],
+                data["role"]
+            )
+            message = ("Utilizador Atualizado", "O utilizador foi atualizado com sucesso!")
+
+        # Hashing and saving run in the background
+        self.save_button.setEnabled(False)
+        query_runner.submit(
+            save, owner=self,
+            on_result=lambda _: self.on_saved(*message),
+            on_error=self.on_save_failed
+        )
+
+    def on_saved(self, title, message):
+        QMessageBox.information(self, title, message)
+        self.accept()
+
+    def on_save_failed(self, e):
+        self.save_button.setEnabled(True)
+        if isinstance(e, ValueError):
             QMessageBox.warning(self, "Erro", f"Erro ao adicionar/atualizar utilizador: {e}")
-        except Exception as e:
+        else:
             QMessageBox.warning(self, "Erro", f"Ocorreu um erro: {e}")
     
     def set_data(self, user_id, nome_utilizador, username, password_utilizador, email_utilizador, role):
@@ -886,9 +2182,14 @@ class TodosMedicos(QMainWindow):
         self.medicos_table.setSelectionMode(QTableView.SingleSelection)
 
         # Set up the model for the table and refresh data
-        self.model = QStandardItemModel()
-        self.model.setHorizontalHeaderLabels(['ID', 'Nome', 'Telefone ', 'Email', 'CRM'])
+        self.search_text = ''
+        self.model = LazyTableModel(
+            [('id', 'ID'), ('nome', 'Nome'), ('telefone', 'Telefone '), ('email', 'Email'), ('crm', 'CRM')],
+            lambda cursor: medico_manager.search_medicos(self.search_text, cursor=cursor),
+            fetch_changes=medico_manager.get_medicos_changes
+        )
         self.refresh_table()
+        change_notifier.watch(self, ('medicos',), lambda changes: self.refresh_table())
         self.medicos_table.setModel(self.model)
         self.medicos_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.medicos_table.setColumnHidden(0, True)
@@ -904,7 +2205,12 @@ class TodosMedicos(QMainWindow):
         self.cancel_btn.clicked.connect(self.delete_selected_medic)
 
         # Set up the layout for the main window
+        # Search by name, CRM or email
+        self.search_box = SearchBox("Pesquisar por nome, CRM ou email...")
+        self.search_box.search.connect(self.on_search)
+
         self.layout = QVBoxLayout()
+        self.layout.addWidget(self.search_box)
         self.layout.addWidget(self.medicos_table)
 
         # Create a horizontal layout for buttons
@@ -920,22 +2226,20 @@ class TodosMedicos(QMainWindow):
         central_widget.setLayout(self.layout)
         self.setCentralWidget(central_widget)  
   
+    @ui_timed('medicos_table')
     def refresh_table(self):
         """
-        Clears the current table and reloads all data from the database.
+        Brings the table up to date, applying only the doctors that changed.
+        Search results are reloaded, since a change may add or drop a match.
         """
-        self.model.removeRows(0, self.model.rowCount())  # Clear the table
+        if self.search_text:
+            self.model.reload()
+        else:
+            self.model.refresh()
 
-        results = medico_manager.get_all_medicos()  # Fetch all medicos from the database
-        for row in results:
-            new_row = [
-                QStandardItem(str(row['id'])),
-                QStandardItem(row['nome']),
-                QStandardItem(row['telefone']),
-                QStandardItem(row['email']),
-                QStandardItem(row['crm'])
-            ]
-            self.model.appendRow(new_row)  # Add the new row to the table
+    def on_search(self, text):
+        self.search_text = text
+        self.model.reload()
 
     def delete_selected_medic(self):
         # Check if a row is selected
@@ -958,16 +2262,18 @@ class TodosMedicos(QMainWindow):
         )
 
         if confirm == QMessageBox.Yes:
-            try:
-                # Remove from the database
-                medico_manager.delete_medico(medico_id)
+            # Remove from the database in the background
+            query_runner.submit(
+                medico_manager.delete_medico, medico_id, owner=self,
+                on_result=lambda _: self.on_medico_deleted(medico_id),
+                on_error=lambda e: QMessageBox.critical(self, "Erro", f"Falha ao remover médico: {e}")
+            )
 
-                # Remove from the table model
-                self.model.removeRow(selected_row)
+    def on_medico_deleted(self, medico_id):
+        # Remove from the table model
+        self.model.remove_row_by_id(medico_id)
 
-                QMessageBox.information(self, "Sucesso", "Médico removido com sucesso.")
-            except Exception as e:
-                QMessageBox.critical(self, "Erro", f"Falha ao remover médico: {e}")
+        QMessageBox.information(self, "Sucesso", "Médico removido com sucesso.")
 
     def call_add(self):
         # Open the dialog to add a new medico
@@ -985,16 +2291,13 @@ class TodosMedicos(QMainWindow):
         
         # Get the first selected row (assuming single selection)
         selected_row = selected_indexes[0].row()
-        medico_id = int(self.medicos_table.model().item(selected_row, 0).text())
+        medico_id = int(self.model.data(self.model.index(selected_row, 0)))
 
         # Open the dialog to edit the selected medico
         edit_medico = MedicoEditar(mode='edit', medico_id=medico_id)
 
         # Set the data for the selected medico in the edit dialog
-        edit_medico.set_data(medico_id, *[
-            self.medicos_table.model().item(selected_row, col).text()
-            for col in range(1, self.model.columnCount())
-        ])
+        edit_medico.set_data(medico_id, *self.model.row_text(selected_row)[1:])
 
         if edit_medico.exec() == QDialog.Accepted:
             self.refresh_table()
@@ -1052,29 +2355,41 @@ class MedicoEditar(QDialog):
             QMessageBox.warning(self, "Campos em falta", "Por favor, preencha todos os campos.")
             return
 
-        try:
-            if self.mode == 'add':
-                medico_manager.add_medico(
-                    data['nome'],
-                    data['telefone'],
-                    data['email'],
-                    data['crm']
-                )
-                QMessageBox.information(self, 'Medico Adicionado', 'O medico foi adicionado com sucesso!')
-            elif self.mode == 'edit':
-                medico_manager.update_medico(
-                    self.medico_id,
-                    data['nome'],
-                    data['telefone'],
-                    data['email'],
-                    data['crm']
-                )
-                QMessageBox.information(self, 'Medico Atualizado', 'O medico foi atualizado com sucesso!')
-            self.accept()
+        if self.mode == 'add':
+            save = lambda: medico_manager.add_medico(
+                data['nome'],
+                data['telefone'],
+                data['email'],
+                data['crm']
+            )
+            message = ('Medico Adicionado', 'O medico foi adicionado com sucesso!')
+        else:
+            save = lambda: medico_manager.update_medico(
+                self.medico_id,
+                data['nome'],
+                data['telefone'],
+                data['email'],
+                data['crm']
+            )
+            message = ('Medico Atualizado', 'O medico foi atualizado com sucesso!')
+
+        # Save in the background; the dialog closes once the database confirms
+        self.save_button.setEnabled(False)
+        query_runner.submit(
+            save, owner=self,
+            on_result=lambda _: self.on_saved(*message),
+            on_error=self.on_save_failed
+        )
 
-        except ValueError as e:
+    def on_saved(self, title, message):
+        QMessageBox.information(self, title, message)
+        self.accept()
+
+    def on_save_failed(self, e):
+        self.save_button.setEnabled(True)
+        if isinstance(e, ValueError):
             QMessageBox.warning(self, "Erro", f"Erro ao adicionar/atualizar medico: {e}")
-        except Exception as e:
+        else:
             QMessageBox.warning(self, "Erro", f"Ocorreu um erro: {e}")
     
     def get_data(self):
@@ -1112,9 +2427,15 @@ class TodosClientes(QMainWindow):
         self.clientes_table.setSelectionMode(QTableView.SingleSelection)
 
         # Set up the model for the table and load initial data
-        self.model = QStandardItemModel()
-        self.model.setHorizontalHeaderLabels(['ID', 'Nome', 'Telefone', 'Endereço', 'Email', 'Data Nascimento'])
+        self.search_text = ''
+        self.model = LazyTableModel(
+            [('id', 'ID'), ('nome', 'Nome'), ('telefone', 'Telefone'), ('endereco', 'Endereço'),
+             ('email', 'Email'), ('data_nascimento', 'Data Nascimento')],
+            lambda cursor: cliente_manager.search_clients(self.search_text, cursor=cursor),
+            fetch_changes=cliente_manager.get_clients_changes
+        )
         self.refresh_table()
+        change_notifier.watch(self, ('clientes',), lambda changes: self.refresh_table())
         self.clientes_table.setModel(self.model)
         self.clientes_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.clientes_table.setColumnHidden(0, True)  # Hide the ID column
@@ -1130,7 +2451,12 @@ class TodosClientes(QMainWindow):
         self.cancel_btn.clicked.connect(self.delete_selected_cliente)
 
         # Set up the layout for the main window
+        # Search by name, phone, email or address
+        self.search_box = SearchBox("Pesquisar por nome, telefone, email ou morada...")
+        self.search_box.search.connect(self.on_search)
+
         self.layout = QVBoxLayout()
+        self.layout.addWidget(self.search_box)
         self.layout.addWidget(self.clientes_table)
 
         # Create a horizontal layout for buttons
@@ -1146,23 +2472,20 @@ class TodosClientes(QMainWindow):
         central_widget.setLayout(self.layout)
         self.setCentralWidget(central_widget)
 
+    @ui_timed('clientes_table')
     def refresh_table(self):
         """
-        Clear the current table and reload all data from the database.
+        Bring the table up to date, applying only the clients that changed.
+        Search results are reloaded, since a change may add or drop a match.
         """
-        self.model.removeRows(0, self.model.rowCount())  # Clear the table
+        if self.search_text:
+            self.model.reload()
+        else:
+            self.model.refresh()
 
-        results = cliente_manager.get_all_clients()  # Fetch all clients from the database
-        for row in results:
-            new_row = [
-                QStandardItem(str(row['id'])),
-                QStandardItem(row['nome']),
-                QStandardItem(row['telefone']),
-                QStandardItem(row['endereco']),
-                QStandardItem(row['email']),
-                QStandardItem(row['data_nascimento'])
-            ]
-            self.model.appendRow(new_row)  # Add the new row to the table
+    def on_search(self, text):
+        self.search_text = text
+        self.model.reload()
 
     def call_add(self):
         """Open the dialog to add a new client."""
@@ -1180,14 +2503,11 @@ class TodosClientes(QMainWindow):
         
         # Get the first selected row (assuming single selection)
         selected_row = selected_indexes[0].row()
-        cliente_id = int(self.clientes_table.model().item(selected_row, 0).text())
+        cliente_id = int(self.model.data(self.model.index(selected_row, 0)))
 
         edit_cliente = ClienteEditar(mode='edit', cliente_id=cliente_id)
 
-        edit_cliente.set_data(cliente_id, *[
-            self.clientes_table.model().item(selected_row, col).text()
-            for col in range(1, self.model.columnCount())
-        ])
+        edit_cliente.set_data(cliente_id, *self.model.row_text(selected_row)[1:])
 
         if edit_cliente.exec() == QDialog.Accepted:
             self.refresh_table()
@@ -1211,12 +2531,16 @@ class TodosClientes(QMainWindow):
         )
 
         if confirm == QMessageBox.Yes:
-            try:
-                cliente_manager.delete_cliente(cliente_id)  # Remove from the database
-                self.model.removeRow(selected_row)  # Remove from the table model
-                QMessageBox.information(self, "Sucesso", "Cliente removido com sucesso.")
-            except Exception as e:
-                QMessageBox.critical(self, "Erro", f"Falha ao remover cliente: {e}")
+            # Remove from the database in the background
+            query_runner.submit(
+                cliente_manager.delete_cliente, cliente_id, owner=self,
+                on_result=lambda _: self.on_cliente_deleted(cliente_id),
+                on_error=lambda e: QMessageBox.critical(self, "Erro", f"Falha ao remover cliente: {e}")
+            )
+
+    def on_cliente_deleted(self, cliente_id):
+        self.model.remove_row_by_id(cliente_id)  # Remove from the table model
+        QMessageBox.information(self, "Sucesso", "Cliente removido com sucesso.")
 
 class ClienteEditar(QDialog):
     """
@@ -1276,31 +2600,43 @@ class ClienteEditar(QDialog):
             QMessageBox.warning(self, "Campos Vazios", "Por favor, preencha todos os campos obrigatórios.")
             return
 
-        try:
-            if self.mode == 'add':
-                cliente_manager.add_cliente(
-                    data['nome'],
-                    data['telefone'],
-                    data['endereco'],
-                    data['email'],
-                    data['data_nascimento']
-                )
-                QMessageBox.information(self, 'Cliente Adicionado', 'O cliente foi adicionado com sucesso!')
-            elif self.mode == 'edit':
-                cliente_manager.update_cliente(
-                    self.cliente_id,
-                    data['nome'],
-                    data['telefone'],
-                    data['endereco'],
-                    data['email'],
-                    data['data_nascimento']
-                )
-                QMessageBox.information(self, 'Cliente Atualizado', 'O cliente foi atualizado com sucesso!')
-            self.accept()
-    
-        except ValueError as e:
+        if self.mode == 'add':
+            save = lambda: cliente_manager.add_cliente(
+                data['nome'],
+                data['telefone'],
+                data['endereco'],
+                data['email'],
+                data['data_nascimento']
+            )
+            message = ('Cliente Adicionado', 'O cliente foi adicionado com sucesso!')
+        else:
+            save = lambda: cliente_manager.update_cliente(
+                self.cliente_id,
+                data['nome'],
+                data['telefone'],
+                data['endereco'],
+                data['email'],
+                data['data_nascimento']
+            )
+            message = ('Cliente Atualizado', 'O cliente foi atualizado com sucesso!')
+
+        # Save in the background; the dialog closes once the database confirms
+        self.save_button.setEnabled(False)
+        query_runner.submit(
+            save, owner=self,
+            on_result=lambda _: self.on_saved(*message),
+            on_error=self.on_save_failed
+        )
+
+    def on_saved(self, title, message):
+        QMessageBox.information(self, title, message)
+        self.accept()
+
+    def on_save_failed(self, e):
+        self.save_button.setEnabled(True)
+        if isinstance(e, ValueError):
             QMessageBox.warning(self, "Erro", f"Erro ao adicionar/atualizar cliente: {e}")
-        except Exception as e:
+        else:
             QMessageBox.warning(self, "Erro", f"Ocorreu um erro: {e}")
 
     def set_data(self, cliente_id, nome, telefone, endereco, email, data_nascimento):
@@ -1325,6 +2661,93 @@ class ClienteEditar(QDialog):
             "data_nascimento": self.data_nascimento_cliente_field.date().toString("yyyy-MM-dd")
         }
 
+# Colunas da tabela de instruções do diagnóstico: (chave no snapshot, título)
+DIAGNOSTICO_COLUMNS = [
+    ('sql', 'Instrução'),
+    ('count', 'Execuções'),
+    ('total_ms', 'Total (ms)'),
+    ('mean_ms', 'Média (ms)'),
+    ('p95_ms', 'p95 (ms)'),
+    ('max_ms', 'Máx (ms)'),
+    ('rows', 'Linhas'),
+    ('errors', 'Erros'),
+]
+
+class Diagnostico(QDialog):
+    """
+    Dialog showing this station's database statistics: time per SQL
+    statement, waits for a connection and for the writer, and the cache.
+    """
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Diagnóstico da Base de Dados")
+        self.resize(900, 500)
+
+        self.summary_label = QLabel("A carregar...")
+        self.summary_label.setWordWrap(True)
+        self.table = QTableWidget(0, len(DIAGNOSTICO_COLUMNS))
+        self.table.setHorizontalHeaderLabels([label for _, label in DIAGNOSTICO_COLUMNS])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+
+        self.refresh_button = QPushButton("Atualizar")
+        self.refresh_button.clicked.connect(self.refresh)
+        self.reset_button = QPushButton("Limpar")
+        self.reset_button.clicked.connect(self.reset)
+        self.close_button = QPushButton("Fechar")
+        self.close_button.clicked.connect(self.accept)
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.refresh_button)
+        button_layout.addWidget(self.reset_button)
+        button_layout.addWidget(self.close_button)
+
+        self.layout = QVBoxLayout(self)
+        self.layout.addWidget(self.summary_label)
+        self.layout.addWidget(self.table)
+        self.layout.addLayout(button_layout)
+
+        self.refresh()
+
+    def refresh(self):
+        """
+        Loads a new snapshot of the statistics in the background.
+        """
+        query_runner.submit(
+            diagnostics, owner=self, key=(id(self), 'diagnostico'),
+            on_result=self.show_snapshot,
+            on_error=lambda e: QMessageBox.warning(self, "Erro", f"Ocorreu um erro: {e}")
+        )
+
+    def reset(self):
+        query_stats.reset()
+        self.refresh()
+
+    def show_snapshot(self, snapshot):
+        waits = snapshot['waits']
+        pool_wait = waits.get('pool', {}).get('p95_ms', 0.0)
+        writer_wait = waits.get('writer', {}).get('p95_ms', 0.0)
+        cache = snapshot['cache']
+        self.summary_label.setText(
+            f"Desde {snapshot['since']}. "
+            f"Espera por conexão (p95): {pool_wait:.2f} ms, {snapshot['pool']['waits']} esperas. "
+            f"Espera pelo writer (p95): {writer_wait:.2f} ms, {snapshot['writer']['transactions']} transações. "
+            f"Cache: {cache['hit_ratio']:.0%} de acertos. "
+            f"{snapshot['slow_queries']} instruções acima de {snapshot['slow_ms']} ms em {snapshot['log_path']}."
+        )
+        statements = snapshot['statements']
+        self.table.setRowCount(len(statements))
+        for row, statement in enumerate(statements):
+            for column, (key, _) in enumerate(DIAGNOSTICO_COLUMNS):
+                value = statement[key]
+                item = QTableWidgetItem(f"{value:.2f}" if isinstance(value, float) else str(value))
+                if key == 'sql':
+                    item.setToolTip(value)
+                else:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+
 class About(QDialog):
     def __init__(self):
         super().__init__()
@@ -1350,8 +2773,11 @@ class About(QDialog):
         self.setLayout(layout)
 
 if __name__ == "__main__":
+    init_db()  # Create the schema and the admin user on first run
+
     app = QApplication(sys.argv)
     app.setStyleSheet(LIGHT_THEME)
+    app.aboutToQuit.connect(ui_timings.finish_session)  # Relatório dos tempos da interface (GESTOR_UI_TIMINGS)
     
     # Set application icon
     app_icon = QIcon("assets/icon.png")